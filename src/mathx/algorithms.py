@@ -4,17 +4,22 @@ Created on 25.12.2015
 @author: michi
 '''
 import math
+from mathx.ast import AstNode
+from mathx import roots
 
 def findRootSecant(func,y,xleft,xright,tol = 1.0e-12, abstol = 1.0e-16, maxiter = 60):
     '''
     Solve the equation y = func(x) by teh secant method.
     
-    :param func: The function to evaluate.
+    :param func: The function to evaluate or a formula AST in one variable.
     :param y: The ordinate value to search.
     :param xleft: The left point of the search interval
     :param xright: The right point of the search interval
     '''
     
+    if isinstance(func,AstNode):
+        func = func.compile()
+    
     x1 = xleft
     dy1 = func(x1)-y
     x2 = xright
@@ -51,8 +56,6 @@ def findRootSecant(func,y,xleft,xright,tol = 1.0e-12, abstol = 1.0e-16, maxiter
         xm = (dy1 * x2 - dy2 * x1) / (dy1-dy2)
         dym = func(xm)-y
         
-        print ("niter,dym=%d,%lg"%(niter,dym))
-        
         if math.fabs(dym)<realtol:
             return xm
         
@@ -65,16 +68,24 @@ def findRootSecant(func,y,xleft,xright,tol = 1.0e-12, abstol = 1.0e-16, maxiter
         #    dy1 = dym
     
     raise ValueError("Root finding diverged after %d iterations."%maxiter)
+
+def findRootNewton(func,y,x0,variable=None,tol = 1.0e-12, abstol = 1.0e-16, maxiter = 60):
+    '''
+    Solve the equation y = func(x) by Newton's method starting at x0,
+    see mathx.roots.findRootNewton().
+    
+    :param func: A formula AST, the derivative is computed symbolically.
+    '''
+    return roots.findRootNewton(func,y,x0,variable,tol=tol,abstol=abstol,maxiter=maxiter)
+
 def findRoot(func,y,xleft,xright,tol = 1.0e-12, abstol = 1.0e-16, maxiter = 60):
-    es = []
-    while xleft<=xright:
-        try:
-            root = findRootSecant(func, y, xleft, xright, tol, abstol, maxiter)
-        except BaseException as e:
-            es.append(e)
-        xleft = root+1
-        yield root
-    print(es)
+    '''
+    Yield all roots of the equation y = func(x) in the interval [xleft,xright]
+    in ascending order, see mathx.roots.findRoots().
+    
+    :param func: A formula AST in one variable or a scalar function.
+    '''
+    yield from roots.findRoots(func,y,xleft,xright,tol=tol,abstol=abstol,maxiter=maxiter)
         
     
     
\ No newline at end of file
@@ -4,26 +4,330 @@ Created on 26.10.2015
 @author: michi
 '''
 
-from mathx.builtins import BUILTIN_FUNCTIONS
+from mathx.builtins import BUILTIN_FUNCTIONS, NUMPY_FUNCTIONS, numpy
 import math
+import threading
+import weakref
 
 class EvaluateException(Exception):
     pass
 
+SCALAR_FUNCTIONS = dict(BUILTIN_FUNCTIONS,pow=math.pow)
+
+if numpy is None:
+    VECTOR_FUNCTIONS = None
+else:
+    VECTOR_FUNCTIONS = dict(NUMPY_FUNCTIONS,pow=numpy.power)
+
+def _masked(res,shape):
+    res = numpy.broadcast_to(numpy.asarray(res,dtype=float),shape)
+    return numpy.where(numpy.isfinite(res),res,numpy.nan)
+
+def vectorize(func,multiple=False):
+    '''
+      Wrap a function compiled against VECTOR_FUNCTIONS, so that it accepts
+      arrays or scalars, broadcasts them and returns a float array of the
+      broadcast shape, in which NaN marks all points yielding a domain error,
+      a division by zero or an overflow.
+      
+      If multiple is true, func returns a tuple of values and the wrapper
+      returns an array with one more leading axis.
+    '''
+    def vectorized(*args):
+        args = [numpy.asarray(a,dtype=float) for a in args]
+        shape = numpy.broadcast_shapes(*(a.shape for a in args))
+        
+        with numpy.errstate(all="ignore"):
+            try:
+                res = func(*args)
+            except (ArithmeticError,ValueError):
+                # raised by python arithmetic on constant subexpressions.
+                if multiple:
+                    return numpy.full((func.noutputs,)+shape,numpy.nan)
+                return numpy.full(shape,numpy.nan)
+        
+            if multiple:
+                return numpy.stack([_masked(r,shape) for r in res])
+            return _masked(res,shape)
+    
+    vectorized.source = func.source
+    # lets tegral() and others pass whole arrays.
+    vectorized.vectorized = True
+    return vectorized
+
+class AstProgram:
+    '''
+      A linear instruction list for one or more formulae with common
+      subexpressions eliminated.
+      
+      AST nodes are hash-consed, so structurally equal subtrees are the
+      same object and every distinct node yields exactly one instruction.
+      The instructions are in post-order, so the operands of an instruction
+      always precede it.
+      
+      nodes[k] is the node of instruction k, args[k] the indices of the
+      instructions computing its operands and outputs the indices of the
+      instructions computing the formulae.
+    '''
+    def __init__(self,roots):
+        self.nodes = []
+        self.args = []
+        self.outputs = []
+        index = {}
+        
+        for root in roots:
+            stack = [root]
+            while stack:
+                node = stack[-1]
+                if node in index:
+                    stack.pop()
+                    continue
+                pending = [op for op in node.operands() if op not in index]
+                if pending:
+                    stack.extend(reversed(pending))
+                else:
+                    stack.pop()
+                    index[node] = len(self.nodes)
+                    self.nodes.append(node)
+                    self.args.append(tuple(index[op] for op in node.operands()))
+            self.outputs.append(index[root])
+    
+    def __len__(self):
+        return len(self.nodes)
+    
+    def evaluate(self,variables={}):
+        '''
+          Run the instructions for the given variable values.
+          
+          @return: The list of the values of the formulae.
+        '''
+        values = []
+        for node,args in zip(self.nodes,self.args):
+            values.append(node._compute([values[i] for i in args],variables))
+        return [values[i] for i in self.outputs]
+
+class AstCompiler:
+    '''
+      Translates an AstProgram into the source code of a flat python function,
+      which takes the values of the variables as positional arguments.
+      
+      Every instruction of an inner node is assigned to a local temporary,
+      so the generated code does not depend on the nesting depth of the
+      formula and common subexpressions are computed only once.
+    '''
+    def __init__(self,variables,functions=SCALAR_FUNCTIONS):
+        self.variables = list(variables)
+        self.functions = functions
+        self.namespace = {}
+        self.lines = []
+
+    def variable(self,name):
+        try:
+            return "v%d"%self.variables.index(name)
+        except ValueError:
+            raise EvaluateException("Variable %s is undefined."%name)
+
+    def constant(self,value):
+        if type(value) == int or (type(value) == float and math.isfinite(value)):
+            return repr(value)
+        name = "c%d"%len(self.namespace)
+        self.namespace[name] = value
+        return name
+
+    def function(self,func):
+        name = "f_"+func
+        if name not in self.namespace:
+            f = self.functions.get(func)
+            if f == None:
+                raise EvaluateException("Function %s is unknown."%func)
+            self.namespace[name] = f
+        return name
+
+    def temporary(self,expression):
+        name = "t%d"%len(self.lines)
+        self.lines.append("    %s = %s"%(name,expression))
+        return name
+
+    def emit(self,program):
+        '''
+          Emit the code for the instructions of the given program.
+          
+          @return: The list of the expressions holding the values of the formulae.
+        '''
+        names = []
+        for node,args in zip(program.nodes,program.args):
+            names.append(node._emit(self,[names[i] for i in args]))
+        return [names[i] for i in program.outputs]
+
+    def _build(self,result):
+        args = ",".join("v%d"%i for i in range(len(self.variables)))
+        source = "def compiled(%s):\n%s\n    return %s\n"%(args,"\n".join(self.lines),result)
+        exec(compile(source,"<mathx formula>","exec"),self.namespace)
+        func = self.namespace["compiled"]
+        func.source = source
+        return func
+
+    def compile(self,node):
+        return self._build(self.emit(AstProgram((node,)))[0])
+
+    def compileMany(self,nodes):
+        results = self.emit(AstProgram(nodes))
+        func = self._build("(%s,)"%",".join(results))
+        func.noutputs = len(results)
+        return func
+
+def compileMany(nodes,variables,vectorized=False):
+    '''
+      Compile several formulas into one function returning a tuple with their values.
+      Subexpressions shared by the formulas are computed only once.
+      
+      @param nodes The formula ASTs.
+      @param variables The names of the positional arguments, see AstNode.compile().
+      @param vectorized If true, compile against numpy ufuncs and return an array,
+                        whose first axis runs over the formulas, see vectorize().
+    '''
+    if vectorized:
+        if VECTOR_FUNCTIONS is None:
+            raise EvaluateException("Vectorized evaluation requires numpy.")
+        return vectorize(AstCompiler(variables,VECTOR_FUNCTIONS).compileMany(nodes),multiple=True)
+    else:
+        return AstCompiler(variables).compileMany(nodes)
+
+# weak references to all living AST nodes keyed by their type and fields,
+# see AstNode._intern(). Dead references are swept, whenever the table has
+# doubled in size since the last sweep.
+_INTERNED = {}
+_INTERN_LOCK = threading.Lock()
+_INTERN_SWEEP = 1024
+
+def _sweep():
+    global _INTERN_SWEEP
+    for key in [key for key,ref in _INTERNED.items() if ref() is None]:
+        del _INTERNED[key]
+    _INTERN_SWEEP = max(1024,2*len(_INTERNED))
+
 class AstNode:
+    '''
+      Base class of the immutable AST nodes.
+      
+      Nodes are hash-consed: constructing a node with the same fields as a
+      living node returns the existing instance, so identical subtrees are
+      shared and structural equality is plain identity. Subclasses list their
+      fields in _fields and pass them positionally to _intern().
+      
+      Node types must not define __bool__ or __len__, so that nodes are true.
+    '''
+    __slots__ = ("__weakref__",)
+    _fields = ()
+    
+    @classmethod
+    def _intern(cls,key,*args):
+        '''
+          Return the living node with the given key or create a new one,
+          constructors look up living nodes themselves before calling this.
+          
+          Keys refer to operands by id(), which is unique as long as the
+          node holding them is alive, so that the table does not keep any
+          operands alive.
+        '''
+        with _INTERN_LOCK:
+            ref = _INTERNED.get(key)
+            node = None if ref is None else ref()
+            if node is None:
+                node = object.__new__(cls)
+                for name,value in zip(cls._fields,args):
+                    object.__setattr__(node,name,value)
+                _INTERNED[key] = weakref.ref(node)
+                if len(_INTERNED) > _INTERN_SWEEP:
+                    _sweep()
+        return node
+    
+    def __setattr__(self,name,value):
+        raise AttributeError("AST nodes are immutable.")
+    
+    def __delattr__(self,name):
+        raise AttributeError("AST nodes are immutable.")
+    
+    def __reduce__(self):
+        return (type(self),tuple(getattr(self,name) for name in self._fields))
+    
+    def __copy__(self):
+        return self
+    
+    def __deepcopy__(self,memo):
+        return self
+    
     def evaluate(self,variables={}):
+        '''
+          Evaluate this formula recursively for a single point, see compile()
+          for repeated evaluations and AstProgram for the evaluation of
+          common subexpressions.
+        '''
+        return self._compute([op.evaluate(variables) for op in self.operands()],variables)
+    
+    def _compute(self,args,variables):
+        '''
+          @param args The values of the operands.
+          @return: The value of this node.
+        '''
         raise NotImplementedError()
     
     def findVars(self,variables={}):
         return variables
 
+    def operands(self):
+        return ()
+
+    def _emit(self,compiler,args):
+        raise NotImplementedError()
+
+    def compile(self,variables=None,vectorized=False):
+        '''
+         Compile this formula into a python function for repeated evaluation.
+         
+         @param variables The names of the variables in the order of the positional
+                          arguments of the returned function. Defaults to the
+                          order returned by findVars().
+         @param vectorized If true, compile against numpy ufuncs, see vectorize().
+         @return: A callable taking the values of the variables as positional arguments.
+        '''
+        if variables is None:
+            variables = self.findVars({}).keys()
+        
+        if vectorized:
+            if VECTOR_FUNCTIONS is None:
+                raise EvaluateException("Vectorized evaluation requires numpy.")
+            return vectorize(AstCompiler(variables,VECTOR_FUNCTIONS).compile(self))
+        else:
+            return AstCompiler(variables).compile(self)
+
+    def evaluate_array(self,variables={}):
+        '''
+         Evaluate this formula for whole arrays of variable values in one pass.
+         
+         @param variables A dict mapping variable names to arrays or scalars,
+                          which are broadcast against each other.
+         @return: A float array with NaN for all invalid points.
+        '''
+        return self.compile(variables.keys(),vectorized=True)(*variables.values())
+
     def simplify(self):
-        return self
+        '''
+         @return: An equivalent, simplified formula, see mathx.rewrite.simplify()
+        '''
+        from mathx import rewrite
+        return rewrite.simplify(self)
+    
+    def derivative(self,variable):
+        '''
+         @param variable The name of the variable.
+         @return: The simplified partial derivative of this formula, see mathx.derivative.derivative()
+        '''
+        from mathx import derivative
+        return derivative.derivative(self,variable)
     
     def count(self,asttype):
         return 0
-    def __eq__(self,other):
-        raise NotImplementedError()
     def isEquivalent(self,other):
         other = other.simplify()
         if other.count(AstVariable)==0 and self.count(AstVariable)==0:
@@ -49,13 +353,25 @@ class AstNode:
             raise ValueError('Path and node are not compatible.')
 
 class AstConstant(AstNode):
+    __slots__ = _fields = ("value",)
     
-    def __init__(self,x):
-        self.value=x
+    def __new__(cls,x):
+        # 1 and 1.0 are the same constant, the representation of the float
+        # distinguishes 0.0 from -0.0 and matches nan.
+        x = float(x)
+        key = (cls,repr(x))
+        ref = _INTERNED.get(key)
+        return (ref and ref()) or cls._intern(key,x)
     
-    def evaluate(self, variables={}):
+    def evaluate(self,variables={}):
+        return self.value
+
+    def _compute(self,args,variables):
         return self.value
     
+    def _emit(self,compiler,args):
+        return compiler.constant(self.value)
+    
     def __str__(self):
         return str(self.value)
     
@@ -66,11 +382,6 @@ class AstConstant(AstNode):
             return 1
         else:
             return 0
-    def __eq__(self, other):
-        if type(other)==AstConstant:
-            return self.value==other.value
-        else:
-            return False
     
     def isEquivalent(self, other):
         other = other.simplify()
@@ -84,16 +395,28 @@ class AstConstant(AstNode):
 
     
 class AstVariable(AstNode):
+    __slots__ = _fields = ("variable",)
     
-    def __init__(self,v):
-        self.variable=v
+    def __new__(cls,v):
+        key = (cls,v)
+        ref = _INTERNED.get(key)
+        return (ref and ref()) or cls._intern(key,v)
 
     def findVars(self,variables={}):
         if not(self.variable in variables):
             variables[self.variable] = None
         return variables
 
-    def evaluate(self, variables={}):
+    def evaluate(self,variables={}):
+        
+        x = variables.get(self.variable)
+        
+        if x == None:
+            raise EvaluateException("Variable %s is undefined."%self.variable)
+        
+        return x
+
+    def _compute(self,args,variables):
         
         x = variables.get(self.variable)
         
@@ -102,6 +425,9 @@ class AstVariable(AstNode):
         
         return x
     
+    def _emit(self,compiler,args):
+        return compiler.variable(self.variable)
+
     def count(self, asttype):
         if asttype==AstVariable:
             return 1
@@ -112,11 +438,6 @@ class AstVariable(AstNode):
     
     def __repr__(self):
         return "AstVariable(%r)"%self.variable
-    def __eq__(self, other):
-        if type(other)==AstVariable:
-            return self.variable==other.variable
-        else:
-            return False
     def isEquivalent(self, other):
         other = other.simplify()
         return self==other
@@ -134,99 +455,63 @@ KNOWN_BINARY_OPERATORS = { "+": 1,
                           }
 
 class AstBinaryOperator(AstNode):
+    __slots__ = _fields = ("lhs","op","rhs")
+    
+    def __new__(cls,lhs,op,rhs):
+        key = (cls,id(lhs),op,id(rhs))
+        ref = _INTERNED.get(key)
+        return (ref and ref()) or cls._intern(key,lhs,op,rhs)
     
-    def __init__(self,lhs,op,rhs):
-        self.lhs = lhs
-        self.op = op
-        self.rhs = rhs
-        self.precedence = KNOWN_BINARY_OPERATORS[op]
+    @property
+    def precedence(self):
+        return KNOWN_BINARY_OPERATORS[self.op]
     
     def findVars(self,variables={}):
         self.lhs.findVars(variables)
         self.rhs.findVars(variables)
         return variables
     
-    def simplify(self):
-        if type(self.lhs) == AstConstant and type(self.rhs) == AstConstant:
-            return AstConstant(self.evaluate())
+    def evaluate(self,variables={}):
+        
+        lhs = self.lhs.evaluate(variables)
+        rhs = self.rhs.evaluate(variables)
+        
+        if self.op == "+":
+            return lhs + rhs
+        elif self.op == "-":
+            return lhs - rhs
+        elif self.op == "*":
+            return lhs * rhs
+        elif self.op == "/":
+            return lhs / rhs
+        elif self.op == "^":
+            return math.pow(lhs,rhs)
         else:
-            self.lhs = self.lhs.simplify()
-            self.rhs = self.rhs.simplify()
-            
-            if type(self.lhs) == AstConstant and type(self.rhs) == AstConstant:
-                return AstConstant(self.evaluate())
-            
-            if type(self.lhs) == AstConstant and self.lhs.value == 0.0:
-                # 0 + x -> x
-                if self.op == "+":
-                    return self.rhs
-                
-                # 0 - x -> -x
-                if self.op == "-":
-                    return AstNegation(self.rhs).simplify()
-                
-                # 0 * x -> 0,  0/x -> 0, 0^x -> 0
-                if self.op == "*" or self.op == "/" or self.op == "^":
-                    return AstConstant(0.0)
-                
-            if type(self.lhs) == AstConstant and self.lhs.value == 1.0:
-                
-                # 1 * x -> x
-                if self.op == "*":
-                    return self.rhs
-                
-                # 1^x -> 1
-                if self.op == "^":
-                    return AstConstant(1.0)
-
-            if type(self.lhs) == AstConstant and self.lhs.value == -1.0:
-                
-                # -1 * x -> -x
-                if self.op == "*":
-                    return AstNegation(self.rhs).simplify()
-
-            if type(self.rhs) == AstConstant and self.rhs.value == 0.0:
-                # x + 0 -> x, x - 0 -> x
-                if self.op == "+" or self.op == "-":
-                    return self.lhs
-                
-                # x * 0 -> 0
-                if self.op == "*":
-                    return AstConstant(0.0)
-
-                # x^0 -> 1
-                if self.op == "^":
-                    return AstConstant(1.0)
-                
-            if type(self.rhs) == AstConstant and self.rhs.value == 1.0:
-                
-                # x * 1 -> x, x / 1 -> x
-                if self.op == "*" or self.op == "/": 
-                    return self.rhs
-                
-                # x ^ 1 -> x
-                if self.op == "^":
-                    return self.lhs
+            raise EvaluateException("Operator %s is unknown."%self.op)
 
-            if type(self.rhs) == AstConstant and self.rhs.value == -1.0:
-                
-                # x * -1 -> -x, x / -1 -> -x
-                if self.op == "*" or self.op == "/":
-                    return AstNegation(self.rhs).simplify()
-            return self
-            
-    def evaluate(self, variables={}):
+    def _compute(self,args,variables):
         
         if self.op == "+":
-            return self.lhs.evaluate(variables) + self.rhs.evaluate(variables)
+            return args[0] + args[1]
         elif self.op == "-":
-            return self.lhs.evaluate(variables) - self.rhs.evaluate(variables)
+            return args[0] - args[1]
         elif self.op == "*":
-            return self.lhs.evaluate(variables) * self.rhs.evaluate(variables)
+            return args[0] * args[1]
         elif self.op == "/":
-            return self.lhs.evaluate(variables) / self.rhs.evaluate(variables)
+            return args[0] / args[1]
         elif self.op == "^":
-            return math.pow(self.lhs.evaluate(variables),self.rhs.evaluate(variables))
+            return math.pow(args[0],args[1])
+        else:
+            raise EvaluateException("Operator %s is unknown."%self.op)
+
+    def operands(self):
+        return (self.lhs,self.rhs)
+
+    def _emit(self,compiler,args):
+        if self.op == "^":
+            return compiler.temporary("%s(%s,%s)"%(compiler.function("pow"),args[0],args[1]))
+        elif self.op in ("+","-","*","/"):
+            return compiler.temporary("%s %s %s"%(args[0],self.op,args[1]))
         else:
             raise EvaluateException("Operator %s is unknown."%self.op)
 
@@ -247,7 +532,9 @@ class AstBinaryOperator(AstNode):
         
         ret += self.op
         
-        if hasattr(self.rhs,"precedence") and self.rhs.precedence < self.precedence:
+        # a-(b-c), a/(b*c)
+        if hasattr(self.rhs,"precedence") and (self.rhs.precedence < self.precedence or
+                                               self.rhs.precedence == self.precedence and self.op in "-/"):
             ret += "(" + str(self.rhs) + ")"
         else:
             ret += str(self.rhs)
@@ -256,11 +543,6 @@ class AstBinaryOperator(AstNode):
     
     def __repr__(self):
         return "AstBinaryOperator(%r,%r,%r)"%(self.lhs,self.op,self.rhs)
-    def __eq__(self, other):
-        if type(other)==AstBinaryOperator:
-            return (self.rhs==other.rhs)and(self.lhs==other.lhs)and(self.op==other.op)
-        else:
-            return False
     def searchPath(self, ast):
         if ast == self:
             return [self]
@@ -434,14 +716,20 @@ class AstBinaryOperator(AstNode):
             raise ValueError('Path and node are not compatible.')
 
 class AstRoot(AstNode):
-    def __init__(self,target,power):
-        self.target = target
+    __slots__ = _fields = ("target","power")
+    
+    def __new__(cls,target,power):
         if isinstance(power, (float,int)):
-            self.power = AstConstant(float(power))
-        else:
-            self.power = power
-    def evaluate(self, variables={}):
-        return self.target.evaluate(variables)**(1/self.power.evaluate(variables))
+            power = AstConstant(float(power))
+        key = (cls,id(target),id(power))
+        ref = _INTERNED.get(key)
+        return (ref and ref()) or cls._intern(key,target,power)
+    def _compute(self,args,variables):
+        return args[0]**(1/args[1])
+    def operands(self):
+        return (self.target,self.power)
+    def _emit(self,compiler,args):
+        return compiler.temporary("%s ** (1/%s)"%(args[0],args[1]))
     def findVars(self,variables={}):
         self.target.findVars(variables)
         self.power.findVars(variables)
@@ -480,17 +768,6 @@ class AstRoot(AstNode):
         else:
             raise ValueError('Path and node are not compatible.')
 
-    def simplify(self):
-        if self.count(AstVariable):
-            return self
-        else:
-            return AstConstant(self.evaluate())
-    def __eq__(self, other):
-        if type(other)==AstRoot:
-            return self.power==other.power and self.target==other.target
-        else:
-            return False
-
     def __str__(self):
         
         return "root(" + str(self.power) +","+ str(self.target) +")"
@@ -499,48 +776,31 @@ class AstRoot(AstNode):
     def __repr__(self):
         return "AstRoot(%r,%r)"%(self.target,self.power)
 class AstNegation(AstNode):
+    __slots__ = _fields = ("target",)
+    precedence = 0
     
-    def __init__(self,target):
-        self.target = target
-        self.precedence = 0
+    def __new__(cls,target):
+        key = (cls,id(target))
+        ref = _INTERNED.get(key)
+        return (ref and ref()) or cls._intern(key,target)
     
-    def evaluate(self, variables={}):
-        
+    def evaluate(self,variables={}):
         return -self.target.evaluate(variables)
 
-    def findVars(self,variables={}):
-        self.target.findVars(variables)
+    def _compute(self,args,variables):
         
-    def simplify(self):
-        if type(self.target) == AstConstant:
-            return AstConstant(self.evaluate())
-        else:
-            self.target = self.target.simplify()
-            
-            if type(self.target) == AstBinaryOperator and self.target.op == "*":
-                # -(c*x) -> -c * x 
-                if type(self.target.lhs) == AstConstant:
-                    self.target.lhs.value = -self.target.lhs.value
-                    return self.target
-                
-                # -(x*c)  -> x * -c 
-                if type(self.target.rhs) == AstConstant:
-                    self.target.rhs.value = -self.target.rhs.value
-                    return self.target
+        return -args[0]
 
-            # -(x-y) -> y-x
-            if type(self.target) == AstBinaryOperator and self.target.op == "-":
-                
-                self.target.lhs.value,self.target.rhs.value = self.target.rhs.value,self.target.lhs.value
-                return self.target
-                
-            # -(-(x)) -> x
-            if type(self.target) == AstNegation:
-                
-                return self.target.target
+    def findVars(self,variables={}):
+        self.target.findVars(variables)
+        return variables
 
-            return self
+    def operands(self):
+        return (self.target,)
 
+    def _emit(self,compiler,args):
+        return compiler.temporary("-%s"%args[0])
+        
     def count(self, asttype):
         if asttype==AstNegation:
             return 1+self.target.count(asttype)
@@ -549,15 +809,13 @@ class AstNegation(AstNode):
 
     def __str__(self):
         
+        # the unary minus binds tighter than any binary operator.
+        if type(self.target) == AstBinaryOperator:
+            return "-(" + str(self.target) + ")"
         return "-" + str(self.target)
     
     def __repr__(self):
         return "AstNegation(%r)"%self.target
-    def __eq__(self, other):
-        if type(other)==AstNegation:
-            return self.target==other.target
-        else:
-            return False
     def searchPath(self, ast):
         path = self.target.searchPath(ast)
         if ast == self:
@@ -576,26 +834,30 @@ class AstNegation(AstNode):
 
 
 class AstFunctionCall(AstNode):
+    __slots__ = _fields = ("func","target")
     
-    def __init__(self,func,target):
-        self.func = func
-        self.target = target
-        
-    def evaluate(self, variables={}):
+    def __new__(cls,func,target):
+        key = (cls,func,id(target))
+        ref = _INTERNED.get(key)
+        return (ref and ref()) or cls._intern(key,func,target)
         
+    def evaluate(self,variables={}):
         return BUILTIN_FUNCTIONS[self.func](self.target.evaluate(variables))
+
+    def _compute(self,args,variables):
+        
+        return BUILTIN_FUNCTIONS[self.func](args[0])
         
     def findVars(self,variables={}):
         self.target.findVars(variables)
         return variables
 
-    def simplify(self):
-        if type(self.target) == AstConstant:
-            return AstConstant(self.evaluate())
-        else:
-            self.target = self.target.simplify()
-            return self
-        
+    def operands(self):
+        return (self.target,)
+
+    def _emit(self,compiler,args):
+        return compiler.temporary("%s(%s)"%(compiler.function(self.func),args[0]))
+
     def count(self, asttype):
         if asttype==AstFunctionCall:
             return 1+self.target.count(asttype)
@@ -608,11 +870,6 @@ class AstFunctionCall(AstNode):
     
     def __repr__(self):
         return "AstFunctionCall(%r,%r)"%(self.func,self.target)
-    def __eq__(self, other):
-        if type(other)==AstFunctionCall:
-            return (self.target==other.target)and(self.func==other.func)
-        else:
-            return False
     def searchPath(self, ast):
         path = self.target.searchPath(ast)
         if self==ast:
@@ -0,0 +1,60 @@
+'''
+Command line entry point of the benchmarks, see python -m mathx.bench --help.
+'''
+
+import argparse
+import json
+import sys
+from mathx.bench import cases
+from mathx.bench import endtoend
+from mathx.bench import runner
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m mathx.bench",
+                                     description="Run the mathx benchmarks and write the results as JSON.")
+    parser.add_argument("-o","--output",help="the file for the JSON report, default is stdout")
+    parser.add_argument("-c","--compare",metavar="REPORT",help="print the ratios of the median times against an older report")
+    parser.add_argument("-k","--select",action="append",help="run the benchmarks, whose names contain the given text")
+    parser.add_argument("--repeat",type=int,default=5,help="the number of timed runs per benchmark")
+    parser.add_argument("--min-time",type=float,default=0.2,help="the minimal duration of a run in seconds")
+    parser.add_argument("--quick",action="store_true",help="short runs for a smoke test, the times are not reliable")
+    parser.add_argument("-n",type=int,default=101,help="the grid size of the valuesiter benchmarks")
+    parser.add_argument("--workers",type=int,default=1,help="the worker processes of the benchmarked server")
+    parser.add_argument("--no-http",action="store_true",help="skip the end-to-end benchmarks of /mathx/evaluate")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.repeat = 1
+        args.min_time = 0.0
+
+    def progress(name):
+        print(name,file=sys.stderr,flush=True)
+
+    settings = dict(repeat=args.repeat,min_time=args.min_time,n=args.n,workers=args.workers)
+    results = runner.run(cases.cases(args.n),args.repeat,args.min_time,args.select,progress)
+
+    if not args.no_http:
+        if endtoend.serverScript() is None:
+            print("server.py not found, skipping the end-to-end benchmarks.",file=sys.stderr)
+        else:
+            with endtoend.LocalServer(args.workers) as server:
+                results.update(runner.run(endtoend.cases(server.port),args.repeat,args.min_time,args.select,progress))
+
+    report = runner.report(results,**settings)
+
+    if args.output:
+        with open(args.output,"w") as fp:
+            json.dump(report,fp,indent=1,sort_keys=True)
+    else:
+        json.dump(report,sys.stdout,indent=1,sort_keys=True)
+        print()
+
+    if args.compare:
+        with open(args.compare) as fp:
+            base = json.load(fp)
+        print("%-32s %12s %12s %8s"%("benchmark",base.get("commit") or "base",report["commit"] or "current","ratio"),file=sys.stderr)
+        for name,old,new,ratio in runner.compare(base,report):
+            print("%-32s %12.3e %12.3e %8.2f"%(name,old,new,ratio),file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
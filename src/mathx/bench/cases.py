@@ -0,0 +1,75 @@
+'''
+The in-process benchmarks of the parser, the evaluation, tegral and the solver.
+'''
+
+import math
+from mathx import formula
+from mathx import solver
+from mathx import tegral
+from mathx.bench import corpus
+from mathx.bench import shiftreduce
+from mathx.bench import tegraltree
+from mathx.web import evaluate
+
+class _Solver(solver.Solver):
+    '''
+      A Solver, which does not append the equation to the history file.
+    '''
+    def __init__(self,g):
+        self.gleichung = g
+        l = [formula.parseCached(i).ast for i in g.split("=")]
+        self.lhs = l[0]
+        self.rhs = l[-1]
+
+# the limit of the divisions of the heap and tree benchmarks.
+REFINEMENT_PARTITIONS = 100000
+
+def _bound(value,infinity):
+    return infinity if value is None else value
+
+def cases(n=101):
+    '''
+      Set up the in-process benchmarks over the corpus.
+
+      @param n The grid size of the valuesiter benchmarks.
+      @return: A list of (name,func,info) tuples, func is called without
+               arguments and info is a dict, which is copied to the results.
+    '''
+    ret = []
+
+    for name,f in corpus.FORMULAS.items():
+        ret.append(("parse/%s"%name,lambda f=f: formula.Parser(f).parseAst(),{"length": len(f)}))
+        ret.append(("parse_shiftreduce/%s"%name,lambda f=f: shiftreduce.ShiftReduceParser(f).parseAst(),{"length": len(f)}))
+
+    for name,f in corpus.FORMULAS.items():
+        node = formula.Parser(f).parseAst()
+        ret.append(("evaluate/%s"%name,lambda node=node: node.evaluate(dict(corpus.POINT)),{}))
+
+    for name,f in corpus.FORMULAS.items():
+        state = evaluate.validate(dict(corpus.GRID,f=f,n=n))
+        ret.append(("grid/%s"%name,lambda state=state: sum(1 for _ in evaluate.valuesiter(state)),
+                    {"n": state["n"]}))
+
+    for name,(f,a,b,exact) in corpus.INTEGRANDS.items():
+        func = formula.parseCached(f).compile(vectorized=True)
+        a = _bound(a,-math.inf)
+        b = _bound(b,math.inf)
+        run = lambda func=func,a=a,b=b: tegral.tegral(func,a,b)
+        ret.append(("tegral/%s"%name,run,{"error": abs(run()-exact)}))
+
+    # the same scalar function and divisions for the heap and the tree.
+    for name,(f,a,b,tol) in corpus.REFINEMENTS.items():
+        func = formula.parseCached(f).compile()
+        res,n_parts = tegraltree.tegralTree(func,a,b,tol,REFINEMENT_PARTITIONS)
+        ret.append(("tegral_heap/%s"%name,
+                    lambda func=func,a=a,b=b,tol=tol: tegral.tegral(func,a,b,tol,REFINEMENT_PARTITIONS,vectorized=False),
+                    {"partitions": n_parts}))
+        ret.append(("tegral_tree/%s"%name,
+                    lambda func=func,a=a,b=b,tol=tol: tegraltree.tegralTree(func,a,b,tol,REFINEMENT_PARTITIONS),
+                    {"partitions": n_parts}))
+
+    for name,g in corpus.EQUATIONS.items():
+        s = _Solver(g)
+        ret.append(("solver/%s"%name,s.evaluate,{}))
+
+    return ret
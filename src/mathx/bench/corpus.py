@@ -0,0 +1,61 @@
+'''
+The formulae, integrands and equations of the benchmarks.
+'''
+
+import math
+
+def _generatedSum(terms):
+    '''
+      @return: A long sum as produced by a formula generator, the terms
+               are fixed, so that the formula is the same for every run.
+    '''
+    return "+".join("%d*sin(%d*x+%d)*cos(%d*y)/%d"%(k%7+1,k,k%5,k%11+1,k+1) for k in range(terms))
+
+# formulae in x and y by category, the names are part of the benchmark names
+# and must not change, otherwise results of different commits are not comparable.
+FORMULAS = {
+    "poly": "x^5-3*x^4*y+2*x^2*y^3-7*y+1",
+    "poly_horner": "((((x+1)*x-2)*x+3)*y-4)*x+y^2",
+    "trig_nested": "sin(cos(tan(x*y)+sin(x))*cos(y))",
+    "trig_mixed": "sin(x)^2+cos(y)^2-tan(x/(1+y^2))*atan(x*y)",
+    "pow_chain": "x^y^x^y^x^y",
+    "pow_deep": "((x^2+1)^0.5+(y^2+1)^0.5)^1.5^0.5",
+    "sum_20": _generatedSum(20),
+    "sum_200": _generatedSum(200),
+}
+
+# the point, at which the formulae are evaluated by AstNode.evaluate().
+POINT = {"x": 0.3, "y": 0.7}
+
+# the viewport of the grid benchmarks.
+GRID = {"xmin": -1.5, "xmax": 1.5, "ymin": 0.1, "ymax": 2.1}
+
+# standard integrands with the bounds of integration and the exact value,
+# None stands for an infinite bound. Note, that the unary minus binds
+# stronger than ^.
+INTEGRANDS = {
+    "x2": ("x^2",0.0,1.0,1.0/3.0),
+    "gauss": ("exp(-(x^2))",None,None,math.sqrt(math.pi)),
+    "oscillating": ("cos(50*x)",0.0,3.0,math.sin(150.0)/50.0),
+    "sqrt_singular": ("1/sqrt(x)",0.0,1.0,2.0),
+    "log_singular": ("ln(x)",0.0,1.0,-1.0),
+    "lorentz": ("1/(1+x^2)",0.0,None,math.pi/2.0),
+}
+
+# integrands, which need many divisions at a tight tolerance, with their
+# bounds and the relative tolerance. They compare the heap of tegral() with
+# the tree of the former implementation, see tegraltree.
+REFINEMENTS = {
+    "oscillating": ("cos(50*x)",0.0,3.0,1.0e-12),
+    "sqrt_singular": ("1/sqrt(x)",0.0,1.0,1.0e-12),
+    "x_sin200": ("x*sin(200*x)",0.0,100.0,1.0e-12),
+}
+
+# equations, which are solved by Solver.evaluate().
+EQUATIONS = {
+    "linear": "2*x+3=7",
+    "cubic": "5*(x-2)^3=40",
+    "exp": "exp(2*x+1)=y",
+    "sqrt": "sqrt(x^2+1)=3",
+    "quadratic": "a*x^2+b*x=c",
+}
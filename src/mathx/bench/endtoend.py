@@ -0,0 +1,120 @@
+'''
+End-to-end benchmarks of /mathx/evaluate against a local server.py.
+'''
+
+import http.client
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+from mathx.bench import corpus
+
+log = logging.getLogger(__name__)
+
+# the time in seconds to wait for the server to accept connections.
+STARTUP_TIMEOUT = 30.0
+
+# the requests sent to /mathx/evaluate by name as (formula,n,headers).
+REQUESTS = {
+    "json_poly_101": ("poly",101,{}),
+    "json_trig_501": ("trig_nested",501,{}),
+    "binary_trig_501": ("trig_nested",501,{"Accept": "application/x-mathx-grid"}),
+    "gzip_trig_501": ("trig_nested",501,{"Accept-Encoding": "gzip"}),
+    "binary_sum_200": ("sum_200",1001,{"Accept": "application/x-mathx-grid"}),
+}
+
+def serverScript():
+    '''
+      @return: The path of server.py next to the mathx package or None,
+               if mathx is not run from a source tree.
+    '''
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),"server.py")
+    return path if os.path.exists(path) else None
+
+def _freePort():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1",0))
+        return s.getsockname()[1]
+
+class LocalServer:
+    '''
+      Run server.py in a subprocess on a free local port. The grid cache and
+      the disk cache are disabled, so that every request is evaluated.
+    '''
+    def __init__(self,workers=1,script=None):
+        self.workers = workers
+        self.script = script or serverScript()
+        self.port = None
+        self.process = None
+
+    def __enter__(self):
+        self.port = _freePort()
+        env = dict(os.environ,
+                   HTTP_PORT=str(self.port),
+                   HTTP_ADDRESS="127.0.0.1",
+                   MATHX_WORKERS=str(self.workers),
+                   MATHX_GRID_CACHE_SIZE="0")
+        env.pop("MATHX_DISK_CACHE",None)
+        env.pop("HTTP_WEBROOT",None)
+        src = os.path.dirname(self.script)
+        env["PYTHONPATH"] = os.pathsep.join(p for p in (src,env.get("PYTHONPATH")) if p)
+
+        self.process = subprocess.Popen([sys.executable,self.script],cwd=src,env=env,
+                                        stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+        try:
+            self._waitReady()
+        except BaseException:
+            self.__exit__(None,None,None)
+            raise
+        return self
+
+    def _waitReady(self):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError("server.py exited with status [%d]."%self.process.returncode)
+            try:
+                socket.create_connection(("127.0.0.1",self.port),timeout=1.0).close()
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("server.py does not accept connections on port [%d]."%self.port)
+                time.sleep(0.05)
+
+    def __exit__(self,*exc):
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(10.0)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+
+def cases(port):
+    '''
+      Set up the end-to-end benchmarks against a server on the given port.
+      Each call sends one request over a kept-alive connection and reads
+      the whole response.
+
+      @return: A list of (name,func,info) tuples like cases.cases().
+    '''
+    ret = []
+    for name,(f,n,headers) in REQUESTS.items():
+        body = json.dumps(dict(corpus.GRID,f=corpus.FORMULAS[f],n=n)).encode("utf-8")
+        headers = dict(headers,**{"Content-Type": "application/json"})
+        connection = http.client.HTTPConnection("127.0.0.1",port)
+
+        def post(connection=connection,body=body,headers=headers):
+            connection.request("POST","/mathx/evaluate",body,headers)
+            response = connection.getresponse()
+            data = response.read()
+            if response.status != 200:
+                raise RuntimeError("/mathx/evaluate answered [%d]."%response.status)
+            return data
+
+        ret.append(("http/%s"%name,post,{"bytes": len(post())}))
+    return ret
@@ -0,0 +1,101 @@
+'''
+Timing of the benchmarks, the JSON report and the comparison of reports.
+'''
+
+import datetime
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import numpy
+
+# changes, whenever the results are no longer comparable to older reports.
+REPORT_VERSION = 1
+
+def measure(func,repeat=5,min_time=0.2):
+    '''
+      Time func like timeit, the number of calls per run is doubled, until
+      a run takes at least min_time seconds.
+
+      @return: A dict with the seconds per call of the fastest and of the
+               median run, the number of calls per run and the runs.
+    '''
+    def run(number):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - t0
+
+    number = 1
+    while True:
+        t = run(number)
+        if t >= min_time or number >= 1 << 20:
+            break
+        number *= 2 if t <= 0.0 else max(2,min(10,int(1.2*min_time/t)))
+
+    times = [t] + [run(number) for _ in range(repeat-1)]
+    times = [t/number for t in times]
+    return {"min": min(times),
+            "median": statistics.median(times),
+            "number": number,
+            "repeat": len(times)}
+
+def run(cases,repeat=5,min_time=0.2,selected=None,progress=None):
+    '''
+      Measure a list of (name,func,info) tuples.
+
+      @param selected A list of substrings, only cases containing one of
+                      them in their names are run, None runs all.
+      @param progress Called with the name of each case before it is run.
+      @return: A dict of results by name.
+    '''
+    ret = {}
+    for name,func,info in cases:
+        if selected and not any(s in name for s in selected):
+            continue
+        if progress is not None:
+            progress(name)
+        ret[name] = dict(info,**measure(func,repeat,min_time))
+    return ret
+
+def _commit():
+    try:
+        return subprocess.run(["git","describe","--always","--dirty"],
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True,text=True,timeout=10).stdout.strip() or None
+    except (OSError,subprocess.SubprocessError):
+        return None
+
+def report(results,**settings):
+    '''
+      @return: The results together with the commit, the environment and the
+               settings of the run.
+    '''
+    return {"version": REPORT_VERSION,
+            "commit": _commit(),
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": numpy.__version__,
+            "machine": platform.machine(),
+            "platform": sys.platform,
+            "cpus": os.cpu_count(),
+            "settings": settings,
+            "results": results}
+
+def compare(base,current):
+    '''
+      Compare the median times of two reports.
+
+      @return: A list of (name,base,current,ratio) for the benchmarks in both
+               reports, a ratio above 1 is a slowdown.
+    '''
+    ret = []
+    for name,result in sorted(current["results"].items()):
+        old = base["results"].get(name)
+        if old is None:
+            continue
+        ratio = result["median"]/old["median"] if old["median"] > 0.0 else float("inf")
+        ret.append((name,old["median"],result["median"],ratio))
+    return ret
@@ -0,0 +1,70 @@
+'''
+The recursive interval tree, which tegral() used before the heap over
+parallel arrays. It serves as the baseline of the tegral benchmarks.
+'''
+
+from mathx import tegral
+
+class TegralPartition:
+    '''
+      A self-dividing tree of intervals, each node refers to the child
+      containing the interval with the largest error.
+    '''
+
+    ERROR_WEIGHT_UNDIVIDED = 0
+    ERROR_WEIGHT_LEFT      = 1
+    ERROR_WEIGHT_RIGHT     = 2
+
+    def __init__(self,func,a,b):
+        '''
+          @param func The scalar function to integrate.
+        '''
+        self.error_weight = TegralPartition.ERROR_WEIGHT_UNDIVIDED
+        self.a = a
+        self.b = b
+        self.left = None
+        self.right = None
+
+        self.res,self.resabs,self.err = tegral._gaussKronrod(func,a,b)
+        self.max_err = self.err
+
+    def divide(self,func):
+
+        if self.error_weight == TegralPartition.ERROR_WEIGHT_RIGHT:
+            self.right.divide(func)
+        elif self.error_weight == TegralPartition.ERROR_WEIGHT_LEFT:
+            self.left.divide(func)
+        else: # TegralPartition.ERROR_WEIGHT_UNDIVIDED
+            center = (self.a+self.b)*0.5
+            self.left  = TegralPartition(func,self.a,center)
+            self.right = TegralPartition(func,center,self.b)
+
+        self.err    = self.right.err    + self.left.err
+        self.res    = self.right.res    + self.left.res
+        self.resabs = self.right.resabs + self.left.resabs
+
+        if self.right.max_err > self.left.max_err:
+            self.error_weight = TegralPartition.ERROR_WEIGHT_RIGHT
+            self.max_err      = self.right.max_err
+        else:
+            self.error_weight = TegralPartition.ERROR_WEIGHT_LEFT
+            self.max_err      = self.left.max_err
+
+def tegralTree(func,a,b,tol=1.0e-8,max_partitions=1000):
+    '''
+      Integrate the scalar function func over the finite interval [a,b]
+      by dividing a tree of TegralPartition objects.
+
+      @return: (res,n_parts) with the number of divisions.
+    '''
+    if a == b:
+        return 0.0,0
+
+    partition = TegralPartition(func,a,b)
+    n_parts = 0
+
+    while partition.err > tol*partition.resabs and n_parts < max_partitions:
+        partition.divide(func)
+        n_parts += 1
+
+    return partition.res,n_parts
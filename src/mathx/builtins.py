@@ -6,6 +6,11 @@ Created on 26.10.2015
 
 import math
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 def root(r,x):
     return math.pow(x,1.0/r)
 
@@ -60,3 +65,61 @@ BUILTIN_FUNCTIONS = {
                       "acsc": acsc,
                       "asec": asec
                     }
+
+def array_root(r,x):
+    return numpy.power(x,1.0/r)
+
+def array_sec(x):
+    return 1/numpy.cos(x)
+
+def array_csc(x):
+    return 1/numpy.sin(x)
+
+def array_cot(x):
+    return 1/numpy.tan(x)
+
+def array_acsc(x):
+    return numpy.arcsin(1/x)
+
+def array_asec(x):
+    return numpy.arccos(1/x)
+
+def array_sech(x):
+    return 1/numpy.cosh(x)
+
+def array_csch(x):
+    return 1/numpy.sinh(x)
+
+'''
+  numpy ufuncs matching BUILTIN_FUNCTIONS, None if numpy is not installed.
+'''
+if numpy is None:
+    NUMPY_FUNCTIONS = None
+else:
+    NUMPY_FUNCTIONS = {
+                      "sqrt": numpy.sqrt,
+                      "exp": numpy.exp,
+                      "ln": numpy.log,
+                      "log": numpy.log10,
+                      "sin": numpy.sin,
+                      "cos": numpy.cos,
+                      "tan": numpy.tan,
+                      "cot": array_cot,
+                      "asin": numpy.arcsin,
+                      "acos": numpy.arccos,
+                      "atan": numpy.arctan,
+                      "sinh": numpy.sinh,
+                      "cosh": numpy.cosh,
+                      "tanh": numpy.tanh,
+                      "asinh": numpy.arcsinh,
+                      "acosh": numpy.arccosh,
+                      "atanh": numpy.arctanh,
+                      "root": array_root,
+                      "abs": numpy.abs,
+                      "sec": array_sec,
+                      "csc": array_csc,
+                      "sech": array_sech,
+                      "csch": array_csch,
+                      "acsc": array_acsc,
+                      "asec": array_asec
+                    }
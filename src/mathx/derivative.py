@@ -0,0 +1,175 @@
+'''
+Symbolic differentiation of formula ASTs.
+'''
+
+import functools
+from mathx import formula
+from mathx import rewrite
+from mathx.ast import AstNode, AstProgram, AstConstant, AstVariable, AstBinaryOperator, AstNegation, AstRoot, AstFunctionCall
+
+# the number of simplified derivatives kept by derivative().
+CACHE_SIZE = 4096
+
+ZERO = AstConstant(0.0)
+ONE = AstConstant(1.0)
+
+# derivatives of the builtin functions w.r.t. their argument u.
+FUNCTION_DERIVATIVES = {
+                         "sqrt": "0.5/sqrt(u)",
+                         "exp": "exp(u)",
+                         "ln": "1/u",
+                         "log": "1/(ln(10)*u)",
+                         "sin": "cos(u)",
+                         "cos": "-sin(u)",
+                         "tan": "sec(u)^2",
+                         "cot": "-(csc(u)^2)",
+                         "asin": "1/sqrt(1-u^2)",
+                         "acos": "-1/sqrt(1-u^2)",
+                         "atan": "1/(1+u^2)",
+                         "sinh": "cosh(u)",
+                         "cosh": "sinh(u)",
+                         "tanh": "sech(u)^2",
+                         "asinh": "1/sqrt(u^2+1)",
+                         "acosh": "1/sqrt(u^2-1)",
+                         "atanh": "1/(1-u^2)",
+                         "abs": "u/abs(u)",
+                         "sec": "sec(u)*tan(u)",
+                         "csc": "-csc(u)*cot(u)",
+                         "sech": "-sech(u)*tanh(u)",
+                         "csch": "-csch(u)*cosh(u)/sinh(u)",
+                         "acsc": "-1/(abs(u)*sqrt(u^2-1))",
+                         "asec": "1/(abs(u)*sqrt(u^2-1))"
+                       }
+
+_TEMPLATES = {func: formula.Parser(f).parseAst() for func,f in FUNCTION_DERIVATIVES.items()}
+
+def _rebuild(node,operands):
+    '''
+      @return: A node of the same type as node with the given operands.
+    '''
+    cls,fields = node.__reduce__()
+    operands = iter(operands)
+    return cls(*[next(operands) if isinstance(v,AstNode) else v for v in fields])
+
+def substitute(node,variables):
+    '''
+      Replace variables in a formula.
+
+      @param variables A dict mapping variable names to AST nodes.
+    '''
+    program = AstProgram((node,))
+    values = []
+    for n,args in zip(program.nodes,program.args):
+        if type(n) == AstVariable:
+            values.append(variables.get(n.variable,n))
+        elif args:
+            values.append(_rebuild(n,[values[i] for i in args]))
+        else:
+            values.append(n)
+    return values[-1]
+
+def _add(a,b):
+    if a is ZERO:
+        return b
+    if b is ZERO:
+        return a
+    return AstBinaryOperator(a,"+",b)
+
+def _sub(a,b):
+    if b is ZERO:
+        return a
+    if a is ZERO:
+        return AstNegation(b)
+    return AstBinaryOperator(a,"-",b)
+
+def _mul(a,b):
+    if a is ZERO or b is ZERO:
+        return ZERO
+    if a is ONE:
+        return b
+    if b is ONE:
+        return a
+    return AstBinaryOperator(a,"*",b)
+
+def _div(a,b):
+    if a is ZERO:
+        return ZERO
+    return AstBinaryOperator(a,"/",b)
+
+def _derive(node,ops,dops,variable):
+    '''
+      The derivative of a single node by the chain rule.
+
+      @param ops The operands of node.
+      @param dops The derivatives of the operands.
+    '''
+    t = type(node)
+
+    if t == AstConstant:
+        return ZERO
+
+    if t == AstVariable:
+        return ONE if node.variable == variable else ZERO
+
+    if t == AstNegation:
+        return ZERO if dops[0] is ZERO else AstNegation(dops[0])
+
+    if t == AstBinaryOperator:
+        a,b = ops
+        da,db = dops
+
+        if node.op == "+":
+            return _add(da,db)
+        if node.op == "-":
+            return _sub(da,db)
+        if node.op == "*":
+            return _add(_mul(da,b),_mul(a,db))
+        if node.op == "/":
+            if db is ZERO:
+                return _div(da,b)
+            return _div(_sub(_mul(da,b),_mul(a,db)),AstBinaryOperator(b,"^",AstConstant(2.0)))
+        if node.op == "^":
+            # a^b with a constant exponent is also defined for negative a.
+            if db is ZERO:
+                return _mul(_mul(b,AstBinaryOperator(a,"^",AstBinaryOperator(b,"-",ONE))),da)
+            log = AstFunctionCall("ln",a)
+            if da is ZERO:
+                return _mul(_mul(node,log),db)
+            return _mul(node,_add(_mul(db,log),_div(_mul(b,da),a)))
+
+    if t == AstRoot:
+        # root(p,u) = u^(1/p)
+        u,p = ops
+        du,dp = dops
+        ret = _div(_mul(node,du),AstBinaryOperator(p,"*",u))
+        if dp is not ZERO:
+            ret = _sub(ret,_div(_mul(_mul(node,AstFunctionCall("ln",u)),dp),AstBinaryOperator(p,"^",AstConstant(2.0))))
+        return ret
+
+    if t == AstFunctionCall:
+        if dops[0] is ZERO:
+            return ZERO
+        template = _TEMPLATES.get(node.func)
+        if template is None:
+            raise ValueError("Derivative of function [%s] is unknown."%node.func)
+        return _mul(substitute(template,{"u": ops[0]}),dops[0])
+
+    raise ValueError("Derivative of [%s] is unknown."%node)
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def derivative(node,variable):
+    '''
+      Compute the simplified partial derivative of a formula.
+
+      The derivatives of all subexpressions are computed once in a single
+      pass over the instructions of the formula, the results are cached
+      for each pair of node and variable.
+
+      @param variable The name of the variable.
+      @return: The derivative as an AST node.
+    '''
+    program = AstProgram((node,))
+    values = []
+    for n,args in zip(program.nodes,program.args):
+        values.append(_derive(n,[program.nodes[i] for i in args],[values[i] for i in args],variable))
+    return rewrite.simplify(values[-1])
@@ -5,101 +5,16 @@ Created on 18.10.2015
 '''
 
 import logging
-import string
+import os
+import re
 import math
+import threading
+from collections import OrderedDict
 from mathx import ast
 from mathx.builtins import BUILTIN_FUNCTIONS
  
 log = logging.getLogger('mathx.formula')
 
-class Token:
-    '''
-      operator '+', '-', '*', '/' or '(' or ')' or None (end-of-string marker).
-               ' ' means number
-      precedence:
-        -1 number
-        0  terminator (')' or EOS) or comma ','
-        1  '+','-' 
-        2  '*','/' 
-        3 '^' 
-        15 '(', builtin functions
-    
-     numeric value, if precedence == -1
-        for groups and builtin function, value is set to 1.0 or -1.0
-        in order to reflect a minus sign, which immediately precedes
-        the builtin function or group like in "-(a+b)" or "a*-sin(x)"
-    '''
-    
-    def __init__(self,operator,precedence,sign):
-        self.operator = operator
-        self.precedence = precedence
-        self.value = sign
-    
-    @staticmethod
-    def newOperator(operator,precedence):
-        return Token(operator,precedence,1.0)
-
-    @staticmethod
-    def newBuiltin(operator,sign):
-        return Token(operator,0xf,sign)
-
-    @staticmethod
-    def newOpeningParentheses(sign):
-        return Token('(',0xf,sign)
-
-    @staticmethod
-    def newClosingParentheses():
-        return Token(')',0,1.0)
-
-    @staticmethod
-    def newNumber(value):
-        return Token('',-1,value)
-    
-    @staticmethod
-    def newVariable(variable,sign):
-        return Token(variable,-1,sign)
-
-    @staticmethod
-    def newEOS():
-        return Token(None,0,1.0)
-
-    def isNumber(self):
-        return self.precedence < 0
-    
-    def hasAst(self):
-        return hasattr(self,"ast") or self.isNumber()
-    
-    def getAst(self):
-        if hasattr(self,"ast"):
-            return self.ast
-        elif self.isNumber():
-            if self.operator == '':
-                return ast.AstConstant(self.value)
-            elif self.value < 0:
-                return ast.AstNegation(ast.AstVariable(self.operator))
-            else:
-                return ast.AstVariable(self.operator)
-        else:
-            return None
-            
-    def setAst(self,ast):
-        self.ast = ast
-
-    def __str__(self):
-        if self.operator == None:
-            return "EOS"
-        
-        if self.precedence < 0 and self.operator == '':
-            return str(self.value)
-        
-        if hasattr(self,"ast"):
-            return str(self.ast)
-        
-        return self.operator
-    
-    def __repr__(self):
-        return str(self)
-
 class ParseException(Exception):
     
     def __init__(self,message,formula,position=None):
@@ -120,407 +35,335 @@ class ParseException(Exception):
 
 GREEK_LETTERS = "".join([chr(i) for i in range(0x3b1,0x3ca)])
 
+# the tokens of a formula, whitespace in front of a token is skipped.
+_TOKEN_RE = re.compile(r'''[ \t\n\r\x0b\x0c]*(?:
+     ((?:[0-9]+\.?[0-9]*|\.[0-9]*)(?:[eE][+-]?[0-9]*)?)
+    |([A-Za-z_%s][A-Za-z_%s0-9]*)
+    |([-+*/^(),])
+    |([^ \t\n\r\x0b\x0c])
+    )'''%(GREEK_LETTERS,GREEK_LETTERS),re.VERBOSE)
+
+def tokenize(formula):
+    '''
+      Split a formula into tokens.
+      
+      @return: A list of (kind,value) tuples, where kind is "number", "name",
+               the operator character or None for the end of the formula.
+    '''
+    tokens = []
+    append = tokens.append
+    
+    for number,name,op,other in _TOKEN_RE.findall(formula):
+        if op:
+            append((op,None))
+        elif name:
+            append(("name",name))
+        elif number:
+            try:
+                append(("number",float(number)))
+            except ValueError:
+                if number[0] == "." and not number[1:2].isdigit():
+                    raise ParseException("Formula contains a plain dot.",formula,tokenPosition(formula,len(tokens))) from None
+                raise ParseException("Formula contains number with no digist after exponent.",formula,tokenPosition(formula,len(tokens))) from None
+        else:
+            raise ParseException("Formula contains unexpected character [%s]."%other,formula,tokenPosition(formula,len(tokens)))
+    
+    append((None,None))
+    return tokens
+
+def tokenPosition(formula,index):
+    '''
+      @return: The position of the token with the given index in the formula,
+               positions are only calculated for error messages.
+    '''
+    for i,m in enumerate(_TOKEN_RE.finditer(formula)):
+        if i == index:
+            return m.start(m.lastindex)
+    return len(formula)
+
+# the precedence of the binary operators.
+BINARY_PRECEDENCE = {"+":1,"-":1,"*":2,"/":2,"^":3}
+
 class Parser(object):
     '''
        Parser for mathematic formulae.
+       
+       The formula is split into tokens by a regular expression and parsed by
+       an operator precedence loop with explicit stacks, so that neither long
+       chains of operators nor deeply nested parentheses recurse and the time
+       is linear in the length of the formula.
+       
+       A minus sign in front of a number, variable, builtin function or
+       parenthesized expression binds stronger than any binary operator,
+       so -2^2 is 4.
     '''
     
     def __init__(self,formula):
         self.formula = formula
     
-    def _skipWhite(self):
-        
-        while (self.position < len(self.formula) and
-               self.formula[self.position] in string.whitespace):
-            self.position += 1
-            
-        if self.position >= len(self.formula):
-            return None
-        else:
-            return self.formula[self.position]
+    def _error(self,message,index):
+        return ParseException(message,self.formula,tokenPosition(self.formula,index))
     
-    def _advance(self):
-        self.position += 1
-        if self.position >= len(self.formula):
-            return None
-        else:
-            return self.formula[self.position]
+    def _reduce(self,operands,operators,prec):
+        '''
+          Apply the pending binary operators on the stack, which bind at
+          least as strong as an operator of the given precedence.
+        '''
+        while operators:
+            op = operators[-1][0]
+            p = BINARY_PRECEDENCE.get(op)
+            
+            # exponentiation is right-associative.
+            if p is None or p < prec or (p == prec and op == "^"):
+                return
+            
+            operators.pop()
+            rhs = operands.pop()
+            operands[-1] = self._binary(operands[-1],op,rhs)
     
-    def _pushToken(self):
+    def _parse(self):
         
-        c = self._skipWhite()
+        tokens = tokenize(self.formula)
+        # the operand stack and the stack of pending operators, groups and
+        # function calls. Groups and calls store their negation and the number
+        # of operands below them, operators store their token index.
+        operands = []
+        operators = []
+        expectOperand = True
+        negate = False
+        i = 0
         
-        if c == None:
-            self.stack.append(Token.newEOS())
-            if (log.isEnabledFor(logging.DEBUG)):
-                log.debug("_pushToken(EOS): stack is now %s"%self.stack)
-            return False
+        while True:
+            kind,value = tokens[i]
             
-        token = None
-        sign = 1.0
-        
-        if c == "(":
-            token = Token.newOpeningParentheses(sign)
-            c = self._advance()
-        elif c == ")":
-            token = Token.newClosingParentheses()
-            c = self._advance()
-        elif c == ",":
-            token = Token.newOperator(c,0)
-            c = self._advance()
-        elif c == "^":
-            token = Token.newOperator(c,3)
-            c = self._advance()
-        elif c == "/" or c == "*":
-            token = Token.newOperator(c,2)
-            c = self._advance()
-        elif c == "+":
-            token = Token.newOperator(c,1)
-            c = self._advance()
-        elif c == "-":
-            # check, whether this is a sign after an operator or at the start of an expression.
-            if (len(self.stack) <= 0 or
-                self.stack[-1].precedence > 0):
-                
-                c = self._advance()
-                
-                if c != None:
-                    c = self._skipWhite()
-                
-                if c == None:
-                    raise ParseException("Unexpected end of formula after minus sign.",self.formula,self.position)
-                
-                sign = -1.0;
-                
-                if c=='-':
-                    raise ParseException("Formula contains superfluous minus signs.",self.formula,self.position)
-                
-                if c=='(':
-                    token = Token.newOpeningParentheses(sign);
-                    c = self._advance()
-                    
-            else:
-                # binary minus operator.
-                token = Token.newOperator(c,1)
-                c = self._advance()
-        
-        if token == None:
-           
-            # check for identifier
-            if c in string.ascii_letters or c in GREEK_LETTERS or c == "_":
-                
-                spos = self.position
-                c = self._advance()
-                
-                # valid variable names are _asdf123 ___3 _asd2_3d
-                
-                while (c != None and
-                       (c in string.ascii_letters or
-                        c in GREEK_LETTERS or
-                        c == '_' or c in string.digits)):
-                    c = self._advance()
-
-                variable = self.formula[spos:self.position]
+            if expectOperand:
                 
-                # FIXME check for builtin function
-                func = BUILTIN_FUNCTIONS.get(variable)
+                if kind == "-" and not negate:
+                    kind = tokens[i+1][0]
+                    if kind == None:
+                        raise self._error("Unexpected end of formula after minus sign.",i+1)
+                    if kind == "-":
+                        raise self._error("Formula contains superfluous minus signs.",i+1)
+                    if kind != "number" and kind != "name" and kind != "(":
+                        raise self._error("Formula contains unexpected character [%s]."%kind,i+1)
+                    negate = True
                 
-                if func == None:
+                elif kind == "number":
+                    operands.append(self._constant(-value if negate else value))
+                    negate = False
+                    expectOperand = False
                 
-                    if self.variables == None:
-                        # AST parsing
-                        token = Token.newVariable(variable,sign)
-                    else: 
-                        # classical, immediate evaluation
-                        value = self.variables.get(variable)
+                elif kind == "(":
+                    operators.append(("(",negate,len(operands),i))
+                    negate = False
                 
-                        if value == None:
-                            raise ParseException("Formula contains unknown variable [%s]."%variable,self.formula,self.position)
-
-                        token = Token.newNumber(value*sign)
-                
-                else:
-                    c = self._skipWhite()
+                elif kind == "name":
                     
-                    if c != "(":
-                        raise ParseException("Formula does not contain an openeing paraentheses after builin function [%s]."%variable,self.formula,self.position)
+                    if value in BUILTIN_FUNCTIONS:
+                        if tokens[i+1][0] != "(":
+                            raise self._error("Formula does not contain an openeing paraentheses after builin function [%s]."%value,i)
+                        operators.append((value,negate,len(operands),i))
+                        i += 1
+                    else:
+                        operand = self._variable(value,i)
+                        operands.append(self._negate(operand) if negate else operand)
+                        expectOperand = False
                     
-                    c = self._advance()
-   
-                    token = Token.newBuiltin(variable,sign)
-                
-            elif c in string.digits or c == ".":
+                    negate = False
                 
-                spos = self.position
-                ndigits = 0
+                else:
+                    raise self._error("Cannot reduce formula.",i)
+            
+            elif kind in BINARY_PRECEDENCE:
+                self._reduce(operands,operators,BINARY_PRECEDENCE[kind])
+                operators.append((kind,i))
+                expectOperand = True
+            
+            elif kind == ",":
+                self._reduce(operands,operators,0)
+                if not operators or operators[-1][0] not in BUILTIN_FUNCTIONS:
+                    raise self._error("Cannot reduce formula.",i)
+                expectOperand = True
+            
+            elif kind == ")":
+                self._reduce(operands,operators,0)
+                if not operators:
+                    raise self._error("Cannot reduce formula.",i)
                 
-                # number befor the decimal point
-                while (c != None and
-                       c in string.digits):
-                    c = self._advance()
-                    ndigits += 1
+                name,negated,base,start = operators.pop()
                 
-                # decimal point present?
-                if (self.position < len(self.formula) and
-                       c == '.'):
-                    
-                    c = self._advance()
+                if name != "(":
+                    args = operands[base:]
+                    del operands[base:]
+                    operands.append(self._call(name,args,start))
                 
-                    # digits after the decimal point
-                    while (c != None and
-                       c in string.digits):
-                        c = self._advance()
-                        ndigits += 1
-                        
-                # no digits so far
-                if ndigits == 0:
-                    raise ParseException("Formula contains a plain dot.",self.formula,self.position)
-                
-                # check for exponent
-                if c == 'E' or c == 'e':
-                    
-                    edigits = 0
-                    # check for sign of exponent
-                    c = self._advance()
-                    
-                    if c == '+' or c == '-':
-                        c = self._advance()
-                    
-                    # digits after the decimal point
-                    while (c != None and
-                       c in string.digits):
-                        c = self._advance()
-                        edigits += 1
-                    
-                    if edigits == 0:
-                        raise ParseException("Formula contains number with no digist after exponent.",self.formula,self.position)
-                 
-                numberString = self.formula[spos:self.position]
-                token = Token.newNumber(float(numberString)*sign)
+                if negated:
+                    operands[-1] = self._negate(operands[-1])
+            
+            elif kind == None:
+                self._reduce(operands,operators,0)
+                if operators:
+                    raise self._error("Cannot reduce formula.",i)
+                return operands[0]
             
             else:
-                raise ParseException("Formula contains unexpected character [%s]."%c,self.formula,self.position)
-                
-        self.stack.append(token)
-    
-        if (log.isEnabledFor(logging.DEBUG)):
-            log.debug("_pushToken: stack is now %s"%self.stack)
+                raise self._error("Cannot reduce formula.",i)
+            
+            i += 1
     
-        return True
+    def _constant(self,value):
+        if self.variables == None:
+            return ast.AstConstant(value)
+        return value
     
-    def _reduce(self):
+    def _variable(self,variable,index):
+        if self.variables == None:
+            return ast.AstVariable(variable)
         
-        if len(self.stack)<4:
-            return False
+        value = self.variables.get(variable)
         
-        last = self.stack[-1];
-        last1 = self.stack[-2];
-        last2 = self.stack[-3];
-        last3 = self.stack[-4];
+        if value == None:
+            raise self._error("Formula contains unknown variable [%s]."%variable,index)
         
-        if last3.precedence == 0xf and last2.isNumber() and last1.operator == ')':
-        
-            func = BUILTIN_FUNCTIONS.get(last3.operator)
+        return value
+    
+    def _negate(self,value):
+        if self.variables == None:
+            return ast.AstNegation(value)
+        return -value
+    
+    def _binary(self,lhs,op,rhs):
+        if self.variables == None:
+            return ast.AstBinaryOperator(lhs,op,rhs)
         
-            # take into account sign before brace...
-            if func != None:
-                # builtin function
-                if type(last2.value) == tuple:
-                    # multi-arg functions.
-                    last2.value = last3.value * func(*last2.value)
-                else:
-                    last2.value = last3.value * func(last2.value)
-            else:
-                # opening brace
-                last2.value *= last3.value;
-            
-            # x( <number> ) yyy -> x( <number> yyy
-            self.stack.pop(-2)
-            # x( <number> yyy -> <number> yyy
-            self.stack.pop(-3)
-            
-            if (log.isEnabledFor(logging.DEBUG)):
-                log.debug("_reduce(parentheses): stack is now %s"%self.stack)
-
-            return True
+        if op == '+':
+            return lhs + rhs
+        elif op == '-':
+            return lhs - rhs
+        elif op == '*':
+            return lhs * rhs
+        elif op == '/':
+            return lhs / rhs
+        else:
+            return math.pow(lhs,rhs)
+    
+    def _call(self,name,args,index):
+        if self.variables != None:
+            return BUILTIN_FUNCTIONS[name](*args)
         
+        if name == "root":
+            if len(args) != 2:
+                raise self._error("root must have exaclty two positional arguments.",index)
+            return ast.AstRoot(args[1],args[0])
         
-        # <number> <op1> <number> <op2>
-        if last3.isNumber() and last1.isNumber() :
-            
-            # <op1> has a lower precedence than pending <op2>, do nothing
-            if last2.precedence < last.precedence:
-                return False
-             
-            # exponentiation is right-associative.
-            if last.precedence == 3 and last2.precedence == 3:
-                return False
-            
-            if last2.operator == ',':
-                if type(last3.value) == tuple:
-                    last3.value += (last1.value,)
-                else:
-                    last3.value = (last3.value,last1.value)
-            elif last2.operator == '+':
-                last3.value += last1.value
-            elif last2.operator == '-':
-                last3.value -= last1.value
-            elif last2.operator == '*':
-                last3.value *= last1.value;
-            elif last2.operator == '/':
-                last3.value /= last1.value;
-            elif last2.operator ==  '^':
-                last3.value = math.pow(last3.value,last1.value);
-            else:
-                return False
-            
-            # <number> <op1> <number> <op2> -> <number> <op2> -> 
-            self.stack.pop(-2)
-            self.stack.pop(-2)
-            
-            if (log.isEnabledFor(logging.DEBUG)):
-                log.debug("_reduce(binary): stack is now %s"%self.stack)
-
-            return True
-
-        return False
-    
-    def _getValue(self):
-        if (len(self.stack) != 2 or
-            not self.stack[0].isNumber() or 
-            self.stack[1].operator != None  or
-            type(self.stack[0].value) == tuple):
-            raise ParseException("Cannot reduce formula.",self.formula,self.position);
+        if len(args) != 1:
+            raise self._error("builtin function must not have more than one positional argument.",index)
         
-        return self.stack[0].value;
+        return ast.AstFunctionCall(name,args[0])
     
     def evaluate(self, variables = {}):
         
         self.variables = variables
-        self.stack = []
-        self.position = 0
-        
-        while self._pushToken():
-            while self._reduce():
-                pass
-        
-        while self._reduce():
-            pass
+        return self._parse()
+    
+    def parseAst(self):
         
-        return self._getValue()
+        self.variables = None
+        return self._parse()
 
-    def _reduceAst(self):
-        
-        if len(self.stack)<4:
-            return False
-        
-        last = self.stack[-1];
-        last1 = self.stack[-2];
-        last2 = self.stack[-3];
-        last3 = self.stack[-4];
-        
-        if last3.precedence == 0xf and last2.hasAst() and last1.operator == ')':
+class ParsedFormula:
+    '''
+      A parsed formula together with its variables, its simplified form and
+      its compiled functions as stored in the FormulaCache.
+      
+      The AST nodes are immutable and may be shared by all users of the cache.
+    '''
+    
+    def __init__(self,formula):
+        self.formula = formula
+        self.ast = Parser(formula).parseAst()
+        self.variables = list(self.ast.findVars({}))
+        self.simplified = self.ast.simplify()
+        self.program = ast.AstProgram((self.simplified,))
+        # the number of operations needed for a single evaluation of the
+        # simplified formula, common subexpressions are computed once.
+        self.cost = 1 + sum(1 for node in self.program.nodes if node.operands())
+        self._compiled = {}
+        self._lock = threading.Lock()
+    
+    def compile(self,variables=None,vectorized=False):
+        '''
+          Return the compiled simplified formula, see AstNode.compile(). The
+          variables default to the order of their first occurrence in the
+          original formula, even if the simplified formula lacks some of them.
+        '''
+        if variables is None:
+            variables = self.variables
         
-            func = BUILTIN_FUNCTIONS.get(last3.operator)
+        key = (tuple(variables),vectorized)
         
-            # take into account sign before brace...
-            if func != None:
-                
-                ast2 = last2.getAst()
-                
-                if last3.operator == "root":
+        with self._lock:
+            func = self._compiled.get(key)
+            if func is None:
+                func = self.simplified.compile(variables,vectorized)
+                self._compiled[key] = func
+        return func
 
-                    if type(ast2) != tuple or len(ast2) != 2:
-                        raise ParseException("root must have exaclty two positional arguments.",self.formula,self.position);
-                    
-                    # root operator
-                    if last3.value < 0.0 :
-                        last2.ast = ast.AstNegation(ast.AstRoot(ast2[1],ast2[0]))
-                    else:
-                        last2.ast = ast.AstRoot(ast2[1],ast2[0])
-                    
-                else:
-                    if type(ast2) == tuple:
-                        raise ParseException("builtin function must not have more than one positional argument.",self.formula,self.position);
-
-                    # builtin function
-                    if last3.value < 0.0 :
-                        last2.ast = ast.AstNegation(ast.AstFunctionCall(last3.operator,ast2))
-                    else:
-                        last2.ast = ast.AstFunctionCall(last3.operator,ast2)
-                    
-            else:
-                # open brace with negation
-                if last3.value < 0.0 :
-                    last2.ast = ast.AstNegation(last2.getAst())
-            
-            # x( <number> ) yyy -> x( <number> yyy
-            self.stack.pop(-2)
-            # x( <number> yyy -> <number> yyy
-            self.stack.pop(-3)
-            
-            if (log.isEnabledFor(logging.DEBUG)):
-                log.debug("_reduceAst(parentheses): stack is now %s"%self.stack)
-
-            return True
+class FormulaCache:
+    '''
+      A bounded LRU cache of ParsedFormula objects keyed by the formula string.
+      
+      The factory may be replaced to cache other objects built from a hashable key.
+    '''
+    
+    def __init__(self,maxsize=256,factory=ParsedFormula):
+        self.maxsize = maxsize
+        self.factory = factory
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self,formula):
+        with self.lock:
+            entry = self.entries.get(formula)
+            if entry is not None:
+                self.entries.move_to_end(formula)
+                self.hits += 1
+                return entry
+            self.misses += 1
         
+        # parse outside of the lock, a ParseException is not cached.
+        entry = self.factory(formula)
         
-        # <number> <op1> <number> <op2>
-        if last3.hasAst() and last1.hasAst() :
-            
-            # <op1> has a lower precedence than pending <op2>, do nothing
-            if last2.precedence < last.precedence:
-                return False
-             
-            # exponentiation is right-associative.
-            if last.precedence == 3 and last2.precedence == 3:
-                return False
-            
-            if last2.operator == ',':
-                
-                ast3 = last3.getAst()
-                
-                if type(ast3) == tuple:
-                    last3.ast = ast3 + (last1.getAst(),)
-                else:
-                    last3.ast = (ast3,last1.getAst())
-
-            elif last2.operator == '+' or last2.operator == '-' or last2.operator == '*' or last2.operator == '/'or last2.operator ==  '^':
-                last3.ast = ast.AstBinaryOperator(last3.getAst(),last2.operator,last1.getAst());
-            else:
-                return False
-            
-            # <number> <op1> <number> <op2> -> <number> <op2> -> 
-            self.stack.pop(-2)
-            self.stack.pop(-2)
-            
-            if (log.isEnabledFor(logging.DEBUG)):
-                log.debug("_reduceAst(binary): stack is now %s"%self.stack)
-
-            return True
-
-        return False
+        with self.lock:
+            self.entries[formula] = entry
+            self.entries.move_to_end(formula)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        
+        return entry
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+    
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.entries),
+                    "maxsize": self.maxsize,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions }
 
-    def _getAst(self):
-        if (len(self.stack) != 2 or
-            not (self.stack[0].hasAst()) or 
-            self.stack[1].operator != None or
-            type(self.stack[0].getAst()) == tuple):
-            raise ParseException("Cannot reduce formula.",self.formula,self.position)
-            
-        return self.stack[0].getAst()
+FORMULA_CACHE = FormulaCache(max(1,int(os.getenv("MATHX_FORMULA_CACHE_SIZE","256"))))
 
-    def parseAst(self):
-        
-        self.variables = None
-        self.stack = []
-        self.position = 0
-        
-        while self._pushToken():
-            while self._reduceAst():
-                pass
-        
-        while self._reduceAst():
-            pass
-        
-        return self._getAst()
+def parseCached(formula):
+    '''
+      Parse the given formula through the module-level FORMULA_CACHE.
+      
+      @return: A shared ParsedFormula object.
+    '''
+    return FORMULA_CACHE.get(formula)
@@ -145,7 +145,7 @@ class Window(Gtk.Window):
         
         if len(self.vars)==1:
             var = list(self.vars.keys())[0]
-            self.formulacanvas.func = lambda x:(node.evaluate({var:x}))
+            self.formulacanvas.func = node.compile([var])
             self.formulacanvas.queue_draw()
         
     def _show_tree(self,node):
@@ -156,13 +156,11 @@ class Window(Gtk.Window):
         self.treeView.expand_all()
 
     def simplify_clicked(self,event):
-        parser = formula.Parser(self.formula_entry.get_text())
         try:
-            node = parser.parseAst()
+            node = formula.parseCached(self.formula_entry.get_text()).simplified
         except:
             return
         
-        node = node.simplify()
         self.formula_entry.set_text(str(node))
         self._show(node)
     def count_clicked(self,event):
@@ -173,9 +171,8 @@ class Window(Gtk.Window):
         Gtk.main()
         
     def formula_changed(self,target,param):
-        parser = formula.Parser(self.formula_entry.get_text())
         try:
-            node = parser.parseAst()
+            node = formula.parseCached(self.formula_entry.get_text()).ast
         except:
             return
         
@@ -211,9 +208,8 @@ class Window(Gtk.Window):
         
         
     def var_changed(self,target,param,node):
-        fopa = formula.Parser(target.get_text())
         try:
-            i = fopa.evaluate()
+            i = formula.parseCached(target.get_text()).ast.evaluate()
         except:
             pass
         else:
@@ -0,0 +1,379 @@
+'''
+Algebraic simplification of formula ASTs by rewriting to a fixed point.
+'''
+
+import math
+import weakref
+from mathx.ast import AstProgram, AstConstant, AstVariable, AstBinaryOperator, AstNegation, AstRoot, AstFunctionCall
+
+# the maximal number of rewrite passes of simplify().
+MAX_PASSES = 16
+
+# functions defined for all real arguments, which do not overflow.
+TOTAL_FUNCTIONS = {"sin","cos","atan","tanh","asinh","abs","sech"}
+
+SUM_OPERATORS = ("+","-")
+PRODUCT_OPERATORS = ("*","/")
+
+# weak references to the simplified forms of all living nodes, which have
+# been simplified before, the values must not keep the keys alive.
+_SIMPLIFIED = weakref.WeakKeyDictionary()
+
+def _lookup(node):
+    ref = _SIMPLIFIED.get(node)
+    return None if ref is None else ref()
+
+def _fold(node,args):
+    '''
+      @return: The constant value of node for the given constant operands
+               or None, if the evaluation fails.
+    '''
+    try:
+        value = node._compute(args,{})
+    except (ArithmeticError,ValueError,TypeError):
+        return None
+    if type(value) != float or not math.isfinite(value):
+        return None
+    return AstConstant(value)
+
+def _integer(node):
+    '''
+      @return: The value of an integral constant node or None.
+    '''
+    if type(node) == AstConstant and math.isfinite(node.value) and node.value == int(node.value):
+        return int(node.value)
+    return None
+
+def isTotal(node):
+    '''
+      Check, whether a formula is defined for all real values of its
+      variables, so that terms like 0*x may be dropped.
+    '''
+    for n in AstProgram((node,)).nodes:
+        t = type(n)
+        if t == AstBinaryOperator:
+            if n.op == "/" or (n.op == "^" and (_integer(n.rhs) is None or n.rhs.value < 0)):
+                return False
+        elif t == AstFunctionCall:
+            if n.func not in TOTAL_FUNCTIONS:
+                return False
+        elif t == AstRoot:
+            return False
+    return True
+
+def _isSum(node):
+    return type(node) == AstNegation or (type(node) == AstBinaryOperator and node.op in SUM_OPERATORS)
+
+def _isProduct(node):
+    return type(node) == AstNegation or (type(node) == AstBinaryOperator and node.op in PRODUCT_OPERATORS)
+
+class Product:
+    '''
+      A product in flattened n-ary form: num/den times the product of the
+      factors base^exponent with integral exponents.
+
+      Factors with positive and negative exponents are collected separately,
+      so that x^2/x is not reduced to x, which would be defined for x=0.
+    '''
+    def __init__(self,node):
+        self.node = node
+        self.num = 1.0
+        self.den = 1.0
+        # (base,exponent > 0) -> exponent in order of appearance.
+        self.factors = {}
+        # true, if the product contains a division by a constant zero.
+        self.undefined = False
+
+    @staticmethod
+    def flatten(node):
+        ret = Product(node)
+        stack = [(node,1,False)]
+
+        while stack:
+            n,e,divided = stack.pop()
+            t = type(n)
+
+            if t == AstNegation:
+                ret.num = -ret.num
+                stack.append((n.target,e,divided))
+            elif t == AstBinaryOperator and n.op == "*":
+                stack.append((n.rhs,e,divided))
+                stack.append((n.lhs,e,divided))
+            elif t == AstBinaryOperator and n.op == "/" and not divided:
+                # a/(b/c) is not defined for c=0, unlike a*c/b.
+                stack.append((n.rhs,-e,True))
+                stack.append((n.lhs,e,divided))
+            elif t == AstConstant:
+                if n.value == 0.0 and e < 0:
+                    ret.undefined = True
+                if e > 0:
+                    ret.num *= n.value
+                else:
+                    ret.den *= n.value
+            elif (t == AstBinaryOperator and n.op == "^" and type(n.lhs) != AstConstant and
+                  _integer(n.rhs) is not None and (_integer(n.rhs) >= 0 or not divided)):
+                ret.add(n.lhs,e*_integer(n.rhs))
+            else:
+                ret.add(n,e)
+
+        return ret
+
+    def add(self,base,exponent):
+        key = (base,exponent > 0)
+        self.factors[key] = self.factors.get(key,0) + exponent
+
+    @staticmethod
+    def _power(base,exponent):
+        if exponent == 1:
+            return base
+        return AstBinaryOperator(base,"^",AstConstant(float(exponent)))
+
+    def monomial(self):
+        '''
+          @return: The product of the factors without the numeric coefficient
+                   or None, if there are no factors with positive exponents.
+        '''
+        ret = None
+        for (base,positive),exponent in self.factors.items():
+            if positive:
+                f = Product._power(base,exponent)
+                ret = f if ret is None else AstBinaryOperator(ret,"*",f)
+        return ret
+
+    def denominator(self):
+        ret = None
+        for (base,positive),exponent in self.factors.items():
+            if not positive:
+                f = Product._power(base,-exponent)
+                ret = f if ret is None else AstBinaryOperator(ret,"*",f)
+        return ret
+
+    def build(self):
+
+        if self.undefined:
+            return self.node
+
+        if self.num == 0.0 and all(positive and isTotal(base) for base,positive in self.factors):
+            return AstConstant(0.0)
+
+        numerator = self.monomial()
+        denominator = self.denominator()
+
+        num = self.num
+        den = self.den
+
+        # fold the numeric coefficient, if den is a power of two.
+        if den != 1.0 and abs(math.frexp(den)[0]) == 0.5:
+            num,den = num/den,1.0
+
+        if numerator is None:
+            numerator = AstConstant(num)
+        elif num == -1.0:
+            numerator = AstNegation(numerator)
+        elif num != 1.0:
+            numerator = AstBinaryOperator(AstConstant(num),"*",numerator)
+
+        if den != 1.0:
+            denominator = AstConstant(den) if denominator is None else AstBinaryOperator(AstConstant(den),"*",denominator)
+
+        if denominator is None:
+            return numerator
+        return AstBinaryOperator(numerator,"/",denominator)
+
+class Sum:
+    '''
+      A sum in flattened n-ary form: the constant plus coefficient times
+      monomial for all terms, like terms are collected.
+    '''
+    def __init__(self):
+        self.constant = 0.0
+        # monomial -> [coefficient,sign,node] of the first occurrence.
+        self.terms = {}
+
+    @staticmethod
+    def flatten(node):
+        ret = Sum()
+        stack = [(node,1.0)]
+
+        while stack:
+            n,s = stack.pop()
+            t = type(n)
+
+            if t == AstNegation:
+                stack.append((n.target,-s))
+            elif t == AstBinaryOperator and n.op == "+":
+                stack.append((n.rhs,s))
+                stack.append((n.lhs,s))
+            elif t == AstBinaryOperator and n.op == "-":
+                stack.append((n.rhs,-s))
+                stack.append((n.lhs,s))
+            elif t == AstConstant:
+                ret.constant += s*n.value
+            else:
+                ret.add(n,s)
+
+        return ret
+
+    def add(self,node,sign):
+        product = Product.flatten(node)
+        monomial = product.monomial()
+
+        # products with denominators are not collected.
+        if monomial is None or product.denominator() is not None or product.undefined:
+            monomial = node
+            coefficient = 1.0
+        else:
+            coefficient = product.num/product.den
+
+        term = self.terms.get(monomial)
+        if term is None:
+            self.terms[monomial] = [sign*coefficient,sign,node]
+        else:
+            term[0] += sign*coefficient
+            # the original node is only kept for single occurrences.
+            term[2] = None
+
+    def build(self):
+        terms = []
+
+        for monomial,(coefficient,sign,node) in self.terms.items():
+
+            if coefficient == 0.0 and isTotal(monomial):
+                continue
+
+            if node is not None:
+                terms.append((sign < 0,node))
+            else:
+                c = abs(coefficient)
+                terms.append((coefficient < 0,monomial if c == 1.0 else AstBinaryOperator(AstConstant(c),"*",monomial)))
+
+        # y-x instead of -x+y, addition is commutative.
+        positive = [k for k,(negative,_) in enumerate(terms) if not negative]
+        if positive and positive[0] > 0:
+            terms.insert(0,terms.pop(positive[0]))
+
+        ret = None
+        for negative,term in terms:
+            if ret is None:
+                ret = AstNegation(term) if negative else term
+            else:
+                ret = AstBinaryOperator(ret,"-" if negative else "+",term)
+
+        if ret is None:
+            return AstConstant(self.constant)
+        if self.constant > 0.0:
+            return AstBinaryOperator(ret,"+",AstConstant(self.constant))
+        if self.constant < 0.0:
+            return AstBinaryOperator(ret,"-",AstConstant(-self.constant))
+        return ret
+
+def _rewrite(node,args):
+    '''
+      Simplify a single node with already simplified operands.
+    '''
+    t = type(node)
+
+    if t == AstConstant or t == AstVariable:
+        return node
+
+    if all(type(a) == AstConstant for a in args):
+        folded = _fold(node,[a.value for a in args])
+        if folded is not None:
+            return folded
+
+    if t == AstBinaryOperator:
+
+        lhs,rhs = args
+
+        if node.op == "^":
+            # x^1 -> x
+            if type(rhs) == AstConstant and rhs.value == 1.0:
+                return lhs
+            # x^0 -> 1, 1^x -> 1, if x is defined everywhere.
+            if type(rhs) == AstConstant and rhs.value == 0.0 and isTotal(lhs):
+                return AstConstant(1.0)
+            if type(lhs) == AstConstant and lhs.value == 1.0 and isTotal(rhs):
+                return AstConstant(1.0)
+
+        return AstBinaryOperator(lhs,node.op,rhs)
+
+    if t == AstNegation:
+        return AstNegation(args[0])
+
+    if t == AstRoot:
+        # root(1,x) -> x
+        if type(args[1]) == AstConstant and args[1].value == 1.0:
+            return args[0]
+        return AstRoot(args[0],args[1])
+
+    if t == AstFunctionCall:
+        return AstFunctionCall(node.func,args[0])
+
+    return node
+
+def _pass(root):
+    '''
+      One bottom-up rewrite pass over the instruction list of a formula.
+      Sums and products are normalized at their outermost node only, so
+      long chains are flattened once.
+    '''
+    program = AstProgram((root,))
+
+    # the kinds of the users of each instruction.
+    sums = [True]*len(program)
+    products = [True]*len(program)
+    sums[-1] = products[-1] = False
+
+    for node,args in zip(program.nodes,program.args):
+        isSum = _isSum(node)
+        isProduct = _isProduct(node)
+        for i in args:
+            sums[i] = sums[i] and isSum
+            products[i] = products[i] and isProduct
+
+    values = []
+    for k,(node,args) in enumerate(zip(program.nodes,program.args)):
+
+        done = _lookup(node)
+        if done is not None:
+            values.append(done)
+            continue
+
+        value = _rewrite(node,[values[i] for i in args])
+
+        # a negation inside of a sum or a product is normalized with it.
+        if type(value) != AstConstant and not (type(node) == AstNegation and (sums[k] or products[k])):
+            if _isSum(node) and not sums[k]:
+                value = Sum.flatten(value).build()
+            elif _isProduct(node) and not products[k]:
+                value = Product.flatten(value).build()
+
+        values.append(value)
+
+    return values[-1]
+
+def simplify(node):
+    '''
+      Simplify a formula by constant folding through all builtin functions,
+      flattening sums and products, collecting like terms and removing
+      neutral elements, until a fixpoint is reached.
+
+      Terms which cancel out are only dropped, if they are defined for all
+      values of the variables, so the simplified formula has the same domain.
+
+      Results are memoized, so simplifying shared or already simplified
+      subtrees is cheap.
+    '''
+    ret = _lookup(node)
+    if ret is not None:
+        return ret
+
+    ret = node
+    for _ in range(MAX_PASSES):
+        work = _pass(ret)
+        if work is ret:
+            break
+        ret = work
+
+    _SIMPLIFIED[node] = _SIMPLIFIED[ret] = weakref.ref(ret)
+    return ret
@@ -0,0 +1,305 @@
+'''
+Root finding by Brent's method and safeguarded Newton iteration.
+'''
+
+import logging
+import math
+from mathx.ast import AstNode, compileMany
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+log = logging.getLogger(__name__)
+
+EPS = 2.220446049250313e-16
+
+# the number of samples of the initial scan of findRoots().
+DEFAULT_SAMPLES = 1024
+
+def _scalar(func):
+    '''
+      @return: A python function of one variable for a formula AST or func itself.
+    '''
+    if isinstance(func,AstNode):
+        return func.compile()
+    return func
+
+def _tolerance(x,tol,abstol):
+    return 2.0*EPS*math.fabs(x) + 0.5*(tol*math.fabs(x) + abstol)
+
+def _bracket(f,y,xleft,xright):
+    fleft = f(xleft)-y
+    fright = f(xright)-y
+    if fleft*fright > 0:
+        raise ValueError("Initial interval does not have values with opposite signs w.r.t. y.")
+    return fleft,fright
+
+def findRootBrent(func,y,xleft,xright,tol = 1.0e-12, abstol = 1.0e-16, maxiter = 100):
+    '''
+    Solve the equation y = func(x) by Brent's method, which combines inverse
+    quadratic interpolation and the secant method with bisection, so that
+    the root always stays bracketed.
+
+    :param func: The function to evaluate or a formula AST in one variable.
+    :param y: The ordinate value to search.
+    :param xleft: The left point of the search interval
+    :param xright: The right point of the search interval
+    :param tol: The relative tolerance of the root.
+    :param abstol: The absolute tolerance of the root.
+    '''
+    f = _scalar(func)
+    fleft,fright = _bracket(f,y,xleft,xright)
+    return _brent(f,y,xleft,xright,fleft,fright,tol,abstol,maxiter)
+
+def _brent(f,y,a,b,fa,fb,tol,abstol,maxiter):
+
+    c,fc = b,fb
+    d = e = b-a
+
+    for niter in range(maxiter):
+
+        # the root lies between b and c, b is the best approximation.
+        if (fb > 0) == (fc > 0):
+            c,fc = a,fa
+            d = e = b-a
+
+        if math.fabs(fc) < math.fabs(fb):
+            a,b,c = b,c,b
+            fa,fb,fc = fb,fc,fb
+
+        tol1 = _tolerance(b,tol,abstol)
+        xm = 0.5*(c-b)
+
+        if math.fabs(xm) <= tol1 or fb == 0.0:
+            return b
+
+        if math.fabs(e) >= tol1 and math.fabs(fa) > math.fabs(fb):
+            s = fb/fa
+            if a == c:
+                # secant step
+                p = 2.0*xm*s
+                q = 1.0-s
+            else:
+                # inverse quadratic interpolation
+                q = fa/fc
+                r = fb/fc
+                p = s*(2.0*xm*q*(q-r)-(b-a)*(r-1.0))
+                q = (q-1.0)*(r-1.0)*(s-1.0)
+
+            if p > 0:
+                q = -q
+            p = math.fabs(p)
+
+            # accept the interpolation only if it falls into the bracket
+            # and converges faster than bisection.
+            if 2.0*p < min(3.0*xm*q-math.fabs(tol1*q),math.fabs(e*q)):
+                e = d
+                d = p/q
+            else:
+                d = e = xm
+        else:
+            d = e = xm
+
+        a,fa = b,fb
+        b += d if math.fabs(d) > tol1 else math.copysign(tol1,xm)
+        fb = f(b)-y
+
+    raise ValueError("Root finding did not converge after %d iterations."%maxiter)
+
+def findRootNewton(func,y,x0,variable=None,derivative=None,tol = 1.0e-12, abstol = 1.0e-16, maxiter = 60):
+    '''
+    Solve the equation y = func(x) by Newton's method, which converges
+    quadratically close to a simple root, but may diverge without a bracket.
+
+    :param func: A formula AST, the derivative is computed symbolically,
+                 or the function to evaluate.
+    :param y: The ordinate value to search.
+    :param x0: The starting point of the iteration.
+    :param variable: The name of the variable, defaults to the only variable of func.
+    :param derivative: The derivative of func, if func is not an AST.
+    '''
+    f = _newtonFunction(func,derivative,variable)
+    if f is None:
+        raise ValueError("Newton's method needs the derivative of a function, which is not a formula AST.")
+    return _newton(f,y,x0,None,None,tol,abstol,maxiter)
+
+def findRootNewtonSafe(func,y,xleft,xright,derivative=None,tol = 1.0e-12, abstol = 1.0e-16, maxiter = 100):
+    '''
+    Solve the equation y = func(x) by Newton's method safeguarded by bisection,
+    so that the root stays bracketed even if the Newton step leaves the interval
+    or does not reduce the residual fast enough.
+
+    :param func: A formula AST in one variable or the function to evaluate.
+    :param y: The ordinate value to search.
+    :param xleft: The left point of the search interval
+    :param xright: The right point of the search interval
+    :param derivative: The derivative of func, if func is not an AST. Without
+                       a derivative, the root is found by findRootBrent().
+    '''
+    f = _newtonFunction(func,derivative)
+    if f is None:
+        return findRootBrent(func,y,xleft,xright,tol,abstol,maxiter)
+
+    fleft,fright = _bracket(lambda x: f(x)[0],y,xleft,xright)
+    return _newtonSafe(f,y,xleft,xright,fleft,fright,tol,abstol,maxiter)
+
+def _newtonFunction(func,derivative,variable=None):
+    '''
+      @return: A function returning the value and the derivative of func or None,
+               if func is not an AST and no derivative is given.
+    '''
+    if isinstance(func,AstNode):
+        return _compileNewton(func,variable)
+    if derivative is None:
+        return None
+    return lambda x: (func(x),derivative(x))
+
+def _compileNewton(func,variable=None):
+    '''
+      @return: A function returning the value and the derivative of the formula func.
+    '''
+    if variable is None:
+        variable = _variable(func)[0]
+    # the function and its derivative share their common subexpressions.
+    return compileMany([func,func.derivative(variable)],[variable])
+
+def _variable(func):
+    variables = list(func.findVars({}))
+    if len(variables) != 1:
+        raise ValueError("Formula [%s] is not a function of exactly one variable."%func)
+    return variables
+
+def _newtonSafe(f,y,xleft,xright,fleft,fright,tol,abstol,maxiter):
+
+    if fleft == 0.0:
+        return xleft
+    if fright == 0.0:
+        return xright
+
+    # f(lo) < y < f(hi)
+    if fleft < 0:
+        lo,hi = xleft,xright
+    else:
+        lo,hi = xright,xleft
+
+    return _newton(f,y,0.5*(lo+hi),lo,hi,tol,abstol,maxiter)
+
+def _newton(f,y,x,lo,hi,tol,abstol,maxiter):
+    '''
+      Newton's method starting at x. If the root is bracketed by f(lo) < y < f(hi),
+      steps leaving the bracket or not reducing the residual fast enough are
+      replaced by bisection. Without a bracket, lo and hi are None.
+    '''
+    bracketed = lo is not None
+    dxold = dx = math.fabs(hi-lo) if bracketed else math.inf
+
+    for niter in range(maxiter):
+        fx,dfx = f(x)
+        fx -= y
+
+        if fx == 0.0:
+            return x
+
+        if bracketed:
+            if fx < 0:
+                lo = x
+            else:
+                hi = x
+
+        if dfx == 0.0 or not math.isfinite(dfx):
+            if not bracketed:
+                raise ValueError("Vanishing derivative at x=%r after %d iterations."%(x,niter))
+            bisect = True
+        else:
+            bisect = bracketed and (((x-hi)*dfx-fx)*((x-lo)*dfx-fx) > 0 or
+                                    math.fabs(2.0*fx) > math.fabs(dxold*dfx))
+
+        dxold = dx
+        if bisect:
+            dx = 0.5*(hi-lo)
+            x = lo+dx
+        else:
+            dx = fx/dfx
+            x -= dx
+
+        if not math.isfinite(x):
+            raise ValueError("Root finding diverged after %d iterations."%niter)
+
+        if math.fabs(dx) < _tolerance(x,tol,abstol):
+            return x
+
+    raise ValueError("Root finding did not converge after %d iterations."%maxiter)
+
+def _sample(func,y,x):
+    '''
+      @return: The list of func(x)-y at the samples x with NaN, where func
+               is not defined, in one vectorized pass for formula ASTs and
+               functions marked as vectorized, if numpy is available.
+    '''
+    if numpy is not None:
+        if isinstance(func,AstNode):
+            return (func.compile(_variable(func),vectorized=True)(x)-y).tolist()
+        # compiled vectorized ASTs, see ast.vectorize().
+        if getattr(func,"vectorized",False):
+            with numpy.errstate(all="ignore"):
+                return (numpy.asarray(func(numpy.array(x)),dtype=float)-y).tolist()
+
+    f = func.compile(_variable(func)) if isinstance(func,AstNode) else func
+    d = []
+    for xi in x:
+        try:
+            d.append(f(xi)-y)
+        except (ArithmeticError,ValueError):
+            d.append(math.nan)
+    return d
+
+def findRoots(func,y,xmin,xmax,samples = DEFAULT_SAMPLES, tol = 1.0e-12, abstol = 1.0e-16, maxiter = 100):
+    '''
+    Find all roots of y = func(x) in the interval [xmin,xmax].
+
+    The interval is sampled in one vectorized pass, if possible, all sign
+    changes between neighbouring samples are refined by findRootNewtonSafe() for
+    formula ASTs and by findRootBrent() for functions. Sign changes at
+    poles are discarded, roots of even multiplicity between two samples
+    are not found.
+
+    :param func: A formula AST in one variable or a scalar function. A function
+                 with a true attribute vectorized is called once with an array
+                 of all samples.
+    :param samples: The number of samples of the initial scan.
+    :return: The sorted list of roots.
+    '''
+    n = max(2,samples)
+    x = [xmin+(xmax-xmin)*i/(n-1) for i in range(n)]
+    d = _sample(func,y,x)
+
+    if isinstance(func,AstNode):
+        f = func.compile(_variable(func))
+        fdf = _compileNewton(func)
+    else:
+        f = func
+
+    valid = [math.isfinite(di) for di in d]
+    ret = [xi for xi,di,v in zip(x,d,valid) if v and di == 0.0]
+
+    brackets = [i for i in range(n-1) if valid[i] and valid[i+1] and d[i]*d[i+1] < 0.0]
+
+    for i in brackets:
+        try:
+            if isinstance(func,AstNode):
+                root = _newtonSafe(fdf,y,x[i],x[i+1],d[i],d[i+1],tol,abstol,maxiter)
+            else:
+                root = _brent(f,y,x[i],x[i+1],d[i],d[i+1],tol,abstol,maxiter)
+            residual = math.fabs(f(root)-y)
+        except (ArithmeticError,ValueError) as e:
+            log.debug("Cannot refine root in [%r,%r]: %s"%(x[i],x[i+1],e))
+            continue
+
+        # the residual at a pole does not get smaller than at the samples.
+        if residual <= max(math.fabs(d[i]),math.fabs(d[i+1])):
+            ret.append(float(root))
+
+    ret.sort()
+    return ret
@@ -6,7 +6,6 @@ Created on 24.09.2015
 
 from mathx import formula
 from mathx import ast
-from copy import deepcopy
 import os
 import logging
 
@@ -28,16 +27,16 @@ class Solver:
         fp = open(filename,"a")
         fp.write(self.gleichung+"\n")
         fp.close()
-        l = [formula.Parser(i).parseAst() for i in g.split("=")]
+        l = [formula.parseCached(i).ast for i in g.split("=")]
         self.lhs = l[0]
         self.rhs = l[-1]
     def evaluate(self)->dict:
         rhs = ast.AstBinaryOperator(self.lhs,"-",self.rhs)
-        varsv = rhs.findVars()
+        varsv = rhs.findVars({})
         
         for i in varsv.keys():
             path = rhs.searchPath(ast.AstVariable(i))
-            work = deepcopy(rhs)
+            work = rhs
             lhs = ast.AstConstant(0.0)
             
             while path != []:
@@ -88,7 +87,7 @@ if __name__ == '__main__':
     
     for i in varsv.keys():
         path = rhs.searchPath(ast.AstVariable(i))
-        work = deepcopy(rhs)
+        work = rhs
         lhs = ast.AstConstant(0.0)
         
         while path != []:
@@ -3,7 +3,14 @@
    I first used a C port, then a C++ port, now I made it live in Python.
 '''
 
+import array
+import heapq
 import logging
+import math
+import os
+from mathx import formula
+from mathx.ast import AstNode
+from mathx.builtins import numpy
 
 log = logging.getLogger("mathx.tegral")
 
@@ -65,112 +72,638 @@ gauss_15_6_weight = [ 0.110736894967772885,
                       0.476180983603561155 ]
 
 '''
- a self-dividing tree.
-  we don't provide this type publically, so define it as structure.
+  The 15 support points as offsets in [-1,1] from the center of the
+  interval in ascending order and the weights of the three embedded
+  formulae for the values at these points.
 '''
-class TegralPartition: 
+GAUSS_15_NODES = [-x for x in gauss_15_base] + [0.0] + gauss_15_base[::-1]
 
-    ERROR_WEIGHT_UNDIVIDED = 0 
-    ERROR_WEIGHT_LEFT      = 1 
-    ERROR_WEIGHT_RIGHT     = 2 
+GAUSS_15_WEIGHTS = gauss_15_weight[:7] + [gauss_15_weight[7]] + gauss_15_weight[6::-1]
+
+GAUSS_15_14_WEIGHTS = gauss_15_14_weight + [0.0] + gauss_15_14_weight[::-1]
+
+_weights_6 = [0.0 if j < 0 else gauss_15_6_weight[j] for j in gauss_15_6_flag]
+GAUSS_15_6_WEIGHTS = _weights_6 + [0.0] + _weights_6[::-1]
+
+GAUSS_15_TABLE = list(zip(GAUSS_15_NODES,GAUSS_15_WEIGHTS,GAUSS_15_14_WEIGHTS,GAUSS_15_6_WEIGHTS))
+
+# the number of initial intervals of an integral over an infinite interval.
+SUBSTITUTION_PARTS = 4
+
+if numpy is not None:
+    GAUSS_15_NODES_ARRAY = numpy.array(GAUSS_15_NODES)
+    # the columns hold the weights of the formulae of order 30, 14 and 6.
+    GAUSS_15_WEIGHTS_ARRAY = numpy.array([GAUSS_15_WEIGHTS,GAUSS_15_14_WEIGHTS,GAUSS_15_6_WEIGHTS]).T
+
+def _estimate(res,res_14,res_6,resabs,length_2):
+    '''
+      Scale the quadrature results to the interval and estimate the error.
+      
+      @return: (res,resabs,err)
+    '''
+    err = abs(res - res_14)
+    
+    hold = max(abs(res-res_6),err*0.1)
+    
+    if hold != 0.0:
+        err *= abs(length_2)*(err/hold)*(err/hold)
+    
+    resabs *= abs(length_2)
+    
+    return res*length_2,resabs,max(1.0e-16*resabs,err)
+
+def _gaussKronrod(func,a,b):
+    '''
+      Apply the quadrature formulae to the interval [a,b].
+      
+      @return: (res,resabs,err)
+    '''
+    length_2 = (b-a)*0.5
+    center   = (b+a)*0.5
+    
+    res = res_14 = res_6 = resabs = 0.0
+    
+    for x,w,w_14,w_6 in GAUSS_15_TABLE:
+        f = func(center+length_2*x)
+        res    += w*f
+        res_14 += w_14*f
+        res_6  += w_6*f
+        resabs += w*abs(f)
+    
+    return _estimate(res,res_14,res_6,resabs,length_2)
+
+def _gaussKronrodMany(func,a,b):
+    '''
+      Apply the quadrature formulae to the intervals [a[i],b[i]] with
+      a single call of the vectorized function func.
+      
+      @return: The arrays (res,resabs,err)
+    '''
+    a = numpy.asarray(a,dtype=float)
+    b = numpy.asarray(b,dtype=float)
+    length_2 = (b-a)*0.5
+    center   = (b+a)*0.5
+    
+    x = center[:,numpy.newaxis] + length_2[:,numpy.newaxis]*GAUSS_15_NODES_ARRAY
+    fvals = numpy.broadcast_to(numpy.asarray(func(x.ravel()),dtype=float),(x.size,)).reshape(x.shape)
+    
+    res,res_14,res_6 = (fvals @ GAUSS_15_WEIGHTS_ARRAY).T
+    resabs = numpy.abs(fvals) @ GAUSS_15_WEIGHTS_ARRAY[:,0]
+    
+    return _estimateMany(res,res_14,res_6,resabs,length_2)
+
+def _estimateMany(res,res_14,res_6,resabs,length_2):
+    '''
+      _estimate() for arrays of results.
+      
+      @return: The arrays (res,resabs,err)
+    '''
+    err = numpy.abs(res-res_14)
+    hold = numpy.maximum(numpy.abs(res-res_6),err*0.1)
+    with numpy.errstate(divide="ignore",invalid="ignore"):
+        err = numpy.where(hold != 0.0,err*numpy.abs(length_2)*(err/hold)*(err/hold),err)
+    resabs = resabs*numpy.abs(length_2)
+    
+    return res*length_2,resabs,numpy.maximum(1.0e-16*resabs,err)
+
+def _refine(res,resabs,err,owner,divide,tol,max_partitions,batched):
+    '''
+      The adaptive refinement of tegral(), tegralBox() and tegralMany():
+      the estimates of the regions of all jobs are stored in parallel
+      arrays, a heap of (-err,index) per job yields the regions with the
+      largest errors. The regions divided for all jobs in one step are
+      evaluated together.
+      
+      @param res,resabs,err The arrays of the estimates of the initial regions.
+      @param owner The list of the indices of the jobs of the initial regions.
+      @param divide A function bisecting the regions with the given indices,
+                    which keeps the first halves at their indices, appends the
+                    second halves and returns the estimates of all halves
+                    in this order.
+      @param tol The list of the relative tolerances of the jobs.
+      @param batched If false, the worst region of each job is divided in
+                     each step, otherwise the fewest worst regions, whose
+                     errors exceed the tolerance.
+      @return: The lists (res,resabs,err) of the jobs.
+    '''
+    njobs = len(tol)
+    regions = [[] for _ in range(njobs)]
+    for i,j in enumerate(owner):
+        regions[j].append(i)
+    
+    heaps = [[(-err[i],i) for i in r] for r in regions]
+    for heap in heaps:
+        heapq.heapify(heap)
+    err_total = [math.fsum(err[i] for i in r) for r in regions]
+    resabs_total = [math.fsum(resabs[i] for i in r) for r in regions]
+    n_parts = [0]*njobs
+    active = list(range(njobs))
     
-    def __init__(self,func,a,b):
+    while active:
         
-        self.error_weight = TegralPartition.ERROR_WEIGHT_UNDIVIDED
-        self.a = a
-        self.b = b
-        self.left = None
-        self.right = None
+        indices = []
+        owners = []
+        running = []
+        for j in active:
+            
+            if n_parts[j] >= max_partitions:
+                continue
+            
+            # also stops on NaN.
+            if not err_total[j] > tol[j]*resabs_total[j]:
+                # the running sums accumulate round-off, so check again.
+                err_total[j] = math.fsum(err[i] for i in regions[j])
+                resabs_total[j] = math.fsum(resabs[i] for i in regions[j])
+                if not err_total[j] > tol[j]*resabs_total[j]:
+                    continue
+            
+            heap = heaps[j]
+            n = len(indices)
+            if batched:
+                excess = err_total[j] - tol[j]*resabs_total[j]
+                while heap and excess > 0.0 and n_parts[j]+len(indices)-n < max_partitions:
+                    e,i = heapq.heappop(heap)
+                    indices.append(i)
+                    excess += e
+            else:
+                indices.append(heapq.heappop(heap)[1])
+            
+            n_parts[j] += len(indices)-n
+            owners += [j]*(len(indices)-n)
+            running.append(j)
         
-        length_2 = (b-a)*0.5
-        abs_length_2 = abs(length_2)
-        center       = (b+a)*0.5
-        res_6  = 0.0
-        res_14 = 0.0
+        active = running
+        if not indices:
+            break
         
-        self.res = func(center) * gauss_15_weight[7]
-  
-        self.resabs = abs(self.res)
-  
-        for i in range(7):
+        slots = indices + list(range(len(res),len(res)+len(indices)))
         
-            d = length_2*gauss_15_base[i]
-      
-            fval1 = func(center-d)
-            fval2 = func(center+d)
-      
-            hold = fval1+fval2
-      
-            self.res    += gauss_15_weight[i] *  hold
-            self.resabs += gauss_15_weight[i] * (abs(fval1)+abs(fval2))
+        for i,(r,ra,e),j in zip(slots,divide(indices),owners*2):
+            if i < len(res):
+                err_total[j] -= err[i]
+                resabs_total[j] -= resabs[i]
+                res[i],resabs[i],err[i] = r,ra,e
+            else:
+                res.append(r)
+                resabs.append(ra)
+                err.append(e)
+                regions[j].append(i)
+            err_total[j] += e
+            resabs_total[j] += ra
+            heapq.heappush(heaps[j],(-e,i))
+    
+    res_total = [math.fsum(res[i] for i in r) for r in regions]
+    resabs_total = [math.fsum(resabs[i] for i in r) for r in regions]
+    err_total = [math.fsum(err[i] for i in r) for r in regions]
+    
+    for j in range(njobs):
+        if n_parts[j] >= max_partitions:
+            log.warning("tegral: warning: weak convergence attested: res,resabs,err,max_parts=%lg,%lg,%lg,%d"%(
+                res_total[j],resabs_total[j],err_total[j],max_partitions))
+    
+    return res_total,resabs_total,err_total
+
+def _tegralHeap(func,a,b,owner,tol,max_partitions,vectorized):
+    '''
+      Integrate over the intervals [a[i],b[i]] by _refine(). A vectorized
+      func evaluates all intervals divided in one step in a single call.
       
-            res_14 += gauss_15_14_weight[i] * hold
+      @param owner The list of the indices of the jobs of the intervals.
+      @return: The lists (res,resabs,err) of the jobs.
+    '''
+    lower = array.array('d',a)
+    upper = array.array('d',b)
+    
+    if vectorized:
+        res,resabs,err = (array.array('d',v.tolist()) for v in _gaussKronrodMany(func,a,b))
+    else:
+        res,resabs,err = (array.array('d',v) for v in zip(*(_gaussKronrod(func,aj,bj) for aj,bj in zip(a,b))))
+    
+    def divide(indices):
+        centers = [(lower[i]+upper[i])*0.5 for i in indices]
+        
+        if vectorized:
+            ret = list(zip(*(v.tolist() for v in _gaussKronrodMany(
+                func,[lower[i] for i in indices]+centers,centers+[upper[i] for i in indices]))))
+        else:
+            ret = [_gaussKronrod(func,lower[i],c) for i,c in zip(indices,centers)] + [
+                   _gaussKronrod(func,c,upper[i]) for i,c in zip(indices,centers)]
+        
+        for i,c in zip(indices,centers):
+            lower.append(c)
+            upper.append(upper[i])
+            upper[i] = c
+        return ret
+    
+    return _refine(res,resabs,err,owner,divide,tol,max_partitions,vectorized)
+
+def _gaussKronrodBoxes(func,lower,upper):
+    '''
+      Apply the tensor products of the quadrature formulae to the boxes
+      with the corners lower[i] and upper[i] with a single call of the
+      vectorized function func of d variables.
       
-            j = gauss_15_6_flag[i]
-            if j >= 0:
-                res_6 += gauss_15_6_weight[j] * hold
+      @param lower,upper Arrays of shape (k,d).
+      @return: The arrays (res,resabs,err,axis), axis is the index of the
+               variable, along which the error of the box is largest.
+    '''
+    k,d = lower.shape
+    length_2 = (upper-lower)*0.5
+    center   = (upper+lower)*0.5
+    
+    # the support points along each axis broadcast against each other.
+    x = center[:,:,numpy.newaxis] + length_2[:,:,numpy.newaxis]*GAUSS_15_NODES_ARRAY
+    args = [x[:,j,:].reshape((k,)+(1,)*j+(15,)+(1,)*(d-j-1)) for j in range(d)]
+    fvals = numpy.broadcast_to(numpy.asarray(func(*args),dtype=float),(k,)+(15,)*d)
+    
+    w,w_14,_ = GAUSS_15_WEIGHTS_ARRAY.T
+    
+    def contract(f,weights):
+        # the last axis first.
+        for wj in reversed(weights):
+            f = f @ wj
+        return f
+    
+    res    = contract(fvals,[w]*d)
+    res_14 = contract(fvals,[w_14]*d)
+    resabs = contract(numpy.abs(fvals),[w]*d)
+    
+    # the error of the lower order formula along each single axis.
+    axis_err = [numpy.abs(res-contract(fvals,[w]*j+[w_14]+[w]*(d-j-1))) for j in range(d)]
+    axis = numpy.argmax(numpy.stack(axis_err),axis=0)
+    
+    # the extrapolation of _estimate() is far too optimistic for tensor
+    # products of oscillating functions, so the plain difference is used.
+    volume = numpy.abs(numpy.prod(length_2,axis=1))
+    resabs *= volume
+    err = numpy.maximum(1.0e-16*resabs,numpy.abs(res-res_14)*volume)
+    
+    return res*numpy.prod(length_2,axis=1),resabs,err,axis
 
-        # error estimaton
-        self.err = abs(self.res - res_14)
-  
-        hold = max(abs(self.res-res_6),self.err*0.1)
-  
-        if hold != 0.0:
-            self.err *= abs_length_2*(self.err/hold)*(self.err/hold)
-  
-        self.res    *= length_2
-        self.resabs *= abs_length_2
-  
-        self.err = max(1.0e-16*self.resabs,self.err)
-        self.max_err = self.err
+def _tegralBoxHeap(func,lower,upper,tol,max_partitions):
+    '''
+      Integrate the vectorized func over the box [lower,upper] by _refine().
+      Boxes are bisected along the axis with the largest error.
+    '''
+    d = len(lower)
+    res,resabs,err,axis = _gaussKronrodBoxes(func,numpy.array([lower],dtype=float),numpy.array([upper],dtype=float))
+    res,resabs,err = (array.array('d',v.tolist()) for v in (res,resabs,err))
+    axes = array.array('b',axis.tolist())
+    
+    # the corners of box i are lower[i*d:(i+1)*d] and upper[i*d:(i+1)*d].
+    lower = array.array('d',lower)
+    upper = array.array('d',upper)
+    
+    def divide(indices):
+        lo = numpy.array([lower[i*d:(i+1)*d] for i in indices]*2)
+        hi = numpy.array([upper[i*d:(i+1)*d] for i in indices]*2)
+        n = len(indices)
+        j = numpy.array([axes[i] for i in indices])
+        rows = numpy.arange(n)
+        centers = (lo[rows,j]+hi[rows,j])*0.5
+        hi[rows,j] = centers
+        lo[n+rows,j] = centers
         
-        if log.isEnabledFor(logging.DEBUG):
-            log.debug("tegral: a,b,err,max_err=%g,%g,%g,%g"%(self.a,self.b,self.err,self.max_err))
+        res,resabs,err,axis = _gaussKronrodBoxes(func,lo,hi)
         
-    def divide(self,func):
-
-        if self.error_weight == TegralPartition.ERROR_WEIGHT_RIGHT:
-            self.right.divide(func)
-        elif self.error_weight == TegralPartition.ERROR_WEIGHT_LEFT:
-            self.left.divide(func)
-        else: # TegralPartition.ERROR_WEIGHT_UNDIVIDED
-            center = (self.a+self.b)*0.5
-            self.left  = TegralPartition(func,self.a,center)
-            self.right = TegralPartition(func,center,self.b)
-
-        self.err    = self.right.err    + self.left.err
-        self.res    = self.right.res    + self.left.res
-        self.resabs = self.right.resabs + self.left.resabs
-
-        if self.right.max_err > self.left.max_err:
-            self.error_weight = TegralPartition.ERROR_WEIGHT_RIGHT
-            self.max_err      = self.right.max_err
-            
+        for r,i in enumerate(indices):
+            upper[i*d:(i+1)*d] = array.array('d',hi[r].tolist())
+            axes[i] = int(axis[r])
+        lower.extend(lo[n:].ravel().tolist())
+        upper.extend(hi[n:].ravel().tolist())
+        axes.extend(axis[n:].tolist())
+        
+        return zip(res.tolist(),resabs.tolist(),err.tolist())
+    
+    return [v[0] for v in _refine(res,resabs,err,[0],divide,[tol],max_partitions,True)]
+
+def _substitution(a,b):
+    '''
+      Map an integral over an infinite interval to an integral over a finite
+      interval in the variable t.
+      
+      @return: (sign,t0,t1,transform), where transform(t) returns x and dx/dt
+               for floats and arrays, transform is None for finite bounds.
+    '''
+    if math.isfinite(a) and math.isfinite(b):
+        return 1.0,a,b,None
+    
+    sign = 1.0
+    if a > b:
+        sign = -1.0
+        a,b = b,a
+    
+    if math.isinf(a) and math.isinf(b):
+        return sign,-1.0,1.0,lambda t: (t/(1.0-t*t),(1.0+t*t)/((1.0-t*t)*(1.0-t*t)))
+    elif math.isinf(b):
+        return sign,0.0,1.0,lambda t: (a+t/(1.0-t),1.0/((1.0-t)*(1.0-t)))
+    else:
+        return sign,0.0,1.0,lambda t: (b-t/(1.0-t),1.0/((1.0-t)*(1.0-t)))
+
+def _split(a,b,transform):
+    '''
+      Split a substituted interval into SUBSTITUTION_PARTS intervals. The
+      estimate of the whole interval is accepted too often by coincidence
+      for functions decaying at infinity.
+      
+      @return: The lists of the left and right ends of the intervals.
+    '''
+    if transform is None:
+        return [a],[b]
+    t = [a+(b-a)*k/SUBSTITUTION_PARTS for k in range(SUBSTITUTION_PARTS+1)]
+    return t[:-1],t[1:]
+
+def _substitute(func,transforms,sign,vectorized):
+    '''
+      @return: The integrand in the variables of the given substitutions.
+               The support points never hit the infinite ends, but the
+               value vanishing far out is kept zero, although the
+               derivative of the transform overflows.
+    '''
+    def substituted(*t):
+        x = []
+        jacobian = sign
+        for tj,transform in zip(t,transforms):
+            if transform is None:
+                x.append(tj)
+            else:
+                xj,dxj = transform(tj)
+                x.append(xj)
+                jacobian = jacobian*dxj
+        f = func(*x)
+        if vectorized:
+            return numpy.where(f == 0.0,0.0,f*jacobian)
+        return 0.0 if f == 0.0 else f*jacobian
+    
+    if vectorized:
+        def substitutedArray(*t):
+            with numpy.errstate(over="ignore",invalid="ignore"):
+                return substituted(*t)
+        return substitutedArray
+    return substituted
+
+def paddedVariables(variables,dimensions):
+    '''
+      @return: The variables followed by unused names up to the given number
+               of dimensions, so that a formula with fewer variables, e.g. a
+               constant, compiles to a function of all coordinates.
+    '''
+    variables = list(variables)
+    return variables + ["_%d"%k for k in range(len(variables),dimensions)]
+
+def _prepare(func,variables,vectorized,dimensions=1):
+    '''
+      Compile formula ASTs and determine, whether func is vectorized.
+      
+      @return: (func,vectorized)
+    '''
+    if vectorized is None:
+        if isinstance(func,AstNode):
+            vectorized = numpy is not None
         else:
-            self.error_weight = TegralPartition.ERROR_WEIGHT_LEFT
-            self.max_err      = self.left.max_err
+            # compiled vectorized ASTs, see ast.vectorize().
+            vectorized = getattr(func,"vectorized",False)
+    
+    if isinstance(func,AstNode):
+        if variables is None:
+            variables = func.findVars({}).keys()
+        func = func.compile(paddedVariables(variables,dimensions),vectorized=vectorized)
+    
+    return func,vectorized
 
 '''
   Calculate the integral of the callable func in the interval
   [a,b] usign the Tegral alogrithms by Hairer-Noerseth-Wanner
+  
+  func may also be a formula AST in one variable, which is compiled
+  before the integration starts.
+  
+  If vectorized is true, func accepts an array of abscissae and returns
+  the array of values, so that the support points of all intervals
+  divided in one step are evaluated in a single call. Formula ASTs and
+  functions compiled from them with vectorized=True are integrated
+  vectorized by default, if numpy is installed.
+  
+  a may be -inf and b may be inf, the integral is then transformed
+  to a finite interval.
+  
+  A ValueError is raised, if the result is not finite, e.g. because the
+  vectorized func yields NaN at a pole like 1/x at 0.
 '''
-def tegral(func,a,b,tol=1.0e-8,max_partitions=1000):
+def tegral(func,a,b,tol=1.0e-8,max_partitions=1000,vectorized=None):
 
     if a==b:
         return 0.0
     
-    a_b_interval = TegralPartition(func,a,b)
+    func,vectorized = _prepare(func,None,vectorized)
+    
+    sign,a,b,transform = _substitution(a,b)
+    if transform is not None:
+        func = _substitute(func,[transform],sign,vectorized)
+    
+    a,b = _split(a,b,transform)
+    res = _tegralHeap(func,a,b,[0]*len(a),[tol],max_partitions,vectorized)[0][0]
+    if not math.isfinite(res):
+        raise ValueError("The integral is not finite, the function is not defined in the whole interval.")
+    return res
 
-    n_parts = 0
+def _integrand(func,vectorized):
+    '''
+      @return: (func,vectorized) for a formula string, a formula AST or a function.
+    '''
+    if isinstance(func,str):
+        parsed = formula.parseCached(func)
+        if len(parsed.variables) > 1:
+            raise ValueError("Formula [%s] is not a function of one variable."%func)
+        if vectorized is None:
+            vectorized = numpy is not None
+        return parsed.compile(paddedVariables(parsed.variables,1),vectorized=vectorized),vectorized
+    return _prepare(func,None,vectorized)
+
+def _tegralGroup(func,a,b,tol,max_partitions,vectorized):
+    '''
+      Integrate one integrand over several intervals, which are refined
+      together, see tegralMany().
+      
+      @return: The lists (res,err)
+    '''
+    func,vectorized = _integrand(func,vectorized)
     
-    while a_b_interval.err/a_b_interval.resabs > tol and n_parts < max_partitions:
-        a_b_interval.divide(func)
-        n_parts += 1
-  
-    if n_parts >= max_partitions:
-        log.warn("tegral: warning: weak convergence attested: res,resabs,err,max_parts=%lg,%lg,%lg,%d"%(
-            a_b_interval.res,
-            a_b_interval.resabs,
-            a_b_interval.err,max_partitions))
+    # all intervals of a group share the substitution.
+    sign,t0,t1,transform = _substitution(a[0],b[0])
+    if transform is not None:
+        func = _substitute(func,[transform],sign,vectorized)
+    
+    # the intervals of all jobs, infinite ones share the same substitution.
+    lower = []
+    upper = []
+    owner = []
+    for j,(aj,bj) in enumerate(zip(a,b)):
+        if transform is not None:
+            aj,bj = t0,t1
+        aj,bj = _split(aj,bj,transform)
+        lower += aj
+        upper += bj
+        owner += [j]*len(aj)
+    
+    res,resabs,err = _tegralHeap(func,lower,upper,owner,tol,max_partitions,vectorized)
+    return res,err
+
+def tegralMany(jobs,tol=1.0e-8,max_partitions=1000,vectorized=None,executor=None,parts=None):
+    '''
+      Integrate many functions or one function over many intervals.
+      
+      Jobs with the same integrand are refined together, so that a vectorized
+      function is called once per step for the intervals of all of them.
+      Formula strings are compiled once through the formula cache.
+      
+      @param jobs A list of tuples (func,a,b) or (func,a,b,tol), func is a
+                  function, a formula AST or a formula string in one variable.
+      @param tol The relative tolerance of jobs without their own.
+      @param max_partitions The maximal number of divisions of each job.
+      @param vectorized See tegral(), defaults to vectorized formulae.
+      @param executor An optional concurrent.futures executor, which
+                      integrates parts chunks of jobs. A process pool
+                      requires picklable functions, e.g. formula strings.
+      @param parts The number of chunks, defaults to the number of CPUs.
+      @return: The arrays (res,err) of the integrals and their estimated
+               absolute errors in the order of the jobs.
+    '''
+    jobs = [(job[0],job[1],job[2],job[3] if len(job) > 3 else tol) for job in jobs]
+    
+    groups = {}
+    for k,job in enumerate(jobs):
+        groups.setdefault(_groupKey(job),[]).append(k)
+    
+    if executor is not None:
+        # chunks of adjacent jobs, which mostly share their integrands.
+        order = [k for group in groups.values() for k in group]
+        size = max(1,-(-len(jobs)//(parts or os.cpu_count() or 1)))
+        chunks = [order[k:k+size] for k in range(0,len(order),size)]
+        futures = [executor.submit(tegralMany,[jobs[k] for k in chunk],tol,max_partitions,vectorized) for chunk in chunks]
+        res = [0.0]*len(jobs)
+        err = [0.0]*len(jobs)
+        for chunk,future in zip(chunks,futures):
+            for k,r,e in zip(chunk,*future.result()):
+                res[k] = r
+                err[k] = e
+    else:
+        res = [0.0]*len(jobs)
+        err = [0.0]*len(jobs)
+        for group in groups.values():
+            group = [k for k in group if jobs[k][1] != jobs[k][2]]
+            if not group:
+                continue
+            r,e = _tegralGroup(jobs[group[0]][0],[jobs[k][1] for k in group],[jobs[k][2] for k in group],
+                               [jobs[k][3] for k in group],max_partitions,vectorized)
+            for k,rk,ek in zip(group,r,e):
+                res[k] = rk
+                err[k] = ek
+    
+    if numpy is None:
+        return res,err
+    return numpy.array(res),numpy.array(err)
+
+def _groupKey(job):
+    '''
+      @return: The key of the integrand and the substitution of a job of
+               tegralMany(), infinite intervals are only grouped with
+               the same interval.
+    '''
+    func,a,b,_ = job
+    if isinstance(func,(str,AstNode)):
+        key = func
+    else:
+        key = id(func)
+    if math.isfinite(a) and math.isfinite(b):
+        return key,None
+    return key,(a,b)
+
+def subregions(lower,upper,parts):
+    '''
+      Split a box into independent subregions by bisecting the largest
+      region along its longest side, infinite sides are measured after
+      the substitution of tegralBox().
+      
+      @param lower,upper The corners of the box, which may contain infinite values.
+      @param parts The number of the subregions.
+      @return: A list of (lower,upper) tuples.
+    '''
+    substitutions = [_substitution(a,b) for a,b in zip(lower,upper)]
+    regions = [([s[1] for s in substitutions],[s[2] for s in substitutions])]
+    
+    while len(regions) < parts:
+        volume = lambda region: math.prod(abs(u-l) for l,u in zip(*region))
+        lo,hi = regions.pop(max(range(len(regions)),key=lambda i: volume(regions[i])))
+        j = max(range(len(lo)),key=lambda j: abs(hi[j]-lo[j]))
+        center = (lo[j]+hi[j])*0.5
+        regions.append((lo,hi[:j]+[center]+hi[j+1:]))
+        regions.append((lo[:j]+[center]+lo[j+1:],hi))
+    
+    def back(t,j):
+        sign,t0,t1,transform = substitutions[j]
+        if transform is None:
+            return t
+        # the ends map to the original bounds.
+        if t == t0:
+            return min(lower[j],upper[j])
+        if t == t1:
+            return max(lower[j],upper[j])
+        return transform(t)[0]
+    
+    ret = []
+    for lo,hi in regions:
+        lo = [back(t,j) for j,t in enumerate(lo)]
+        hi = [back(t,j) for j,t in enumerate(hi)]
+        # restore the orientation of reversed infinite intervals.
+        for j,s in enumerate(substitutions):
+            if s[0] < 0:
+                lo[j],hi[j] = hi[j],lo[j]
+        ret.append((lo,hi))
+    return ret
+
+def tegralBox(func,lower,upper,tol=1.0e-8,max_partitions=1000,vectorized=None,variables=None,executor=None,parts=None):
+    '''
+      Calculate the integral of func over the box with the corners lower
+      and upper by the tensor products of the Gauss-Kronrod formulae of
+      tegral(). Boxes are bisected along the axis with the largest error.
+      
+      @param func A function of d variables, a formula AST or a function
+                  compiled from it. Scalar functions are evaluated point by
+                  point, vectorized functions once for all divided boxes.
+      @param lower,upper Lists of d values, which may be -inf or inf.
+      @param variables The names of the variables of a formula AST in
+                       the order of the axes, defaults to findVars(). Axes
+                       beyond the variables are not used by the formula.
+      @param executor An optional concurrent.futures executor, which
+                      integrates parts subregions independently. A process
+                      pool requires a picklable func, e.g. a formula AST.
+      @param parts The number of subregions, defaults to the number of CPUs.
+      @return: (res,err) The integral and its estimated absolute error.
+    '''
+    if numpy is None:
+        raise ValueError("Integration over boxes requires numpy.")
+    
+    if len(lower) != len(upper) or len(lower) < 1:
+        raise ValueError("The corners of the box must have the same number of coordinates.")
+    
+    if executor is not None:
+        regions = subregions(lower,upper,parts or os.cpu_count() or 1)
+        futures = [executor.submit(tegralBox,func,lo,hi,tol,max(1,max_partitions//len(regions)),vectorized,variables)
+                   for lo,hi in regions]
+        results = [future.result() for future in futures]
+        return math.fsum(r[0] for r in results),math.fsum(r[1] for r in results)
+    
+    if any(a == b for a,b in zip(lower,upper)):
+        return 0.0,0.0
+    
+    func,vectorized = _prepare(func,variables,vectorized,len(lower))
+    if not vectorized:
+        func = numpy.vectorize(func,otypes=[float])
+    
+    substitutions = [_substitution(a,b) for a,b in zip(lower,upper)]
+    if any(s[3] is not None for s in substitutions):
+        func = _substitute(func,[s[3] for s in substitutions],math.prod(s[0] for s in substitutions),True)
     
-    return a_b_interval.res
+    res,resabs,err = _tegralBoxHeap(func,[s[1] for s in substitutions],[s[2] for s in substitutions],tol,max_partitions)
+    return res,err
@@ -0,0 +1,210 @@
+'''
+Adaptive sampling of surfaces on a quadtree for /mathx/evaluate.
+'''
+
+import heapq
+import logging
+import math
+import numpy
+from mathx.web import evaluate
+
+log = logging.getLogger(__name__)
+
+# number of cells per side of the initial coarse grid.
+INITIAL_CELLS = 8
+
+# maximal number of subdivisions of an initial cell.
+MAX_DEPTH = 8
+
+# number of cells subdivided in one batched evaluation.
+BATCH_CELLS = 64
+
+DEFAULT_TOLERANCE = 1.0e-3
+DEFAULT_POINTS = 16384
+
+class AdaptiveSurface:
+    '''
+      Adaptive sampling of z=f(x,y) on a quadtree.
+
+      The surface starts with a coarse grid of cells. The deviation of the
+      value at the center of a cell from the mean of its corners serves as
+      error estimate, cells with a large error are subdivided first, very much
+      like tegral() subdivides the interval with the largest error. Cells with
+      some invalid corners are located on the boundary of the domain of f,
+      their error is the value range times their relative size.
+
+      Vertices live on an integer lattice, so that shared vertices of adjacent
+      cells are evaluated only once.
+    '''
+
+    def __init__(self,f,xmin,xmax,ymin,ymax):
+        self.func = evaluate.parseGridFormula(f).compile(vectorized=True)
+        self.size = INITIAL_CELLS << MAX_DEPTH
+        self.xmin = xmin
+        self.ymin = ymin
+        self.dx = (xmax-xmin)/self.size
+        self.dy = (ymax-ymin)/self.size
+        self.vertices = {}
+        self.z = []
+        self.zmin = math.inf
+        self.zmax = -math.inf
+        self.heap = []
+
+        s = 1 << MAX_DEPTH
+        cells = [(i*s,j*s,s) for i in range(INITIAL_CELLS) for j in range(INITIAL_CELLS)]
+        self._evaluateCells(cells)
+
+    def _evaluatePoints(self,points):
+        points = [p for p in dict.fromkeys(points) if p not in self.vertices]
+        if not points:
+            return
+
+        ij = numpy.array(points,dtype=float)
+        z = self.func(self.xmin+ij[:,0]*self.dx,self.ymin+ij[:,1]*self.dy)
+
+        for p,v in zip(points,z.tolist()):
+            self.vertices[p] = len(self.z)
+            self.z.append(v)
+
+        finite = z[numpy.isfinite(z)]
+        if len(finite):
+            self.zmin = min(self.zmin,float(finite.min()))
+            self.zmax = max(self.zmax,float(finite.max()))
+
+    def _value(self,p):
+        return self.z[self.vertices[p]]
+
+    def _evaluateCells(self,cells):
+        points = []
+        for i,j,s in cells:
+            h = s//2
+            points += [(i,j),(i+s,j),(i,j+s),(i+s,j+s),(i+h,j+h)]
+
+        self._evaluatePoints(points)
+        zrange = self.zmax-self.zmin if self.zmax > self.zmin else 1.0
+
+        for i,j,s in cells:
+            h = s//2
+            corners = [self._value(p) for p in ((i,j),(i+s,j),(i,j+s),(i+s,j+s))]
+            center = self._value((i+h,j+h))
+            nvalid = sum(1 for v in corners if not math.isnan(v))
+
+            # cells of size 2 are not subdivided any further.
+            if s <= 2 or (nvalid == 0 and math.isnan(center)):
+                err = 0.0
+            elif nvalid < 4 or math.isnan(center):
+                err = zrange*s/(1 << MAX_DEPTH)
+            else:
+                err = abs(center-0.25*sum(corners))
+
+            heapq.heappush(self.heap,(-err,i,j,s))
+
+    def refine(self,tol=DEFAULT_TOLERANCE,max_points=DEFAULT_POINTS):
+        '''
+          Subdivide cells until the error of all cells is below tol times the
+          range of values or max_points have been evaluated.
+        '''
+        while len(self.z) < max_points:
+
+            zrange = self.zmax-self.zmin if self.zmax > self.zmin else 1.0
+            threshold = tol*zrange
+
+            cells = []
+            while (self.heap and len(cells) < BATCH_CELLS and
+                   len(self.z) + 5*len(cells) < max_points and -self.heap[0][0] > threshold):
+                _,i,j,s = heapq.heappop(self.heap)
+                h = s//2
+                cells += [(i,j,h),(i+h,j,h),(i,j+h,h),(i+h,j+h,h)]
+
+            if not cells:
+                break
+
+            self._evaluateCells(cells)
+
+        log.debug("adaptive: %d points, %d cells"%(len(self.z),len(self.heap)))
+
+    def _edge(self,a,b):
+        '''
+          @return: The vertices strictly between the lattice points a and b.
+        '''
+        m = ((a[0]+b[0])//2,(a[1]+b[1])//2)
+        if m == a or m not in self.vertices:
+            return []
+        return self._edge(a,m) + [m] + self._edge(m,b)
+
+    def triangles(self):
+        '''
+          Triangulate the leaf cells as fans around their centers including all
+          vertices of finer neighbours on their edges, so that the mesh has no cracks.
+
+          @return: A flat list of vertex indices with three entries per triangle,
+                   triangles with invalid vertices are omitted.
+        '''
+        valid = [not math.isnan(v) for v in self.z]
+        ret = []
+        for _,i,j,s in self.heap:
+            h = s//2
+            c = self.vertices[(i+h,j+h)]
+            loop = []
+            corners = [(i,j),(i+s,j),(i+s,j+s),(i,j+s)]
+            for a,b in zip(corners,corners[1:]+corners[:1]):
+                loop.append(a)
+                loop += self._edge(a,b)
+            loop = [self.vertices[p] for p in loop]
+            for a,b in zip(loop,loop[1:]+loop[:1]):
+                if valid[c] and valid[a] and valid[b]:
+                    ret += [c,a,b]
+        return ret
+
+    def mesh(self):
+        '''
+          @return: A dict with the x,y and z coordinates of the vertices and the triangles.
+        '''
+        ij = numpy.array(list(self.vertices.keys()),dtype=float)
+        order = numpy.array(list(self.vertices.values()))
+        x = numpy.empty(len(order))
+        y = numpy.empty(len(order))
+        x[order] = self.xmin+ij[:,0]*self.dx
+        y[order] = self.ymin+ij[:,1]*self.dy
+
+        return {"x": x.tolist(),
+                "y": y.tolist(),
+                "values": [None if math.isnan(v) else v for v in self.z],
+                "triangles": self.triangles() }
+
+def adaptiveMesh(f,xmin,xmax,ymin,ymax,tol=DEFAULT_TOLERANCE,max_points=DEFAULT_POINTS):
+    '''
+      Adaptively sample z=f(x,y), this function is run in the worker pool.
+
+      @return: See AdaptiveSurface.mesh()
+    '''
+    surface = AdaptiveSurface(f,xmin,xmax,ymin,ymax)
+    surface.refine(tol,max_points)
+    return surface.mesh()
+
+def validate(data,state):
+    '''
+      Validate the optional parameters "tol" and "points" of an adaptive request.
+
+      @param data The raw request.
+      @param state The state returned by evaluate.validate().
+      @return: (tol,max_points)
+      @raise ValueError: If a parameter is invalid.
+    '''
+    tol = data.get("tol",DEFAULT_TOLERANCE)
+    if not isinstance(tol,evaluate.NUMBER_TYPES) or not 0.0 < tol <= 1.0:
+        raise ValueError("Tolerance [%r] is not between 0 and 1."%(tol,))
+
+    max_points = data.get("points",DEFAULT_POINTS)
+    if not isinstance(max_points,int):
+        raise ValueError("Number of points [%r] is not an integer."%(max_points,))
+
+    # batches of formulae and gradients are only supported on uniform grids.
+    if not isinstance(state["f"],str) or state.get("gradient",False):
+        raise ValueError("Batches and gradients are only evaluated on uniform grids.")
+
+    # the same compute budget as for uniform grids.
+    cost = evaluate.parseGridFormula(state["f"]).cost
+    max_points = max(5*INITIAL_CELLS*INITIAL_CELLS,min(max_points,evaluate.COMPUTE_BUDGET//cost))
+
+    return tol,max_points
@@ -0,0 +1,128 @@
+'''
+Negotiation and streaming compression of HTTP responses.
+'''
+
+import asyncio
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# the supported encodings in the order of preference, empty disables compression.
+ENCODINGS = [e.strip() for e in os.getenv("MATHX_COMPRESSION","zstd,br,gzip").split(",") if e.strip()]
+
+GZIP_LEVEL = int(os.getenv("MATHX_GZIP_LEVEL","1"))
+BROTLI_LEVEL = int(os.getenv("MATHX_BROTLI_LEVEL","4"))
+ZSTD_LEVEL = int(os.getenv("MATHX_ZSTD_LEVEL","3"))
+
+# smaller writes are compressed on the event loop.
+SYNC_BYTES = 4096
+
+class GzipCompressor:
+    def __init__(self):
+        self.z = zlib.compressobj(GZIP_LEVEL,zlib.DEFLATED,31)
+
+    def compress(self,data):
+        return self.z.compress(data) + self.z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.z.flush()
+
+class BrotliCompressor:
+    def __init__(self):
+        self.c = brotli.Compressor(quality=BROTLI_LEVEL)
+
+    def compress(self,data):
+        return self.c.process(data) + self.c.flush()
+
+    def finish(self):
+        return self.c.finish()
+
+class ZstdCompressor:
+    def __init__(self):
+        self.c = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self,data):
+        return self.c.compress(data) + self.c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.c.flush()
+
+COMPRESSORS = {"gzip": GzipCompressor}
+
+if brotli is not None:
+    COMPRESSORS["br"] = BrotliCompressor
+
+if zstandard is not None:
+    COMPRESSORS["zstd"] = ZstdCompressor
+
+def negotiate(accept_encoding):
+    '''
+      Choose the content encoding of a response.
+
+      @param accept_encoding The Accept-Encoding header of the request or None.
+      @return: The encoding with the highest q value accepted by the client,
+               ties are resolved by the order of ENCODINGS, None for
+               an uncompressed response.
+    '''
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name,_,params = item.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key,_,value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name.strip().lower()] = q
+
+    ret = None
+    qmax = 0.0
+    for encoding in ENCODINGS:
+        q = accepted.get(encoding,accepted.get("*",0.0))
+        if encoding in COMPRESSORS and q > qmax:
+            ret = encoding
+            qmax = q
+    return ret
+
+class CompressedResponse:
+    '''
+      Compress the data written to a StreamResponse.
+
+      Each write is flushed by the compressor, so that the client is able to
+      decode every tile as soon as it arrives. Large writes are compressed in
+      the default thread pool, which keeps the event loop responsive.
+    '''
+    def __init__(self,response,encoding):
+        self.response = response
+        self.compressor = COMPRESSORS[encoding]()
+
+    async def write(self,data):
+        if len(data) < SYNC_BYTES:
+            data = self.compressor.compress(data)
+        else:
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(None,self.compressor.compress,data)
+        if data:
+            await self.response.write(data)
+
+    async def finish(self):
+        '''
+          Write the end of the compressed stream.
+        '''
+        data = self.compressor.finish()
+        if data:
+            await self.response.write(data)
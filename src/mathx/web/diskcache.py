@@ -0,0 +1,145 @@
+'''
+ETags and the sqlite cache of evaluated grids.
+'''
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from mathx.web import evaluate
+
+log = logging.getLogger(__name__)
+
+# changes, whenever the encoding of the responses or the evaluation changes.
+CACHE_VERSION = 1
+
+def cacheKey(state,binary):
+    '''
+      Compute the content address of the values of a grid response, which
+      depends on the simplified formulae, the order of the axes, the
+      viewport and the format, but not on the spelling of the formulae.
+
+      @param state The validated request state.
+      @param binary True for the binary format.
+      @return: A hex digest.
+    '''
+    f = state["f"]
+    if state.get("gradient",False):
+        parsed = evaluate.parseGridGradient(f)
+        formulas = [str(node) for node in parsed.asts]
+    elif isinstance(f,list):
+        parsed = evaluate.parseGridBatch(f)
+        formulas = [str(node) for node in parsed.asts]
+    else:
+        parsed = evaluate.parseGridFormula(f)
+        formulas = [str(parsed.simplified)]
+
+    key = [CACHE_VERSION,formulas,list(parsed.variables),isinstance(f,list),state.get("gradient",False),
+           [float(state[k]) for k in ("xmin","xmax","ymin","ymax")],state["n"],binary]
+    return hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+
+def etag(key,header):
+    '''
+      @param key The cache key of the values.
+      @param header The header of the response, which contains the request.
+      @return: A weak ETag, which holds for all content encodings.
+    '''
+    h = hashlib.sha256(key.encode("ascii"))
+    h.update(json.dumps(header,sort_keys=True).encode("utf-8"))
+    return 'W/"%s"'%h.hexdigest()[:32]
+
+def matches(etag,if_none_match):
+    '''
+      @return: True, if the If-None-Match header lists the given ETag.
+    '''
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    # weak comparison, see RFC 7232.
+    return "*" in tags or etag in tags or etag[2:] in tags
+
+class DiskCache:
+    '''
+      A size-bounded LRU store of response bodies in an sqlite database,
+      which is shared by all threads of the server.
+    '''
+
+    def __init__(self,path,max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path,check_same_thread=False,isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, body BLOB, size INTEGER, atime REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime)")
+        self.size = self.db.execute("SELECT COALESCE(SUM(size),0) FROM entries").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self,key):
+        '''
+          @return: The stored body or None.
+        '''
+        with self.lock:
+            row = self.db.execute("SELECT body FROM entries WHERE key=?",(key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE entries SET atime=? WHERE key=?",(time.time(),key))
+            self.hits += 1
+            return row[0]
+
+    def put(self,key,body):
+        '''
+          Store a body and evict the least recently used bodies, until the
+          store fits into max_bytes. Bodies larger than a quarter of the store
+          are not stored.
+        '''
+        size = len(body)
+        if size > self.max_bytes//4:
+            return
+
+        try:
+            with self.lock:
+                self.db.execute("BEGIN")
+                old = self.db.execute("SELECT size FROM entries WHERE key=?",(key,)).fetchone()
+                if old is not None:
+                    self.size -= old[0]
+                self.db.execute("INSERT OR REPLACE INTO entries (key,body,size,atime) VALUES (?,?,?,?)",
+                                (key,body,size,time.time()))
+                self.size += size
+
+                while self.size > self.max_bytes:
+                    key,size = self.db.execute("SELECT key,size FROM entries ORDER BY atime LIMIT 1").fetchone()
+                    self.db.execute("DELETE FROM entries WHERE key=?",(key,))
+                    self.size -= size
+                    self.evictions += 1
+                self.db.execute("COMMIT")
+        except sqlite3.Error as e:
+            log.warning("Cannot store response in [%s]: %s"%(self.path,e))
+            with self.lock:
+                if self.db.in_transaction:
+                    self.db.execute("ROLLBACK")
+                self.size = self.db.execute("SELECT COALESCE(SUM(size),0) FROM entries").fetchone()[0]
+
+    def stats(self):
+        with self.lock:
+            return {"size": self.size,
+                    "maxsize": self.max_bytes,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions }
+
+DISK_CACHE_PATH = os.getenv("MATHX_DISK_CACHE")
+
+# the size of the disk cache in megabytes.
+DISK_CACHE_MB = int(os.getenv("MATHX_DISK_CACHE_MB","256"))
+
+if DISK_CACHE_PATH:
+    DISK_CACHE = DiskCache(DISK_CACHE_PATH,DISK_CACHE_MB << 20)
+else:
+    DISK_CACHE = None
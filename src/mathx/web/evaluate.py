@@ -4,17 +4,185 @@ Created on 09.01.2016
 @author: michi
 '''
 
-import codecs
 import json
 import logging
 import math
+import numpy
+import os
+import struct
+import threading
+import time
+from mathx import ast
 from mathx import formula
 
 log = logging.getLogger(__name__)
 
 NUMBER_TYPES = (int,float)
 
-STATE_KEYS = {"n":int,"xmin":NUMBER_TYPES,"xmax":NUMBER_TYPES,"ymin":NUMBER_TYPES,"ymax":NUMBER_TYPES,"f":str}
+# the largest accepted grid size.
+MAX_N = int(os.getenv("MATHX_MAX_N","1001"))
+
+# the maximal number of operations spent on one grid, see ParsedFormula.cost.
+COMPUTE_BUDGET = int(os.getenv("MATHX_COMPUTE_BUDGET","20000000"))
+
+# the approximate number of grid points evaluated by a worker in one go.
+TILE_POINTS = max(1,int(os.getenv("MATHX_TILE_POINTS","4096")))
+
+# the maximal number of formulae in one batch request.
+MAX_BATCH = int(os.getenv("MATHX_MAX_BATCH","16"))
+
+STATE_KEYS = {"n":int,"xmin":NUMBER_TYPES,"xmax":NUMBER_TYPES,"ymin":NUMBER_TYPES,"ymax":NUMBER_TYPES,"f":(str,list)}
+
+def parseGridFormula(f):
+    '''
+      Parse a formula in exactly two variables through the formula cache.
+    '''
+    parsed = formula.parseCached(f)
+    log.debug("vvars=%s"%parsed.variables)
+    if len(parsed.variables) != 2:
+        raise ValueError("Formula [%s] is not a function of two variables."%f)
+    return parsed
+
+class ParsedBatch:
+    '''
+      Several formulae evaluated on the same grid. The variables are collected
+      in the order of their first appearance in all formulae and common
+      subexpressions are computed once, see ast.compileMany().
+    '''
+    def __init__(self,formulas):
+        self.formulas = formulas
+        self.parsed = [formula.parseCached(f) for f in formulas]
+        self.variables = list(dict.fromkeys(v for p in self.parsed for v in p.variables))
+        self._setup([p.simplified for p in self.parsed])
+
+    def _setup(self,asts):
+        self.asts = asts
+        # subexpressions shared between the formulae are computed once.
+        self.cost = 1 + sum(1 for node in ast.AstProgram(asts).nodes if node.operands())
+        self._compiled = None
+        self._lock = threading.Lock()
+
+    def compile(self):
+        with self._lock:
+            if self._compiled is None:
+                self._compiled = ast.compileMany(self.asts,self.variables,vectorized=True)
+        return self._compiled
+
+class ParsedGradient(ParsedBatch):
+    '''
+      A formula in two variables together with its partial derivatives
+      w.r.t. both variables, which share their subexpressions with it.
+    '''
+    def __init__(self,f):
+        self.formulas = (f,)
+        self.parsed = [parseGridFormula(f)]
+        self.variables = self.parsed[0].variables
+        node = self.parsed[0].simplified
+        self._setup([node] + [node.derivative(v) for v in self.variables])
+
+BATCH_CACHE = formula.FormulaCache(64,ParsedBatch)
+GRADIENT_CACHE = formula.FormulaCache(64,ParsedGradient)
+
+def parseGridBatch(formulas):
+    '''
+      Parse a batch of formulae in two variables through the BATCH_CACHE.
+    '''
+    batch = BATCH_CACHE.get(tuple(formulas))
+    if len(batch.variables) != 2:
+        raise ValueError("Formulae %s are not functions of the same two variables."%(list(formulas),))
+    return batch
+
+def parseGridGradient(f):
+    '''
+      Parse a formula in two variables and differentiate it through the GRADIENT_CACHE.
+    '''
+    return GRADIENT_CACHE.get(f)
+
+def gridAxes(state):
+    '''
+      @return: The x and y coordinates of the grid described by state.
+    '''
+    n = state["n"]
+    n1 = n-1
+    x = state["xmin"] + numpy.arange(n)*(state["xmax"]-state["xmin"])/n1
+    y = state["ymin"] + numpy.arange(n)*(state["ymax"]-state["ymin"])/n1
+    return x,y
+
+def compileRows(f):
+    '''
+      @return: The compiled function of the formula string f for evaluateRows().
+    '''
+    return parseGridFormula(f).compile(vectorized=True)
+
+def compileBatchRows(formulas):
+    return parseGridBatch(formulas).compile()
+
+def compileGradientRows(f):
+    return parseGridGradient(f).compile()
+
+def _evaluateGrid(func,x,y):
+    return func(numpy.asarray(x)[:,numpy.newaxis],numpy.asarray(y)[numpy.newaxis,:])
+
+def evaluateRows(f,x,y):
+    '''
+      Evaluate the formula string f on the grid spanned by the coordinate
+      arrays x and y with x as the slow index.
+      
+      This function is the unit of work handed to worker processes, so it
+      receives the formula string and looks up the compiled function
+      in the formula cache of the calling process.
+      
+      @return: A float array of shape (len(x),len(y)) with NaN for invalid points.
+    '''
+    return _evaluateGrid(compileRows(f),x,y)
+
+def evaluateBatchRows(formulas,x,y):
+    '''
+      Evaluate a list of formula strings on the grid like evaluateRows().
+      
+      @return: A float array of shape (len(formulas),len(x),len(y)).
+    '''
+    return _evaluateGrid(compileBatchRows(formulas),x,y)
+
+def evaluateGradientRows(f,x,y):
+    '''
+      Evaluate the formula string f and its gradient on the grid like evaluateRows().
+      
+      @return: A float array of shape (3,len(x),len(y)) with the values and the
+               partial derivatives in the order of the variables.
+    '''
+    return _evaluateGrid(compileGradientRows(f),x,y)
+
+def timedRows(compile_rows,f,x,y):
+    '''
+      Evaluate a tile like evaluateRows() and measure the time spent in the
+      worker for the lookup or compilation of the function and for the
+      evaluation itself.
+      
+      @param compile_rows One of compileRows, compileBatchRows or compileGradientRows.
+      @return: (values,compile_seconds,evaluate_seconds)
+    '''
+    t0 = time.perf_counter()
+    func = compile_rows(f)
+    t1 = time.perf_counter()
+    values = _evaluateGrid(func,x,y)
+    return values,t1-t0,time.perf_counter()-t1
+
+def tileRows(n,workers=1):
+    '''
+      @return: The number of rows of a tile, which holds at most TILE_POINTS
+               grid points, but still spreads the grid over all workers.
+    '''
+    return max(1,min(TILE_POINTS//n,math.ceil(n/(2*workers))))
+
+def rowChunks(n,rows):
+    '''
+      Split the row indices 0..n-1 into consecutive chunks of at most the given
+      number of rows.
+      
+      @return: A list of (start,end) tuples.
+    '''
+    return [(i,min(i+rows,n)) for i in range(0,n,rows)]
 
 class valuesiter(list):
     def __init__(self,state):
@@ -26,35 +194,19 @@ class valuesiter(list):
         self.n = state["n"]
         self.n1 = self.n-1
 
-        self.ast = formula.Parser(self.f).parseAst()
-        self.vvars = list(self.ast.findVars({}))
-        log.debug("vvars=%s"%self.vvars)
-        assert len(self.vvars)==2
-        self._i = 0
-        self._j = 0
-        self._x = self.xmin
+        parsed = parseGridFormula(self.f)
+        self.ast = parsed.ast
+        self.vvars = parsed.variables
+        
+        # the whole grid in one pass, the x coordinate is the slow index.
+        x,y = gridAxes(state)
+        self.values = evaluateRows(self.f,x,y)
+        self._iter = iter(self.values.ravel().tolist())
 
     def __next__(self):
-
-        if self._i>=self.n:
-            raise StopIteration()
-
-        y = self.ymin + self._j*(self.ymax-self.ymin)/self.n1
-
-        try:
-            z = self.ast.evaluate({self.vvars[0]:self._x,self.vvars[1]:y})
-        except:
-            z = None
-
-        self._j += 1
-
-        if self._j>=self.n:
-            self._i +=1
-            if self._i < self.n:
-                self._j = 0
-                self._x = self.xmin + self._i*(self.xmax-self.xmin)/self.n1
-
-        if isinstance(z, (int,float)) and (math.isnan(z.real) or math.isinf(z.real)):
+        z = next(self._iter)
+        
+        if math.isnan(z):
             return None
         else:
             return z
@@ -64,24 +216,106 @@ class valuesiter(list):
     def __len__(self):
         return 1
 
-def handler(state):
+def validate(state):
+    '''
+      Validate an evaluation request and parse its formula.
 
+      @return: The state of the request with the actual grid size "n".
+      @raise ValueError: If the request is invalid.
+    '''
     ret = {}
 
     for key,vtype in STATE_KEYS.items():
-        value = state[key]
-        assert isinstance(value, vtype)
+        value = state.get(key)
+        if not isinstance(value, vtype):
+            raise ValueError("Parameter %s is missing or has the wrong type."%key)
         ret[key] = value
 
     # validate the input, for sure.
     n = state["n"]
-    if n < 2 or n > 201:
-        ret["n"] = 101
+    if n < 2 or n > MAX_N:
+        n = 101
+
+    # analytic partial derivatives are evaluated as a batch with the formula.
+    if state.get("gradient",False):
+        if state["gradient"] is not True or not isinstance(ret["f"],str):
+            raise ValueError("Gradients are evaluated for a single formula.")
+        ret["gradient"] = True
+
+    # expensive formulae get a coarser grid.
+    if ret.get("gradient"):
+        cost = parseGridGradient(ret["f"]).cost
+    elif isinstance(ret["f"],list):
+        if not 0 < len(ret["f"]) <= MAX_BATCH or not all(isinstance(f,str) for f in ret["f"]):
+            raise ValueError("A batch consists of 1 to %d formulae."%MAX_BATCH)
+        cost = parseGridBatch(ret["f"]).cost
+    else:
+        cost = parseGridFormula(ret["f"]).cost
+    ret["n"] = max(2,min(n,int(math.sqrt(COMPUTE_BUDGET/cost))))
+
+    return ret
+
+def encodeJsonHeader(header):
+    '''
+      @return: The start of the JSON response up to the opening bracket of the values.
+    '''
+    return json.dumps(header)[:-1].encode("utf-8") + b', "values": ['
+
+def encodeJsonValues(values,first=False):
+    '''
+      @return: The comma separated JSON representation of a block of values
+               with null for invalid points, prefixed with a separator unless
+               this is the first block.
+    '''
+    s = ", ".join("null" if math.isnan(v) else repr(v) for v in values.ravel().tolist())
+    if not first:
+        s = ", " + s
+    return s.encode("utf-8")
+
+JSON_TRAILER = b"]}"
+
+# the values of a batch are a list of lists, one for each formula.
+JSON_SECTION_START = b"["
+JSON_SECTION_SEPARATOR = b"], ["
+JSON_SECTION_END = b"]"
+
+'''
+  Binary grid format:
+  
+    uint32 (little-endian)   length L of the header
+    L bytes                  UTF-8 JSON header with f,xmin,xmax,ymin,ymax,n,
+                             padded with blanks, so that the values start
+                             at a multiple of 4 bytes
+    n*n float32 (little-endian) values with x as the slow index,
+                             NaN for invalid points
+'''
+BINARY_CONTENT_TYPE = "application/x-mathx-grid"
+
+def isBinaryRequested(state,accept=None):
+    '''
+      Check, whether the binary format has been requested by the "format" key
+      of the request or by an Accept header.
+    '''
+    return state.get("format") == "float32" or (accept is not None and BINARY_CONTENT_TYPE in accept)
 
-    values = valuesiter(ret)
+def encodeBinaryHeader(header):
+    h = json.dumps(header).encode("utf-8")
+    h += b" " * (-len(h) % 4)
+    return struct.pack("<I",len(h)) + h
 
-    ret["values"] = values
+def encodeBinaryValues(values):
+    '''
+      Convert the values to float32. Finite values beyond the range of float32
+      are not clipped, they become NaN like invalid points, so that the binary
+      format contains finite values or NaN just like the JSON format contains
+      numbers or null, but never infinities.
 
-    je = json.JSONEncoder()
-    viter = je.iterencode(ret)
-    return codecs.iterencode(viter,"utf-8")
+      @return: A byte view of the converted values, further copies are only
+               made, if there are such values.
+    '''
+    with numpy.errstate(over="ignore"):
+        ret = numpy.ascontiguousarray(values,dtype="<f4")
+    infinite = numpy.isinf(ret)
+    if infinite.any():
+        ret = numpy.where(infinite,numpy.nan,ret).astype("<f4")
+    return memoryview(ret).cast("B")
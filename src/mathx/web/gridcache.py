@@ -0,0 +1,169 @@
+'''
+In-memory cache of evaluated grids, which reuses shifted viewports.
+'''
+
+import logging
+import os
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+# the tolerance for the alignment of two grids in units of the grid spacing.
+ALIGN_TOLERANCE = 1.0e-6
+
+class GridEntry:
+    '''
+      A fully evaluated grid with x as the slow index.
+    '''
+    def __init__(self,state,values):
+        self.xmin = state["xmin"]
+        self.ymin = state["ymin"]
+        self.n = state["n"]
+        self.dx = gridSpacing(state,"x")
+        self.dy = gridSpacing(state,"y")
+        self.values = values
+
+def gridSpacing(state,axis):
+    return (state[axis+"max"]-state[axis+"min"])/(state["n"]-1)
+
+def _offset(d,dold,vmin,vold):
+    '''
+      @return: The integral offset k of the new grid w.r.t the old one,
+               so that new index i corresponds to old index i+k,
+               or None if the grids are not aligned.
+    '''
+    if d == 0.0 or abs(d-dold) > ALIGN_TOLERANCE*abs(d):
+        return None
+    k = (vmin-vold)/d
+    kr = round(k)
+    if abs(k-kr) > ALIGN_TOLERANCE:
+        return None
+    return int(kr)
+
+def _overlap(n,nold,k):
+    return max(0,-k),min(n,nold-k)
+
+class GridCache:
+    '''
+      A bounded LRU cache of evaluated grids keyed by the formula string.
+
+      A new viewport with the same grid spacing, which is shifted by an integral
+      number of grid cells against a cached grid, reuses the overlapping
+      samples and only the newly exposed strips need to be evaluated.
+    '''
+
+    def __init__(self,maxsize=16,per_formula=4):
+        self.maxsize = maxsize
+        self.per_formula = per_formula
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self,state,values):
+        '''
+          Copy the samples overlapping with the best matching cached grid into values.
+
+          @param state The validated request state.
+          @param values The n x n array to fill.
+          @return: The reused region (i0,i1,j0,j1) of the new grid as half-open
+                   index ranges or None, if no cached grid overlaps.
+        '''
+        grids = self.entries.get(state["f"])
+        if not grids:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(state["f"])
+
+        n = state["n"]
+        dx = gridSpacing(state,"x")
+        dy = gridSpacing(state,"y")
+        best = None
+
+        for entry in grids:
+            kx = _offset(dx,entry.dx,state["xmin"],entry.xmin)
+            ky = _offset(dy,entry.dy,state["ymin"],entry.ymin)
+            if kx is None or ky is None:
+                continue
+            i0,i1 = _overlap(n,entry.n,kx)
+            j0,j1 = _overlap(n,entry.n,ky)
+            if i1 <= i0 or j1 <= j0:
+                continue
+            if best is None or (i1-i0)*(j1-j0) > best[0]:
+                best = ((i1-i0)*(j1-j0),entry,kx,ky,(i0,i1,j0,j1))
+
+        if best is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        _,entry,kx,ky,region = best
+        i0,i1,j0,j1 = region
+        values[i0:i1,j0:j1] = entry.values[i0+kx:i1+kx,j0+ky:j1+ky]
+
+        log.debug("Reusing %dx%d samples of [%s]."%(i1-i0,j1-j0,state["f"]))
+        return region
+
+    def store(self,state,values):
+        if gridSpacing(state,"x") == 0.0 or gridSpacing(state,"y") == 0.0:
+            return
+
+        grids = self.entries.setdefault(state["f"],[])
+        self.entries.move_to_end(state["f"])
+        grids.insert(0,GridEntry(state,values))
+        self.size += 1
+
+        if len(grids) > self.per_formula:
+            grids.pop()
+            self.size -= 1
+
+        while self.size > self.maxsize:
+            _,evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def stats(self):
+        return {"size": self.size,
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses }
+
+def changedRegions(n,reused):
+    '''
+      @param reused The region returned by GridCache.lookup()
+      @return: The list of half-open index rectangles [i0,i1,j0,j1] of an n x n
+               grid, which are not covered by the reused region.
+    '''
+    if reused is None:
+        return [[0,n,0,n]]
+
+    i0,i1,j0,j1 = reused
+    regions = [[0,i0,0,n],[i1,n,0,n],[i0,i1,0,j0],[i0,i1,j1,n]]
+    return [r for r in regions if r[1] > r[0] and r[3] > r[2]]
+
+def bands(n,rows,reused):
+    '''
+      Split the rows of an n x n grid into bands of at most the given number of rows,
+      which do not cross the boundaries of the reused region.
+
+      @return: A list of (i0,i1,columns), where columns is the list of half-open
+               column ranges (j0,j1) to be evaluated in the band.
+    '''
+    if reused is None:
+        cuts = set()
+    else:
+        cuts = {reused[0],reused[1]}
+
+    cuts.update(range(0,n,rows))
+    cuts = sorted(c for c in cuts if 0 <= c < n) + [n]
+
+    ret = []
+    for i0,i1 in zip(cuts[:-1],cuts[1:]):
+        if reused is not None and reused[0] <= i0 and i1 <= reused[1]:
+            columns = [(j0,j1) for j0,j1 in ((0,reused[2]),(reused[3],n)) if j1 > j0]
+        else:
+            columns = [(0,n)]
+        ret.append((i0,i1,columns))
+    return ret
+
+GRID_CACHE = GridCache(max(0,int(os.getenv("MATHX_GRID_CACHE_SIZE","16"))))
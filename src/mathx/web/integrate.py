@@ -0,0 +1,106 @@
+'''
+Request handling of /mathx/integrate.
+'''
+
+import logging
+import math
+import os
+from mathx import formula
+from mathx import tegral
+from mathx.web import evaluate
+
+log = logging.getLogger(__name__)
+
+# the keys of the bounds of the axes in the order of the variables.
+BOUND_KEYS = [("xmin","xmax"),("ymin","ymax"),("zmin","zmax")]
+
+DEFAULT_TOLERANCE = 1.0e-8
+
+# the maximal number of divided boxes of one request.
+MAX_PARTITIONS = int(os.getenv("MATHX_MAX_PARTITIONS","20000"))
+
+def _bound(value,infinity):
+    '''
+      @return: The float value of a bound, null stands for an infinite bound.
+    '''
+    if value is None:
+        return infinity
+    if not isinstance(value,evaluate.NUMBER_TYPES):
+        raise ValueError("Bound [%r] is not a number."%(value,))
+    return float(value)
+
+def validate(data):
+    '''
+      Validate an integration request with the formula "f" in up to three
+      variables, the bounds "xmin","xmax" and optionally "ymin","ymax" and
+      "zmin","zmax" in the order of the variables and an optional relative
+      tolerance "tol". A constant is integrated over "xmin","xmax".
+
+      @return: The state of the request, "partitions" is the number of boxes,
+               which may be divided within the COMPUTE_BUDGET.
+      @raise ValueError: If the request is invalid.
+    '''
+    f = data.get("f")
+    if not isinstance(f,str):
+        raise ValueError("Formula f is missing.")
+
+    parsed = formula.parseCached(f)
+    if len(parsed.variables) > len(BOUND_KEYS):
+        raise ValueError("Formula [%s] has more than %d variables."%(f,len(BOUND_KEYS)))
+    d = max(1,len(parsed.variables))
+
+    ret = {"f": f, "variables": list(parsed.variables)}
+    for kmin,kmax in BOUND_KEYS[:d]:
+        if kmin not in data or kmax not in data:
+            raise ValueError("Bounds %s and %s are missing."%(kmin,kmax))
+        ret[kmin] = data[kmin]
+        ret[kmax] = data[kmax]
+        _bound(ret[kmin],-math.inf)
+        _bound(ret[kmax],math.inf)
+
+    tol = data.get("tol",DEFAULT_TOLERANCE)
+    if not isinstance(tol,evaluate.NUMBER_TYPES) or not 0.0 < tol < 1.0:
+        raise ValueError("Tolerance [%r] is not between 0 and 1."%(tol,))
+    ret["tol"] = tol
+
+    # each box costs 15^d evaluations of the formula.
+    ret["partitions"] = max(1,min(MAX_PARTITIONS,evaluate.COMPUTE_BUDGET//(parsed.cost*15**d)))
+
+    return ret
+
+def bounds(state):
+    '''
+      @return: The lower and upper corner of the integration box with
+               infinite values for unbounded axes.
+    '''
+    d = max(1,len(state["variables"]))
+    lower = [_bound(state[kmin],-math.inf) for kmin,_ in BOUND_KEYS[:d]]
+    upper = [_bound(state[kmax],math.inf) for _,kmax in BOUND_KEYS[:d]]
+    return lower,upper
+
+def integrateRegion(f,lower,upper,tol,max_partitions):
+    '''
+      Integrate the formula string f over a box, this function is the unit
+      of work handed to worker processes, see evaluate.evaluateRows().
+
+      @return: (res,err)
+    '''
+    parsed = formula.parseCached(f)
+    func = parsed.compile(tegral.paddedVariables(parsed.variables,len(lower)),vectorized=True)
+    return tegral.tegralBox(func,lower,upper,tol=tol,max_partitions=max_partitions)
+
+def result(state,results):
+    '''
+      Sum up the results of the subregions.
+
+      @param results A list of (res,err) tuples.
+      @return: The response with "value" and "error", null if the integral
+               does not exist in floating point numbers.
+    '''
+    res = math.fsum(r for r,_ in results)
+    err = math.fsum(e for _,e in results)
+
+    if not math.isfinite(res) or not math.isfinite(err):
+        res = err = None
+
+    return dict(state,value=res,error=err)
@@ -0,0 +1,196 @@
+'''
+Prometheus metrics of the server process.
+'''
+
+import bisect
+import contextlib
+import math
+import threading
+import time
+
+# the default upper bounds of the buckets of a latency histogram in seconds.
+DEFAULT_BUCKETS = (0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0)
+
+def _escape(value):
+    return str(value).replace("\\","\\\\").replace("\"","\\\"").replace("\n","\\n")
+
+def _labels(labels):
+    '''
+      @return: The label set of a sample in the text exposition format.
+    '''
+    if not labels:
+        return ""
+    return "{%s}"%",".join('%s="%s"'%(k,_escape(v)) for k,v in labels.items())
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value,float) else str(value)
+
+class Counter:
+    '''
+      A monotonically increasing counter.
+    '''
+    kind = "counter"
+
+    def __init__(self,name,help,labels=None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self,n=1):
+        with self.lock:
+            self.value += n
+
+    def samples(self):
+        return [(self.name,self.labels,self.value)]
+
+class Gauge:
+    '''
+      A value, which is read from func at scrape time, so that keeping
+      it up to date costs nothing. Without func the value is set explicitly.
+
+      kind is "counter" for monotonic values maintained elsewhere,
+      like the hits of a cache.
+    '''
+    def __init__(self,name,help,func=None,labels=None,kind="gauge"):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.labels = labels or {}
+        self.kind = kind
+        self.value = 0
+
+    def set(self,value):
+        self.value = value
+
+    def samples(self):
+        value = self.func() if self.func is not None else self.value
+        return [(self.name,self.labels,value)]
+
+class Histogram:
+    '''
+      Count observations in buckets of cumulative upper bounds.
+    '''
+    kind = "histogram"
+
+    def __init__(self,name,help,buckets=DEFAULT_BUCKETS,labels=None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.buckets = tuple(sorted(buckets))
+        # observations per bucket, the last one counts values above all bounds.
+        self.counts = [0]*(len(self.buckets)+1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self,value):
+        i = bisect.bisect_left(self.buckets,value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextlib.contextmanager
+    def time(self):
+        '''
+          Observe the wall clock time spent in a with block.
+        '''
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0)
+
+    def samples(self):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+
+        ret = []
+        n = 0
+        for le,count in zip(self.buckets + (math.inf,),counts):
+            n += count
+            ret.append((self.name + "_bucket",dict(self.labels,le=_number(le)),n))
+        ret.append((self.name + "_sum",self.labels,total))
+        ret.append((self.name + "_count",self.labels,n))
+        return ret
+
+REGISTRY = {}
+
+def _register(factory,name,help,labels,*args,**kwargs):
+    key = name + _labels(labels)
+    metric = REGISTRY.get(key)
+    if metric is None:
+        metric = REGISTRY.setdefault(key,factory(name,help,*args,labels=labels,**kwargs))
+    return metric
+
+def counter(name,help,labels=None):
+    '''
+      @return: The counter registered under the given name and labels,
+               which is created on first use.
+    '''
+    return _register(Counter,name,help,labels)
+
+def gauge(name,help,func=None,labels=None,kind="gauge"):
+    '''
+      @return: The gauge registered under the given name and labels,
+               which is created on first use, see Gauge.
+    '''
+    return _register(Gauge,name,help,labels,func,kind=kind)
+
+def histogram(name,help,buckets=DEFAULT_BUCKETS,labels=None):
+    '''
+      @return: The histogram registered under the given name and labels,
+               which is created on first use.
+    '''
+    return _register(Histogram,name,help,labels,buckets)
+
+# the content type of the text exposition format.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def exposition(registry=None):
+    '''
+      Render all metrics in the Prometheus text exposition format, metrics
+      with the same name and different labels are listed as one family.
+    '''
+    if registry is None:
+        registry = REGISTRY
+
+    families = {}
+    for metric in list(registry.values()):
+        families.setdefault(metric.name,[]).append(metric)
+
+    lines = []
+    for name,metrics in families.items():
+        lines.append("# HELP %s %s"%(name,metrics[0].help.replace("\\","\\\\").replace("\n","\\n")))
+        lines.append("# TYPE %s %s"%(name,metrics[0].kind))
+        for metric in metrics:
+            for sample,labels,value in metric.samples():
+                lines.append("%s%s %s"%(sample,_labels(labels),_number(value)))
+    lines.append("")
+    return "\n".join(lines)
+
+class LoopLagMonitor:
+    '''
+      Observe, how late a timer, which fires every interval seconds, is
+      called back by the event loop. The lag is the time, for which the loop
+      has been blocked by callbacks or synchronous code.
+    '''
+    def __init__(self,histogram,interval=1.0):
+        self.histogram = histogram
+        self.interval = interval
+        self.handle = None
+
+    def start(self,loop):
+        self.handle = loop.call_later(self.interval,self._check,loop,loop.time() + self.interval)
+
+    def _check(self,loop,expected):
+        self.histogram.observe(max(0.0,loop.time() - expected))
+        self.start(loop)
+
+    def stop(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
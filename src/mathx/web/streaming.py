@@ -0,0 +1,112 @@
+'''
+Buffered writing of streamed HTTP responses.
+'''
+
+import asyncio
+import os
+import time
+
+# the number of bytes collected from small fragments before they are written.
+FLUSH_BYTES = max(256,int(os.getenv('HTTP_BUFSIZE','65536')))
+
+# the time in seconds, for which buffered data is held back, while the next
+# fragment is not ready. 0 writes buffered data, whenever the producer stalls.
+FLUSH_INTERVAL = max(0.0,float(os.getenv('HTTP_FLUSH_INTERVAL','0.05')))
+
+class BufferedWriter:
+    '''
+      Collect small fragments of a streamed response in a buffer and hand
+      fragments of at least flush_bytes to the response as they are.
+
+      A flushed buffer is handed over to the response as a memoryview and
+      replaced by a fresh one, because the transport may still refer to it.
+    '''
+    def __init__(self,response,flush_bytes=FLUSH_BYTES):
+        self.response = response
+        self.flush_bytes = flush_bytes
+        self.buffer = None
+        self.nbuf = 0
+        self.writes = 0
+        # the time spent in writes to the response, including back pressure.
+        self.write_seconds = 0.0
+
+    async def write(self,data):
+        n = len(data)
+
+        if self.nbuf + n > self.flush_bytes:
+            await self.flush()
+
+        if n >= self.flush_bytes:
+            await self._write(data)
+            return
+
+        if self.buffer is None:
+            self.buffer = memoryview(bytearray(self.flush_bytes))
+        self.buffer[self.nbuf:self.nbuf+n] = data
+        self.nbuf += n
+
+        if self.nbuf >= self.flush_bytes:
+            await self.flush()
+
+    async def flush(self):
+        if self.nbuf > 0:
+            data = self.buffer[:self.nbuf]
+            self.buffer = None
+            self.nbuf = 0
+            await self._write(data)
+
+    async def _write(self,data):
+        self.writes += 1
+        t0 = time.perf_counter()
+        try:
+            await self.response.write(data)
+        finally:
+            self.write_seconds += time.perf_counter() - t0
+
+async def writeStream(response,chunks,flush_bytes=FLUSH_BYTES,flush_interval=FLUSH_INTERVAL):
+    '''
+      Write the fragments of the async iterator chunks to the response.
+
+      Fragments are collected in a BufferedWriter. Buffered data is written,
+      once flush_bytes have been collected or the next fragment is not ready
+      within flush_interval seconds, so that the client sees every tile
+      without much delay.
+
+      @return: The BufferedWriter with the number of writes and the time
+               spent writing.
+    '''
+    loop = asyncio.get_running_loop()
+    writer = BufferedWriter(response,flush_bytes)
+    timer = None
+    flushing = None
+
+    def flushLater():
+        nonlocal flushing
+        flushing = asyncio.ensure_future(writer.flush())
+
+    try:
+        async for data in chunks:
+            if timer is not None:
+                timer.cancel()
+                timer = None
+            # the writes of the timer and of the loop must not interleave.
+            if flushing is not None:
+                await flushing
+                flushing = None
+
+            await writer.write(data)
+
+            if writer.nbuf > 0:
+                timer = loop.call_later(flush_interval,flushLater)
+    except BaseException:
+        if flushing is not None:
+            flushing.cancel()
+        raise
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+    if flushing is not None:
+        await flushing
+    await writer.flush()
+    return writer
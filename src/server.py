@@ -17,56 +17,389 @@ root_logger = logging.getLogger()
 root_logger.addHandler(handler)
 root_logger.setLevel(level)
 
+from mathx.web import adaptive
+from mathx.web import compression
+from mathx.web import diskcache
 from mathx.web import evaluate
+from mathx.web import gridcache
+from mathx.web import integrate
+from mathx.web import metrics
+from mathx.web import streaming
 
 
 log = logging.getLogger(__name__)
 
 import asyncio
+import collections
+import json
+import numpy
+import time
+from concurrent.futures import ProcessPoolExecutor
 from aiohttp import web
+from mathx import formula
+from mathx import tegral
 
 routes = web.RouteTableDef()
 
-buffersize = max(256,int(os.getenv('HTTP_BUFSIZE','1448')))
 listenport = int(os.getenv('HTTP_PORT','8011'))
 listenaddr = os.getenv('HTTP_ADDRESS','0.0.0.0')
 webroot = os.getenv("HTTP_WEBROOT")
+workers = int(os.getenv('MATHX_WORKERS',str(os.cpu_count() or 1)))
+lag_interval = float(os.getenv('MATHX_LAG_INTERVAL','1.0'))
+
+# the pool for grid evaluation, None evaluates in the default thread pool.
+pool = None
+
+# the number of tasks submitted to the pool, which have not completed yet.
+pool_queue = 0
+
+evaluate_cancelled = metrics.counter("mathx_evaluate_cancelled_total",
+                                     "Grid evaluations aborted because the client went away.")
+tiles_cancelled = metrics.counter("mathx_evaluate_tiles_cancelled_total",
+                                  "Grid tiles dropped before or during evaluation after a cancellation.")
+precondition_failed = metrics.counter("mathx_evaluate_precondition_failed_total",
+                                      "Evaluation requests answered with 412 Precondition Failed.")
+
+# compile and evaluate are summed over all tiles evaluated by the workers.
+stage_seconds = {stage: metrics.histogram("mathx_evaluate_stage_seconds",
+                                          "Time spent per evaluation request in each stage.",
+                                          labels={"stage": stage})
+                 for stage in ("decode","parse","compile","evaluate","encode","write")}
+
+grid_size = metrics.histogram("mathx_evaluate_grid_size",
+                              "Grid size n of evaluation requests.",
+                              (11,51,101,201,301,501,751,1001))
+
+loop_lag = metrics.histogram("mathx_event_loop_lag_seconds",
+                             "Delay of a periodic timer on the event loop.")
+
+lag_monitor = metrics.LoopLagMonitor(loop_lag,lag_interval)
+
+metrics.gauge("mathx_pool_queue_depth",
+              "Tasks submitted to the worker pool, which have not completed yet.",
+              lambda: pool_queue)
+
+def cache_metrics(name,cache):
+    for key in ("hits","misses"):
+        metrics.gauge("mathx_cache_%s_total"%key,"Lookups in the caches of the server process.",
+                      lambda key=key: cache.stats()[key],{"cache": name},kind="counter")
+
+cache_metrics("formula",formula.FORMULA_CACHE)
+cache_metrics("grid",gridcache.GRID_CACHE)
+if diskcache.DISK_CACHE is not None:
+    cache_metrics("disk",diskcache.DISK_CACHE)
+
+def pool_done(future):
+    global pool_queue
+    pool_queue -= 1
+
+def run_in_pool(func,*args):
+    '''
+      Submit func to the worker pool and count it in the queue depth,
+      until it completes or is cancelled.
+    '''
+    global pool_queue
+    future = asyncio.get_running_loop().run_in_executor(pool,func,*args)
+    pool_queue += 1
+    future.add_done_callback(pool_done)
+    return future
+
+def check_connected(request):
+    if request.transport is None or request.transport.is_closing():
+        raise ConnectionResetError("Client disconnected.")
+
+async def evaluate_chunks(request,state,binary):
+    '''
+      Evaluate the grid in row tiles in the worker pool and yield the
+      encoded response body in order as the tiles complete.
+      
+      Samples overlapping with a cached grid of the same formula are reused,
+      the "changed" entry of the header lists the freshly evaluated regions.
+      
+      A batch of formulae is evaluated in one pass per tile, the grid of the
+      first formula is streamed as the tiles complete, the others follow.
+      A formula with "gradient" is evaluated like a batch of the formula and
+      its partial derivatives.
+      
+      At most two tiles per worker are in flight, so large grids do not
+      monopolize the pool queue ahead of concurrent requests.
+    '''
+    n = state["n"]
+    x,y = evaluate.gridAxes(state)
+    batch = isinstance(state["f"],list) or state.get("gradient",False)
+    if state.get("gradient",False):
+        f = state["f"]
+        compile_rows = evaluate.compileGradientRows
+        values = numpy.empty((3,n,n))
+        reused = None
+        sections = values
+    elif batch:
+        f = tuple(state["f"])
+        compile_rows = evaluate.compileBatchRows
+        values = numpy.empty((len(f),n,n))
+        reused = None
+        sections = values
+    else:
+        f = state["f"]
+        compile_rows = evaluate.compileRows
+        values = numpy.empty((n,n))
+        reused = gridcache.GRID_CACHE.lookup(state,values)
+        sections = [values]
+    nworkers = max(1,workers)
+    tiles = iter(gridcache.bands(n,evaluate.tileRows(n,nworkers),reused))
+    futures = collections.deque()
+    compile_seconds = 0.0
+    evaluate_seconds = 0.0
+    encode_seconds = 0.0
+
+    def submit():
+        for i0,i1,columns in tiles:
+            futures.append((i0,i1,[(j0,j1,run_in_pool(evaluate.timedRows,compile_rows,f,x[i0:i1],y[j0:j1]))
+                                   for j0,j1 in columns]))
+            if len(futures) >= 2*nworkers:
+                break
+
+    def encode(section,first):
+        nonlocal encode_seconds
+        t0 = time.perf_counter()
+        if binary:
+            data = evaluate.encodeBinaryValues(section)
+        else:
+            data = evaluate.encodeJsonValues(section,first)
+        encode_seconds += time.perf_counter() - t0
+        return data
+
+    submit()
+
+    header = dict(state,changed=gridcache.changedRegions(n,reused))
+    if binary:
+        yield evaluate.encodeBinaryHeader(header)
+    else:
+        yield evaluate.encodeJsonHeader(header)
+        if batch:
+            yield evaluate.JSON_SECTION_START
+
+    first = True
+    try:
+        while futures:
+            check_connected(request)
+            i0,i1,columns = futures[0]
+            for j0,j1,future in columns:
+                values[...,i0:i1,j0:j1],tc,te = await future
+                compile_seconds += tc
+                evaluate_seconds += te
+            futures.popleft()
+            submit()
+            yield encode(sections[0][i0:i1],first)
+            first = False
+    finally:
+        # tiles, which have not yet been started by a worker, are dropped.
+        if futures:
+            tiles_cancelled.inc(len(futures) + sum(1 for _ in tiles))
+            for _,_,columns in futures:
+                for _,_,future in columns:
+                    future.cancel()
+
+    if batch:
+        for section in sections[1:]:
+            check_connected(request)
+            if binary:
+                yield encode(section,True)
+            else:
+                yield evaluate.JSON_SECTION_SEPARATOR + encode(section,True)
+        if not binary:
+            yield evaluate.JSON_SECTION_END
+    else:
+        gridcache.GRID_CACHE.store(state,values)
+
+    stage_seconds["compile"].observe(compile_seconds)
+    stage_seconds["evaluate"].observe(evaluate_seconds)
+    stage_seconds["encode"].observe(encode_seconds)
+
+    if not binary:
+        yield evaluate.JSON_TRAILER
+
+async def cached_chunks(state,binary,body):
+    '''
+      Yield a response body stored in the disk cache after the header of
+      the current request.
+    '''
+    header = dict(state,changed=gridcache.changedRegions(state["n"],None))
+    if binary:
+        yield evaluate.encodeBinaryHeader(header)
+    else:
+        yield evaluate.encodeJsonHeader(header)
+    yield body
+
+async def recording_chunks(chunks,key):
+    '''
+      Pass on the chunks of an evaluation and store everything after the
+      header in the disk cache, once the evaluation has been completed.
+    '''
+    fragments = []
+    try:
+        async for data in chunks:
+            fragments.append(data)
+            yield data
+    finally:
+        await chunks.aclose()
+
+    loop = asyncio.get_running_loop()
+    loop.run_in_executor(None,diskcache.DISK_CACHE.put,key,b"".join(fragments[1:]))
+
+async def adaptive_handler(data,state):
+
+    try:
+        tol,max_points = adaptive.validate(data,state)
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+
+    mesh = await run_in_pool(adaptive.adaptiveMesh,state["f"],
+                             state["xmin"],state["xmax"],state["ymin"],state["ymax"],
+                             tol,max_points)
+
+    return web.json_response(dict(state,mode="adaptive",tol=tol,**mesh))
 
 @routes.post('/mathx/evaluate')
 async def evaluate_handler(request):
-    data = await request.json()
-    log.info (f"Got evaluate request {data}")
-    iter = evaluate.handler(data)
+    body = await request.read()
+    with stage_seconds["decode"].time():
+        data = json.loads(body)
+    log.debug("Got evaluate request [%s]",data)
+
+    # fails before the response is prepared on invalid formulae.
+    try:
+        with stage_seconds["parse"].time():
+            state = evaluate.validate(data)
+    except (ValueError,formula.ParseException) as e:
+        raise web.HTTPBadRequest(text=str(e))
+
+    if data.get("mode") == "adaptive":
+        return await adaptive_handler(data,state)
+
+    binary = evaluate.isBinaryRequested(data,request.headers.get('Accept'))
+    if binary:
+        content_type = evaluate.BINARY_CONTENT_TYPE
+    else:
+        content_type = 'application/json'
+
+    grid_size.observe(state["n"])
+
+    # the values of the same viewport are the same for all spellings of a formula.
+    key = diskcache.cacheKey(state,binary)
+    etag = diskcache.etag(key,state)
+
+    headers = {'Content-Type': content_type, 'ETag': etag}
+
+    # the chunks are compressed one by one, the client decodes them as they arrive.
+    encoding = compression.negotiate(request.headers.get('Accept-Encoding'))
+    if compression.ENCODINGS:
+        headers['Vary'] = 'Accept-Encoding'
+    if encoding is not None:
+        headers['Content-Encoding'] = encoding
+
+    # RFC 7232 section 3.2: a matching If-None-Match fails a POST request
+    # with 412, 304 is reserved for GET and HEAD.
+    if diskcache.matches(etag,request.headers.get('If-None-Match')):
+        headers.pop('Content-Type')
+        headers.pop('Content-Encoding',None)
+        precondition_failed.inc()
+        return web.Response(status=412,headers=headers)
+
+    body = None
+    if diskcache.DISK_CACHE is not None:
+        loop = asyncio.get_running_loop()
+        body = await loop.run_in_executor(None,diskcache.DISK_CACHE.get,key)
 
     response = web.StreamResponse(
         status=200,
         reason='OK',
-        headers={'Content-Type': 'application/json'},
+        headers=headers,
     )
 
     await response.prepare(request)
 
-    buf = bytearray(buffersize)
-    nbuf = 0
-
-    for x in iter:
-        n = len(x)
-        if nbuf + n <= buffersize:
-            buf[nbuf:nbuf+n] = x
-            nbuf += n
-        else:
-            nwrite = buffersize-nbuf
-            buf[nbuf:buffersize] = x[0:nwrite]
-            await response.write(buf)
-            nbuf = n - nwrite
-            buf[0:nbuf] = x[nwrite:n]
+    if encoding is not None:
+        target = compression.CompressedResponse(response,encoding)
+    else:
+        target = response
 
-    if nbuf > 0:
-        await response.write(buf[0:nbuf])
+    if body is not None:
+        chunks = cached_chunks(state,binary,body)
+    elif diskcache.DISK_CACHE is not None:
+        chunks = recording_chunks(evaluate_chunks(request,state,binary),key)
+    else:
+        chunks = evaluate_chunks(request,state,binary)
+    try:
+        writer = await streaming.writeStream(target,chunks)
+        stage_seconds["write"].observe(writer.write_seconds)
+        if encoding is not None:
+            await target.finish()
+    except ConnectionResetError:
+        evaluate_cancelled.inc()
+        log.debug("Write failed, cancelled evaluation of [%s]."%state["f"])
+        return response
+    except asyncio.CancelledError:
+        evaluate_cancelled.inc()
+        log.debug("Client disconnected, cancelled evaluation of [%s]."%state["f"])
+        raise
+    finally:
+        await chunks.aclose()
 
     await response.write_eof()
     return response
 
+@routes.post('/mathx/integrate')
+async def integrate_handler(request):
+    data = await request.json()
+    log.debug("Got integrate request [%s]",data)
+
+    try:
+        state = integrate.validate(data)
+    except (ValueError,formula.ParseException) as e:
+        raise web.HTTPBadRequest(text=str(e))
+    lower,upper = integrate.bounds(state)
+
+    # independent subregions are integrated by all workers.
+    regions = tegral.subregions(lower,upper,max(1,workers))
+    max_partitions = max(1,state["partitions"]//len(regions))
+    results = await asyncio.gather(*(run_in_pool(integrate.integrateRegion,state["f"],
+                                                 lo,hi,state["tol"],max_partitions)
+                                     for lo,hi in regions))
+
+    return web.json_response(integrate.result(state,results))
+
+@routes.get('/metrics')
+async def metrics_handler(request):
+    return web.Response(body=metrics.exposition().encode("utf-8"),
+                        headers={'Content-Type': metrics.CONTENT_TYPE})
+
+@web.middleware
+async def observe_requests(request,handler):
+    '''
+      Count the requests and measure their latency per route until the
+      last byte has been written.
+    '''
+    route = request.match_info.route.resource
+    endpoint = route.canonical if route is not None else "other"
+    t0 = time.perf_counter()
+    status = "500"
+    try:
+        response = await handler(request)
+        status = str(response.status)
+        return response
+    except web.HTTPException as e:
+        status = str(e.status)
+        raise
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    finally:
+        metrics.histogram("mathx_request_seconds","Latency of requests.",
+                          labels={"endpoint": endpoint}).observe(time.perf_counter() - t0)
+        metrics.counter("mathx_requests_total","Requests by endpoint and status.",
+                        {"endpoint": endpoint,"status": status}).inc()
+
 @web.middleware
 async def index_rewrite(request,handler):
 
@@ -75,22 +408,39 @@ async def index_rewrite(request,handler):
     else:
         return await handler(request)
 
+async def start_lag_monitor(app):
+    lag_monitor.start(asyncio.get_running_loop())
+
+async def shutdown_pool(app):
+    lag_monitor.stop()
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
 def main():
+    global pool
+
     log.info(f"Setting up aiohttp application.")
 
+    if workers > 0:
+        log.info(f"Starting process pool with [{workers}] workers.")
+        pool = ProcessPoolExecutor(max_workers=workers)
+
 
-    middlewares = []
+    middlewares = [observe_requests]
     if webroot:
         middlewares.append(index_rewrite)
 
     app = web.Application(middlewares=middlewares)
     app.add_routes(routes)
+    app.on_startup.append(start_lag_monitor)
+    app.on_cleanup.append(shutdown_pool)
 
     if webroot:
         app.router.add_static('/',webroot)
 
-    log.info(f"Listening on {listenaddr}:{listenport} with buffer size [{buffersize}]")
-    web.run_app(app,host=listenaddr,port=listenport)
+    log.info(f"Listening on {listenaddr}:{listenport} with buffer size [{streaming.FLUSH_BYTES}]")
+    # cancel handlers of disconnected clients, which aborts pending evaluations.
+    web.run_app(app,host=listenaddr,port=listenport,handler_cancellation=True)
 
 
 if __name__ == "__main__":
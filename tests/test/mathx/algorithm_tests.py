@@ -7,7 +7,8 @@ Created on 19.10.2015
 import logging
 import unittest
 
-from mathx.algorithms import findRootSecant
+from mathx.algorithms import findRootSecant, findRootNewton
+from mathx import formula
 import math
 
 
@@ -29,6 +30,13 @@ class Test(unittest.TestCase):
         
         x = findRootSecant(func,math.sqrt(2),2.9,10000.0,tol=1.0e-8)
         self.assertAlmostEqual(4.0,x,places=6)
+
+    def test_findRootNewton(self):
+        node = formula.Parser("x^(1/x)").parseAst()
+        x = findRootNewton(node,math.sqrt(2),1.5)
+        self.assertAlmostEqual(2.0,x,places=12)
+        self.assertRaises(ValueError,findRootNewton,formula.Parser("x^2+1").parseAst(),0.0,0.0)
+        self.assertRaises(ValueError,findRootNewton,formula.Parser("x*y").parseAst(),0.0,1.0)
         
         
     
@@ -0,0 +1,54 @@
+import json
+import logging
+import unittest
+
+from mathx.bench import cases
+from mathx.bench import runner
+
+
+handler = logging.StreamHandler(open('/dev/stderr', 'w'))
+formatter = logging.Formatter( '%(asctime)s %(levelname)s %(message)s')
+handler.setFormatter(formatter)
+
+root_logger = logging.getLogger()
+root_logger.addHandler(handler)
+root_logger.setLevel(logging.DEBUG)
+
+class Test(unittest.TestCase):
+
+    def test_measure(self):
+        calls = []
+        result = runner.measure(lambda: calls.append(1),repeat=3,min_time=0.001)
+        self.assertEqual(3,result["repeat"])
+        self.assertGreater(result["number"],1)
+        self.assertLessEqual(result["min"],result["median"])
+        # the calls of the calibration run are timed, too.
+        self.assertGreaterEqual(len(calls),3*result["number"])
+
+    def test_cases(self):
+        all_cases = cases.cases(n=11)
+        names = [name for name,_,_ in all_cases]
+        self.assertEqual(len(names),len(set(names)))
+        for prefix in ("parse/","parse_shiftreduce/","evaluate/","grid/","tegral/","solver/"):
+            self.assertTrue(any(name.startswith(prefix) for name in names),prefix)
+
+        results = runner.run(all_cases,repeat=1,min_time=0.0,selected=["tegral/","grid/poly"])
+        self.assertIn("grid/poly_horner",results)
+        self.assertNotIn("parse/poly",results)
+        self.assertEqual(11,results["grid/poly"]["n"])
+        for name,result in results.items():
+            if name.startswith("tegral/"):
+                self.assertLess(result["error"],1.0e-5,name)
+
+        # the report is written as JSON.
+        report = json.loads(json.dumps(runner.report(results,repeat=1)))
+        self.assertEqual(runner.REPORT_VERSION,report["version"])
+        self.assertEqual({"repeat": 1},report["settings"])
+
+    def test_compare(self):
+        base = {"results": {"a": {"median": 2.0},"b": {"median": 1.0}}}
+        current = {"results": {"a": {"median": 3.0},"c": {"median": 1.0}}}
+        self.assertEqual([("a",2.0,3.0,1.5)],runner.compare(base,current))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,6 +5,7 @@ Created on 19.10.2015
 '''
 
 import logging
+import math
 import unittest
 
 from mathx import ast
@@ -20,6 +21,23 @@ root_logger = logging.getLogger()
 root_logger.addHandler(handler)
 root_logger.setLevel(logging.DEBUG)
 
+# the ASTs built by the shift-reduce parser, which Parser replaced.
+AST_REPRS = {
+    '1+1+1': "AstBinaryOperator(AstBinaryOperator(AstConstant(1.0),'+',AstConstant(1.0)),'+',AstConstant(1.0))",
+    '2+3*4': "AstBinaryOperator(AstConstant(2.0),'+',AstBinaryOperator(AstConstant(3.0),'*',AstConstant(4.0)))",
+    '(2+3)*4': "AstBinaryOperator(AstBinaryOperator(AstConstant(2.0),'+',AstConstant(3.0)),'*',AstConstant(4.0))",
+    '2*3+4': "AstBinaryOperator(AstBinaryOperator(AstConstant(2.0),'*',AstConstant(3.0)),'+',AstConstant(4.0))",
+    '2^3^2': "AstBinaryOperator(AstConstant(2.0),'^',AstBinaryOperator(AstConstant(3.0),'^',AstConstant(2.0)))",
+    '(2^3)^2': "AstBinaryOperator(AstBinaryOperator(AstConstant(2.0),'^',AstConstant(3.0)),'^',AstConstant(2.0))",
+    'root(3,27)': 'AstRoot(AstConstant(27.0),AstConstant(3.0))',
+    '3+x': "AstBinaryOperator(AstConstant(3.0),'+',AstVariable('x'))",
+    'log(100)': "AstFunctionCall('log',AstConstant(100.0))",
+    '-2^2': "AstBinaryOperator(AstConstant(-2.0),'^',AstConstant(2.0))",
+    'x*-(3+1)': "AstBinaryOperator(AstVariable('x'),'*',AstNegation(AstBinaryOperator(AstConstant(3.0),'+',AstConstant(1.0))))",
+    'x--x': "AstBinaryOperator(AstVariable('x'),'-',AstNegation(AstVariable('x')))",
+    '2^-x': "AstBinaryOperator(AstConstant(2.0),'^',AstNegation(AstVariable('x')))",
+}
+
 class Test(unittest.TestCase):
 
     def _test_formula(self,res,f,variables={}):
@@ -28,6 +46,7 @@ class Test(unittest.TestCase):
         print("%s = %g"%(f,i))
         self.assertEqual(res, i)
         node = o.parseAst()
+        self.assertEqual(AST_REPRS[f],repr(node))
         print("%s = %s"%(f,node))
         print(repr(node))
         try:
@@ -36,6 +55,8 @@ class Test(unittest.TestCase):
             self.nodes = [node] 
         x = node.evaluate(variables)
         self.assertEqual(res, x)
+        func = node.compile(list(variables.keys()))
+        self.assertEqual(res, func(*variables.values()))
 
     def testPlus(self):
         self._test_formula(3,"1+1+1")
@@ -62,6 +83,173 @@ class Test(unittest.TestCase):
     def testBuiltin(self):
         self._test_formula(2,"log(100)")
         
+    def testUnaryMinus(self):
+        self._test_formula(4,"-2^2")
+        self._test_formula(-8,"x*-(3+1)",{"x":2})
+        self._test_formula(4,"x--x",{"x":2})
+        self._test_formula(0.25,"2^-x",{"x":2})
+        self.assertEqual("AstNegation(AstVariable('x'))",repr(formula.Parser("-x").parseAst()))
+        self.assertEqual("AstConstant(-3.0)",repr(formula.Parser("- 3").parseAst()))
+        self.assertEqual("AstRoot(AstNegation(AstVariable('x')),AstConstant(3.0))",repr(formula.Parser("root(3,-x)").parseAst()))
+
+    def testParseErrors(self):
+        for f in ("","x+","2x","x y","(x","x)","(2,3)","sin x","sin(x,y)","root(x)","--x","x---x","-","-*x",".","1e","x%2","sin()"):
+            for parser in (formula.Parser(f).parseAst,formula.Parser(f).evaluate):
+                self.assertRaises(formula.ParseException,parser)
+        self.assertRaises(formula.ParseException,formula.Parser("x+y").evaluate,{"x":1.0})
+        try:
+            formula.Parser("x+2x").parseAst()
+        except formula.ParseException as e:
+            self.assertEqual(3,e.position)
+
+    def testParseDeep(self):
+        f = "("*2000 + "x" + ")"*2000
+        self.assertEqual(3.0,formula.Parser(f).evaluate({"x":3.0}))
+        f = "+".join("%d*x^2-sin(y/%d)"%(i,i+1) for i in range(5000))
+        variables = {"x":0.5,"y":1.5}
+        self.assertEqual(sum(i*0.25-math.sin(1.5/(i+1)) for i in range(5000)),formula.Parser(f).evaluate(variables))
+
+    def testHashConsing(self):
+        import copy
+        import pickle
+        node = formula.Parser("x*y+sin(x*y)").parseAst()
+        self.assertIs(node.lhs,node.rhs.target)
+        self.assertIs(node,formula.Parser("x * y + sin((x*y))").parseAst())
+        self.assertIs(node,copy.deepcopy(node))
+        self.assertIs(node,pickle.loads(pickle.dumps(node)))
+        self.assertIsNot(AstConstant(0.0),AstConstant(-0.0))
+        self.assertIs(AstConstant(1.0),AstConstant(1))
+        self.assertEqual("AstConstant(2.0)",repr(AstConstant(2)))
+        self.assertRaises(AttributeError,setattr,node,"op","-")
+        # simplify() does not modify shared nodes.
+        node = formula.Parser("-(x-y)*(x-y)").parseAst()
+        self.assertEqual("-((x-y)^2.0)",str(node.simplify()))
+        self.assertIs(ast.AstNegation,type(node.lhs))
+        self.assertIs(node.lhs.target,node.rhs)
+
+    def testSimplify(self):
+        for f,res in (("x*1","x"),("x*-1","-x"),("2*x*3","6.0*x"),("2*x+y+3*x","5.0*x+y"),
+                      ("sin(0)+x","x"),("x*y*x/2","0.5*x^2.0*y"),("-x+y-1+3","y-x+2.0"),
+                      ("x-x","0.0"),("1/x-1/x","0.0/x"),("root(3,8)*x^1","2.0*x"),("ln(0)+x","ln(0.0)+x")):
+            node = formula.Parser(f).parseAst()
+            self.assertEqual(res,str(node.simplify()),f)
+            self.assertIs(node.simplify(),node.simplify().simplify())
+
+    def testSimplifyRandom(self):
+        import random
+        rnd = random.Random(4711)
+        leaves = ["x","y","0","1","2","-1","0.5"]
+        for _ in range(300):
+            terms = [rnd.choice(leaves) for _ in range(6)]
+            for _ in range(5):
+                a = terms.pop(rnd.randrange(len(terms)))
+                b = terms.pop(rnd.randrange(len(terms)))
+                prefix = rnd.choice(("","","-","sin","atan","sqrt"))
+                terms.append("%s(%s%s%s)"%(prefix,a,rnd.choice("+-*/^"),b))
+            f = terms[0]
+            node = formula.Parser(f).parseAst()
+            simplified = node.simplify()
+            self.assertEqual(str(simplified),str(formula.Parser(str(simplified)).parseAst()))
+            for x,y in ((0.0,0.0),(0.7,-1.3),(-2.0,3.0)):
+                expected = _evaluate(node,{"x":x,"y":y})
+                value = _evaluate(simplified,{"x":x,"y":y})
+                if math.isnan(expected):
+                    self.assertTrue(math.isnan(value),"%s -> %s"%(f,simplified))
+                else:
+                    self.assertAlmostEqual(expected,value,delta=1.0e-9*(1.0+abs(expected)),msg="%s -> %s"%(f,simplified))
+
+    def testDerivative(self):
+        for f,res in (("x^2*y","2.0*x*y"),("sin(x*y)","cos(x*y)*y"),("x^y","y*x^(y-1.0)"),
+                      ("y^2","0.0"),("-x","-1.0"),("exp(x)/x","(exp(x)*x-exp(x))/x^2.0")):
+            self.assertEqual(res,str(formula.Parser(f).parseAst().derivative("x")),f)
+        node = formula.Parser("x^y").parseAst()
+        self.assertIs(node.derivative("y"),node.derivative("y"))
+        # compare with central differences at some point inside all domains.
+        variables = {"x":0.3,"y":1.7}
+        h = 1.0e-6
+        for func in formula.BUILTIN_FUNCTIONS:
+            if func == "root":
+                f = "root(y,x+1)"
+            elif func in ("acosh","acsc","asec"):
+                f = "%s(x+y)"%func
+            else:
+                f = "%s(x*y)"%func
+            node = formula.Parser(f).parseAst()
+            df = node.derivative("x").evaluate(variables)
+            fd = (node.evaluate({"x":0.3+h,"y":1.7})-node.evaluate({"x":0.3-h,"y":1.7}))/(2*h)
+            self.assertAlmostEqual(fd,df,delta=1.0e-6*(1.0+abs(df)),msg=f)
+            df = node.derivative("y").evaluate(variables)
+            fd = (node.evaluate({"x":0.3,"y":1.7+h})-node.evaluate({"x":0.3,"y":1.7-h}))/(2*h)
+            self.assertAlmostEqual(fd,df,delta=1.0e-6*(1.0+abs(df)),msg=f)
+
+    def testCommonSubexpressions(self):
+        node = formula.Parser("sin(x*y)^2 + cos(x*y)^2 + x*y").parseAst()
+        program = ast.AstProgram((node,))
+        # x, y, x*y, sin, 2, ^, cos, ^, +, +
+        self.assertEqual(10,len(program))
+        self.assertEqual(1,program.nodes.count(node.rhs))
+        variables = {"x":0.5,"y":3.0}
+        self.assertAlmostEqual(2.5,program.evaluate(variables)[0],places=15)
+        self.assertEqual(program.evaluate(variables)[0],node.evaluate(variables))
+        self.assertEqual(1,node.compile(["x","y"]).source.count("v0 * v1"))
+        self.assertEqual(1+7,formula.ParsedFormula("sin(x*y)^2 + cos(x*y)^2 + x*y").cost)
+
+    def testCompile(self):
+        node = formula.Parser("sin(x)*y^2-root(2,x)/-y").parseAst()
+        variables = {"x":0.7,"y":-1.5}
+        func = node.compile(["x","y"])
+        self.assertEqual(node.evaluate(variables),func(0.7,-1.5))
+        func = node.compile(["y","x"])
+        self.assertEqual(node.evaluate(variables),func(-1.5,0.7))
+        self.assertRaises(ast.EvaluateException,node.compile,["x"])
+
+    def testCompileDeep(self):
+        node = formula.Parser("+".join("%d*x"%i for i in range(2000))).parseAst()
+        func = node.compile(["x"])
+        self.assertEqual(sum(i*0.5 for i in range(2000)),func(0.5))
+
+    def testCompileMany(self):
+        nodes = [formula.Parser(f).parseAst() for f in ("x*y+1","sin(x*y)","y")]
+        func = ast.compileMany(nodes,["x","y"])
+        # the common subexpression x*y is evaluated once.
+        self.assertEqual(1,func.source.count("v0 * v1"))
+        self.assertEqual((1.5+1,math.sin(1.5),3.0),func(0.5,3.0))
+        self.assertEqual(3,func.noutputs)
+
+    def testEvaluateArray(self):
+        import numpy
+        node = formula.Parser("ln(x)*sqrt(y)+sec(x)^2/y").parseAst()
+        x = numpy.linspace(-1.0,2.0,7)
+        y = numpy.linspace(-1.0,2.0,5)
+        values = node.evaluate_array({"x":x[:,numpy.newaxis],"y":y[numpy.newaxis,:]})
+        self.assertEqual((7,5),values.shape)
+        for i,xv in enumerate(x):
+            for j,yv in enumerate(y):
+                try:
+                    res = node.evaluate({"x":xv,"y":yv})
+                except (ArithmeticError,ValueError):
+                    res = float("nan")
+                if res != res:
+                    self.assertTrue(numpy.isnan(values[i,j]))
+                else:
+                    self.assertAlmostEqual(res,values[i,j],places=12)
+        values = formula.Parser("1/0+x").parseAst().evaluate_array({"x":x})
+        self.assertTrue(numpy.isnan(values).all())
+
+    def testFormulaCache(self):
+        cache = formula.FormulaCache(maxsize=2)
+        p1 = cache.get("x+y")
+        self.assertIs(p1,cache.get("x+y"))
+        cache.get("2*x")
+        cache.get("x+y")
+        cache.get("y^2")
+        self.assertEqual({"size":2,"maxsize":2,"hits":2,"misses":3,"evictions":1},cache.stats())
+        self.assertIsNot(p1.compile(),cache.get("2*x").compile())
+        self.assertIs(p1.compile(),p1.compile(["x","y"]))
+        self.assertEqual(["x","y"],p1.variables)
+        self.assertRaises(formula.ParseException,cache.get,"x+")
+        self.assertEqual(2,cache.stats()["size"])
+
     def testSearchPath(self):
         p = formula.Parser("3*y+4*x")
         node = p.parseAst()
@@ -147,6 +335,12 @@ class Test(unittest.TestCase):
         other = other.simplify()
         self.assertEqual("2.0",str(other))
         
+def _evaluate(node,variables):
+    try:
+        return node.evaluate(variables)
+    except (ArithmeticError,ValueError):
+        return math.nan
+
 def _readastpath(astpath):
     if type(astpath)==list:
         res = []
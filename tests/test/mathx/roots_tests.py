@@ -0,0 +1,130 @@
+import logging
+import math
+import numpy
+import unittest
+
+from mathx import formula
+from mathx import roots
+from mathx.algorithms import findRootSecant, findRoot
+
+
+handler = logging.StreamHandler(open('/dev/stderr', 'w'))
+formatter = logging.Formatter( '%(asctime)s %(levelname)s %(message)s')
+handler.setFormatter(formatter)
+
+root_logger = logging.getLogger()
+root_logger.addHandler(handler)
+root_logger.setLevel(logging.DEBUG)
+
+class Counter:
+    '''
+      Count the evaluations of a scalar function.
+    '''
+    def __init__(self,func):
+        self.func = func
+        self.n = 0
+
+    def __call__(self,x):
+        self.n += 1
+        return self.func(x)
+
+class Test(unittest.TestCase):
+
+    def test_findRootBrent(self):
+        x = roots.findRootBrent(formula.Parser("x^3-2*x-5").parseAst(),0.0,2.0,3.0)
+        self.assertAlmostEqual(2.0945514815423265,x,places=12)
+        x = roots.findRootBrent(lambda x: pow(x,1/x),math.sqrt(2),2.9,10000.0)
+        self.assertAlmostEqual(4.0,x,places=10)
+        self.assertEqual(1.0,roots.findRootBrent(lambda x: x-1.0,0.0,1.0,3.0))
+        self.assertRaises(ValueError,roots.findRootBrent,math.cos,2.0,0.0,1.0)
+
+    def test_findRootNewtonSafe(self):
+        x = roots.findRootNewtonSafe(formula.Parser("exp(x)").parseAst(),10.0,0.0,5.0)
+        self.assertAlmostEqual(math.log(10.0),x,places=12)
+        # the Newton step from the midpoint leaves the bracket.
+        x = roots.findRootNewtonSafe(math.atan,0.0,-10.0,30.0,derivative=lambda x: 1/(1+x*x))
+        self.assertAlmostEqual(0.0,x,places=12)
+        self.assertRaises(ValueError,roots.findRootNewtonSafe,formula.Parser("x*y").parseAst(),0.0,0.0,1.0)
+        # functions without a derivative are solved by Brent's method.
+        x = roots.findRootNewtonSafe(math.cos,0.0,0.0,3.0)
+        self.assertAlmostEqual(0.5*math.pi,x,places=12)
+
+    def test_findRootNewton(self):
+        x = roots.findRootNewton(math.atan,0.0,1.0,derivative=lambda x: 1/(1+x*x))
+        self.assertAlmostEqual(0.0,x,places=12)
+        # without a bracket, the Newton steps of atan diverge from x0=2.
+        self.assertRaises((ValueError,OverflowError),roots.findRootNewton,formula.Parser("atan(x)").parseAst(),0.0,2.0)
+        self.assertRaises(ValueError,roots.findRootNewton,math.cos,0.0,1.0)
+
+    def test_findRoots(self):
+        expected = [k*math.pi for k in range(-3,4)]
+        for func in (formula.Parser("sin(x)").parseAst(),numpy.sin):
+            res = roots.findRoots(func,0.0,-10.0,10.0)
+            self.assertEqual(7,len(res))
+            for a,b in zip(expected,res):
+                self.assertAlmostEqual(a,b,places=10)
+        # sign changes at poles are no roots.
+        self.assertEqual([],roots.findRoots(formula.Parser("1/x").parseAst(),0.0,-1.0,1.1))
+        self.assertEqual(3,len(roots.findRoots(formula.Parser("tan(x)").parseAst(),0.0,-5.0,5.0)))
+        # roots on the samples, invalid points are skipped.
+        self.assertEqual([0.0,1.0],roots.findRoots(formula.Parser("x*(x-1)*sqrt(x)").parseAst(),0.0,-1.0,1.0,samples=3))
+        # scalar functions are sampled point by point, marked functions in one pass.
+        self.assertEqual(1,len(roots.findRoots(math.cos,0.0,0.0,3.0,samples=10)))
+        self.assertAlmostEqual(0.5*math.pi,list(findRoot(math.cos,0.0,0.0,3.0))[0],places=12)
+        cos = lambda x: numpy.cos(x)
+        cos.vectorized = True
+        self.assertEqual(roots.findRoots(math.cos,0.0,-5.0,5.0),roots.findRoots(cos,0.0,-5.0,5.0))
+        res = list(findRoot(lambda x: pow(x,1/x),math.sqrt(2),1.0,10.0))
+        self.assertEqual(2,len(res))
+        self.assertAlmostEqual(2.0,res[0],places=12)
+        self.assertAlmostEqual(4.0,res[1],places=12)
+
+    def test_findRootsScalar(self):
+        '''
+          Without numpy, the samples are evaluated one by one.
+        '''
+        saved = roots.numpy
+        roots.numpy = None
+        try:
+            res = roots.findRoots(formula.Parser("sin(x)").parseAst(),0.0,-10.0,10.0)
+            self.assertEqual(7,len(res))
+            self.assertAlmostEqual(math.pi,res[4],places=10)
+            self.assertEqual([0.0,1.0],roots.findRoots(formula.Parser("x*(x-1)*sqrt(x)").parseAst(),0.0,-1.0,1.0,samples=3))
+            self.assertEqual(2,len(roots.findRoots(lambda x: x*x-2.0,0.0,-2.0,2.0)))
+        finally:
+            roots.numpy = saved
+
+    def test_evaluations(self):
+        '''
+          Compare the number of function evaluations with the secant method.
+        '''
+        for f,y,xleft,xright in (("x^(1/x)",math.sqrt(2),1.0,2.5),
+                                 ("x^(1/x)",math.sqrt(2),2.9,10000.0),
+                                 ("x^3-2*x-5",0.0,2.0,3.0),
+                                 ("atan(x-1)",0.0,-10.0,10.0)):
+            node = formula.Parser(f).parseAst()
+            counts = []
+
+            func = Counter(node.compile())
+            try:
+                findRootSecant(func,y,xleft,xright,tol=1.0e-8)
+            except ValueError:
+                pass
+            counts.append(func.n)
+
+            func = Counter(node.compile())
+            x = roots.findRootBrent(func,y,xleft,xright,tol=1.0e-8)
+            self.assertAlmostEqual(y,node.evaluate({"x":x}),places=8)
+            counts.append(func.n)
+
+            func = Counter(node.compile())
+            derivative = Counter(node.derivative("x").compile())
+            x = roots.findRootNewtonSafe(func,y,xleft,xright,derivative=derivative,tol=1.0e-8)
+            self.assertAlmostEqual(y,node.evaluate({"x":x}),places=8)
+            counts.append(func.n)
+
+            root_logger.info("%s=%g in [%g,%g]: secant %d, Brent %d, Newton %d+%d evaluations."%(f,y,xleft,xright,*counts,derivative.n))
+            self.assertLess(counts[1],counts[0])
+
+if __name__ == "__main__":
+    unittest.main()
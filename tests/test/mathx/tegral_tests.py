@@ -5,9 +5,13 @@ Created on 19.10.2015
 '''
 
 import logging
+import numpy
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
-from mathx.tegral import tegral
+from mathx import formula
+from mathx import tegral as tegral_module
+from mathx.tegral import tegral, tegralBox, tegralMany, subregions
 import math
 
 
@@ -27,5 +31,108 @@ class Test(unittest.TestCase):
         res = tegral(func,-1,1,tol=1.0e-15)
         self.assertAlmostEqual(math.pi*0.5,res,places=13)
 
+    def test_vectorized(self):
+        func = lambda x: numpy.sqrt(1.0-x*x)
+        res = tegral(func,-1,1,tol=1.0e-15,vectorized=True)
+        self.assertAlmostEqual(math.pi*0.5,res,places=13)
+        
+        # the same estimates as the scalar evaluation.
+        p = tegral_module._gaussKronrodMany(numpy.cos,[-1.0,0.0],[0.0,0.5])
+        q = [tegral_module._gaussKronrod(math.cos,-1.0,0.0),tegral_module._gaussKronrod(math.cos,0.0,0.5)]
+        for i in range(2):
+            for k in range(3):
+                self.assertAlmostEqual(q[i][k],p[k][i],places=15)
+        
+        node = formula.Parser("x*sin(200*x)").parseAst()
+        expected = (math.sin(200*100.0)-200*100.0*math.cos(200*100.0))/200**2
+        for vectorized in (False,True):
+            res = tegral(node,0.0,100.0,tol=1.0e-12,max_partitions=20000,vectorized=vectorized)
+            self.assertAlmostEqual(expected,res,places=10)
+        # vectorized formulae are NaN at the pole.
+        self.assertRaises(ValueError,tegral,formula.Parser("1/x").parseAst(),-1.0,1.0)
+
+    def test_heap(self):
+        # the number of divisions of the tree of the former implementation.
+        func = lambda x: x*math.sin(200*x)
+        n_parts = 2046
+        
+        res = tegral(func,0.0,100.0,tol=1.0e-12,max_partitions=n_parts)
+        self.assertAlmostEqual((math.sin(200*100.0)-200*100.0*math.cos(200*100.0))/200**2,res,places=12)
+        # does not converge with one division less.
+        with self.assertLogs("mathx.tegral","WARNING"):
+            tegral(func,0.0,100.0,tol=1.0e-12,max_partitions=n_parts-1)
+        
+        self.assertEqual(0.0,tegral(lambda x: 0.0,0.0,1.0))
+
+    def test_infinite(self):
+        self.assertAlmostEqual(math.sqrt(math.pi),tegral(formula.Parser("exp(-x*x)").parseAst(),-math.inf,math.inf,tol=1.0e-12),places=12)
+        self.assertAlmostEqual(1.0,tegral(lambda x: math.exp(-x),0.0,math.inf,tol=1.0e-12),places=12)
+        self.assertAlmostEqual(-1.0,tegral(lambda x: math.exp(x),0.0,-math.inf,tol=1.0e-12),places=12)
+        self.assertAlmostEqual(math.pi*0.5,tegral(formula.Parser("1/(1+x*x)").parseAst(),-math.inf,0.0),places=8)
+
+    def test_box(self):
+        node = formula.Parser("sin(x)*cos(y)").parseAst()
+        res,err = tegralBox(node,[0.0,0.0],[math.pi,math.pi*0.5],tol=1.0e-12)
+        self.assertAlmostEqual(2.0,res,places=12)
+        self.assertLess(err,1.0e-11)
+        # compiled formulae are vectorized, scalar functions are evaluated point by point.
+        res,err = tegralBox(node.compile(vectorized=True),[0.0,0.0],[math.pi,math.pi*0.5],tol=1.0e-12)
+        self.assertAlmostEqual(2.0,res,places=12)
+        res,err = tegralBox(lambda x,y: math.sin(x)*math.cos(y),[0.0,0.0],[math.pi,math.pi*0.5],tol=1.0e-12)
+        self.assertAlmostEqual(2.0,res,places=12)
+        # the orientation of the axes counts.
+        res,err = tegralBox(formula.Parser("x*y*z").parseAst(),[0.0,2.0,0.0],[1.0,0.0,3.0])
+        self.assertAlmostEqual(-4.5,res,places=12)
+        res,err = tegralBox(formula.Parser("exp(-x*x-y*y-z*z)").parseAst(),[-math.inf]*3,[math.inf]*3,tol=1.0e-8,max_partitions=5000)
+        self.assertAlmostEqual(math.pi**1.5,res,places=7)
+
+    def test_constant(self):
+        self.assertAlmostEqual(2.0,tegral(formula.Parser("2").parseAst(),0.0,1.0),places=12)
+        self.assertAlmostEqual(2.0,tegral(formula.Parser("2").parseAst(),0.0,1.0,vectorized=False),places=12)
+        # the formula does not use all axes of the box.
+        res,err = tegralBox(formula.Parser("2").parseAst(),[0.0,0.0],[1.0,3.0])
+        self.assertAlmostEqual(6.0,res,places=12)
+        # y is the first axis, the second one is not used.
+        res,err = tegralBox(formula.Parser("y").parseAst(),[0.0,0.0],[2.0,3.0],variables=["y"])
+        self.assertAlmostEqual(6.0,res,places=12)
+
+    def test_subregions(self):
+        regions = subregions([0.0,math.inf],[1.0,-math.inf],4)
+        self.assertEqual(4,len(regions))
+        node = formula.Parser("x*exp(-y*y)").parseAst()
+        total = sum(tegralBox(node,lo,hi,tol=1.0e-12)[0] for lo,hi in regions)
+        self.assertAlmostEqual(-0.5*math.sqrt(math.pi),total,places=11)
+        with ThreadPoolExecutor(2) as executor:
+            res,err = tegralBox(node,[0.0,math.inf],[1.0,-math.inf],tol=1.0e-12,executor=executor,parts=3)
+        self.assertAlmostEqual(-0.5*math.sqrt(math.pi),res,places=11)
+
+    def test_many(self):
+        node = formula.Parser("x*exp(-x)").parseAst()
+        bounds = [(0.0,0.2*k) for k in range(50)]
+        jobs = [("x*exp(-x)",a,b) for a,b in bounds] + [(node,a,b,1.0e-12) for a,b in bounds]
+        res,err = tegralMany(jobs)
+        self.assertEqual((100,),res.shape)
+        self.assertEqual((100,),err.shape)
+        for k,(a,b) in enumerate(bounds):
+            expected = 1.0-(1.0+b)*math.exp(-b)
+            self.assertAlmostEqual(expected,res[k],places=8)
+            self.assertAlmostEqual(expected,res[50+k],places=12)
+            self.assertLessEqual(err[50+k],err[k])
+        
+        jobs = [(math.sin,0.0,math.pi),("exp(-2*x)",0.0,math.inf),("exp(-3*x)",0.0,math.inf),(math.cos,0.0,0.0)]
+        with ThreadPoolExecutor(2) as executor:
+            res,err = tegralMany(jobs,tol=1.0e-12,executor=executor)
+        for a,b in zip([2.0,0.5,1.0/3.0,0.0],res):
+            self.assertAlmostEqual(a,b,places=12)
+        self.assertRaises(ValueError,tegralMany,[("x*y",0.0,1.0)])
+        
+        # constants do not spoil the batch.
+        jobs = [("2",0.0,1.0),("x^2",0.0,3.0),(formula.Parser("3").parseAst(),1.0,2.0),("2",-1.0,0.0,1.0e-12)]
+        res,err = tegralMany(jobs)
+        self.assertTrue(numpy.isfinite(res[:3]).all())
+        for a,b in zip([2.0,9.0,3.0],res[:3]):
+            self.assertAlmostEqual(a,b,places=10)
+        self.assertAlmostEqual(2.0,res[3],places=12)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,59 @@
+import logging
+import unittest
+
+from mathx.web import adaptive
+from mathx.web import evaluate
+
+
+handler = logging.StreamHandler(open('/dev/stderr', 'w'))
+formatter = logging.Formatter( '%(asctime)s %(levelname)s %(message)s') 
+handler.setFormatter(formatter)
+
+root_logger = logging.getLogger()
+root_logger.addHandler(handler)
+root_logger.setLevel(logging.DEBUG)
+
+def _area(mesh):
+    x = mesh["x"]
+    y = mesh["y"]
+    t = mesh["triangles"]
+    area = 0.0
+    for k in range(0,len(t),3):
+        a,b,c = t[k:k+3]
+        area += 0.5*((x[b]-x[a])*(y[c]-y[a])-(x[c]-x[a])*(y[b]-y[a]))
+    return area
+
+class Test(unittest.TestCase):
+
+    def test_flat(self):
+        mesh = adaptive.adaptiveMesh("x+2*y",-1,1,-1,1)
+        # nothing to refine on a plane.
+        self.assertEqual(9*9+8*8,len(mesh["values"]))
+        self.assertAlmostEqual(4.0,_area(mesh),places=12)
+
+    def test_refinement(self):
+        mesh = adaptive.adaptiveMesh("1/(x^2+y^2+0.01)",-1,1,-1,1,tol=1.0e-3,max_points=5000)
+        self.assertLessEqual(len(mesh["values"]),5000+5*adaptive.BATCH_CELLS)
+        self.assertGreater(len(mesh["values"]),9*9+8*8)
+        # the triangles cover the viewport without cracks or overlaps.
+        self.assertAlmostEqual(4.0,_area(mesh),places=12)
+        # the peak is resolved.
+        self.assertEqual(100.0,max(mesh["values"]))
+
+    def test_domain_boundary(self):
+        mesh = adaptive.adaptiveMesh("sqrt(1-x^2-y^2)",-1,1,-1,1,max_points=3000)
+        self.assertIn(None,mesh["values"])
+        for k in mesh["triangles"]:
+            self.assertIsNotNone(mesh["values"][k])
+
+    def test_validate(self):
+        data = {"n":5,"xmin":-1,"xmax":1,"ymin":-1,"ymax":1,"f":"x*y"}
+        state = evaluate.validate(data)
+        self.assertEqual(adaptive.DEFAULT_TOLERANCE,adaptive.validate(data,state)[0])
+        self.assertRaises(ValueError,adaptive.validate,dict(data,tol=2.0),state)
+        self.assertRaises(ValueError,adaptive.validate,dict(data,points="many"),state)
+        state = evaluate.validate(dict(data,f=["x*y"]))
+        self.assertRaises(ValueError,adaptive.validate,data,state)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import unittest
+import zlib
+
+from mathx.web import compression
+from mathx.web import streaming
+
+
+handler = logging.StreamHandler(open('/dev/stderr', 'w'))
+formatter = logging.Formatter( '%(asctime)s %(levelname)s %(message)s') 
+handler.setFormatter(formatter)
+
+root_logger = logging.getLogger()
+root_logger.addHandler(handler)
+root_logger.setLevel(logging.DEBUG)
+
+class Response:
+    def __init__(self):
+        self.writes = []
+
+    async def write(self,data):
+        self.writes.append(bytes(data))
+
+class Test(unittest.TestCase):
+
+    def test_negotiate(self):
+        self.assertIsNone(compression.negotiate(None))
+        self.assertIsNone(compression.negotiate("identity"))
+        self.assertEqual("gzip",compression.negotiate("deflate, gzip;q=0.5"))
+        self.assertEqual("gzip",compression.negotiate("GZIP"))
+        self.assertIsNone(compression.negotiate("gzip;q=0, *;q=0"))
+        self.assertIsNone(compression.negotiate("gzip;q=x"))
+        if "br" in compression.COMPRESSORS:
+            self.assertEqual("br",compression.negotiate("gzip, br"))
+            self.assertEqual("gzip",compression.negotiate("gzip, br;q=0.9"))
+        else:
+            self.assertEqual("gzip",compression.negotiate("br, *"))
+
+    def test_gzip(self):
+        fragments = [b'{"values": [',b"null, "*10000,b"1.0"*20000,b"]}"]
+        response = Response()
+
+        async def write():
+            async def chunks():
+                for data in fragments:
+                    yield data
+            target = compression.CompressedResponse(response,"gzip")
+            await streaming.writeStream(target,chunks(),flush_bytes=1024)
+            await target.finish()
+
+        asyncio.run(write())
+
+        # every write is decodable on its own.
+        z = zlib.decompressobj(31)
+        body = b""
+        for data in response.writes[:-1]:
+            decoded = z.decompress(data)
+            self.assertTrue(decoded)
+            body += decoded
+        body += z.decompress(response.writes[-1]) + z.flush()
+        self.assertTrue(z.eof)
+        self.assertEqual(b"".join(fragments),body)
+        self.assertLess(sum(len(data) for data in response.writes),len(body)//10)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from mathx.web import diskcache
+from mathx.web import evaluate
+
+
+handler = logging.StreamHandler(open('/dev/stderr', 'w'))
+formatter = logging.Formatter( '%(asctime)s %(levelname)s %(message)s') 
+handler.setFormatter(formatter)
+
+root_logger = logging.getLogger()
+root_logger.addHandler(handler)
+root_logger.setLevel(logging.DEBUG)
+
+STATE = {"n":11,"xmin":-1,"xmax":1,"ymin":-1,"ymax":1,"f":"x*2+y"}
+
+class Test(unittest.TestCase):
+
+    def _key(self,binary=False,**kwargs):
+        return diskcache.cacheKey(evaluate.validate(dict(STATE,**kwargs)),binary)
+
+    def test_key(self):
+        key = self._key()
+        # the same simplified formula and viewport.
+        self.assertEqual(key,self._key(f=" 2 * x+y"))
+        self.assertEqual(key,self._key(f="x+x+y",xmin=-1.0))
+        # the axes are swapped.
+        self.assertNotEqual(key,self._key(f="y+2*x"))
+        self.assertNotEqual(key,self._key(binary=True))
+        self.assertNotEqual(key,self._key(n=12))
+        self.assertNotEqual(key,self._key(f=["x*2+y"]))
+        self.assertNotEqual(key,self._key(gradient=True))
+
+    def test_etag(self):
+        key = self._key()
+        etag = diskcache.etag(key,STATE)
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertNotEqual(etag,diskcache.etag(key,dict(STATE,f=" 2 * x+y")))
+        self.assertTrue(diskcache.matches(etag,'"abc", %s'%etag))
+        self.assertTrue(diskcache.matches(etag,etag[2:]))
+        self.assertTrue(diskcache.matches(etag,"*"))
+        self.assertFalse(diskcache.matches(etag,'"abc"'))
+        self.assertFalse(diskcache.matches(etag,None))
+
+    def test_store(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp,"cache.sqlite")
+            cache = diskcache.DiskCache(path,4000)
+            self.assertIsNone(cache.get("a"))
+            cache.put("a",b"a"*1000)
+            cache.put("b",b"b"*1000)
+            cache.put("c",b"c"*1000)
+            # too large for the store.
+            cache.put("d",b"d"*1001)
+            self.assertIsNone(cache.get("d"))
+            self.assertEqual(b"a"*1000,cache.get("a"))
+            cache.put("d",b"d"*1000)
+            cache.put("e",b"e"*1000)
+            # b has been used least recently.
+            self.assertIsNone(cache.get("b"))
+            self.assertEqual(4000,cache.stats()["size"])
+            self.assertEqual(1,cache.stats()["evictions"])
+
+            # the bodies survive a restart.
+            cache = diskcache.DiskCache(path,4000)
+            self.assertEqual(4000,cache.size)
+            self.assertEqual(b"e"*1000,cache.get("e"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import json
+import logging
+import math
+import numpy
+import struct
+import unittest
+
+from mathx.web import evaluate
+
+
+handler = logging.StreamHandler(open('/dev/stderr', 'w'))
+formatter = logging.Formatter( '%(asctime)s %(levelname)s %(message)s') 
+handler.setFormatter(formatter)
+
+root_logger = logging.getLogger()
+root_logger.addHandler(handler)
+root_logger.setLevel(logging.DEBUG)
+
+STATE = {"n":5,"xmin":-1,"xmax":1,"ymin":-1,"ymax":1,"f":"x/y"}
+
+class Test(unittest.TestCase):
+
+    def test_chunks(self):
+        state = evaluate.validate(STATE)
+        x,y = evaluate.gridAxes(state)
+        chunks = evaluate.rowChunks(5,2)
+        self.assertEqual([(0,2),(2,4),(4,5)],chunks)
+        body = evaluate.encodeJsonHeader(state)
+        for k,(i0,i1) in enumerate(chunks):
+            body += evaluate.encodeJsonValues(evaluate.evaluateRows("x/y",x[i0:i1],y),k==0)
+        body += evaluate.JSON_TRAILER
+        res = json.loads(body)
+        self.assertEqual(25,len(res["values"]))
+        # x is the slow index, y==0 in the middle column.
+        self.assertEqual([1.0,2.0,None,-2.0,-1.0],res["values"][0:5])
+        self.assertEqual("x/y",res["f"])
+
+    def test_validate(self):
+        self.assertRaises(ValueError,evaluate.validate,dict(STATE,n="5"))
+        self.assertRaises(ValueError,evaluate.validate,{"f":"x/y"})
+        self.assertRaises(ValueError,evaluate.validate,dict(STATE,f="x+y+z"))
+        self.assertRaises(evaluate.formula.ParseException,evaluate.validate,dict(STATE,f="x+"))
+
+    def test_budget(self):
+        state = dict(STATE,n=1001)
+        self.assertEqual(1001,evaluate.validate(state)["n"])
+        state["f"] = "+".join("sin(x*y+%d)"%i for i in range(200))
+        n = evaluate.validate(state)["n"]
+        self.assertLess(n,1001)
+        self.assertLessEqual(n*n*evaluate.formula.parseCached(state["f"]).cost,evaluate.COMPUTE_BUDGET)
+        self.assertEqual(101,evaluate.validate(dict(STATE,n=1))["n"])
+
+    def test_binary(self):
+        state = evaluate.validate(STATE)
+        x,y = evaluate.gridAxes(state)
+        body = bytes(evaluate.encodeBinaryHeader(state)) + bytes(evaluate.encodeBinaryValues(evaluate.evaluateRows("x/y",x,y)))
+        hlen, = struct.unpack_from("<I",body)
+        self.assertEqual(0,(4+hlen)%4)
+        header = json.loads(body[4:4+hlen])
+        self.assertEqual(5,header["n"])
+        values = struct.unpack_from("<25f",body,4+hlen)
+        self.assertEqual(4+hlen+25*4,len(body))
+        self.assertEqual((1.0,2.0),values[0:2])
+        self.assertTrue(math.isnan(values[2]))
+
+    def test_encodeBinaryValues(self):
+        values = numpy.array([1.5,1.0e300,-1.0e300,math.nan,-2.0])
+        res = struct.unpack("<5f",evaluate.encodeBinaryValues(values))
+        self.assertEqual((1.5,-2.0),(res[0],res[4]))
+        # no infinities after the cast to float32.
+        self.assertTrue(all(math.isnan(v) for v in res[1:4]))
+        self.assertEqual(b"1.5, 1e+300, -1e+300, null, -2.0",evaluate.encodeJsonValues(values,True))
+        # values in the range of float32 are not copied.
+        values = numpy.array([0.5,-0.25],dtype="<f4")
+        self.assertIs(values,evaluate.encodeBinaryValues(values).obj)
+
+    def test_batch(self):
+        state = evaluate.validate(dict(STATE,f=["x/y","y*x+x"]))
+        x,y = evaluate.gridAxes(state)
+        values = evaluate.evaluateBatchRows(state["f"],x,y)
+        self.assertEqual((2,5,5),values.shape)
+        self.assertEqual([1.0,2.0],values[0,0,0:2].tolist())
+        # the axes follow the first appearance of the variables in the whole batch.
+        self.assertEqual(evaluate.evaluateRows("x*y+x",x,y).tolist(),values[1].tolist())
+        # x/y, y*x and y*x+x are computed once per point.
+        self.assertEqual(4,evaluate.parseGridBatch(state["f"]).cost)
+        self.assertEqual(1+3,evaluate.parseGridBatch(["x*y+sin(x*y)"]).cost)
+        self.assertRaises(ValueError,evaluate.validate,dict(STATE,f=["x/y","x*z"]))
+        self.assertRaises(ValueError,evaluate.validate,dict(STATE,f=[]))
+
+    def test_gradient(self):
+        state = evaluate.validate(dict(STATE,f="sin(x)*y^2",gradient=True))
+        self.assertTrue(state["gradient"])
+        x,y = evaluate.gridAxes(state)
+        values = evaluate.evaluateGradientRows(state["f"],x,y)
+        self.assertEqual((3,5,5),values.shape)
+        self.assertEqual(evaluate.evaluateRows("sin(x)*y^2",x,y).tolist(),values[0].tolist())
+        self.assertEqual(evaluate.evaluateRows("cos(x)*y^2",x,y).tolist(),values[1].tolist())
+        self.assertEqual(evaluate.evaluateRows("2*sin(x)*y",x,y).tolist(),values[2].tolist())
+        self.assertRaises(ValueError,evaluate.validate,dict(STATE,f=["x/y"],gradient=True))
+        self.assertNotIn("gradient",evaluate.validate(STATE))
+
+    def test_timed(self):
+        state = evaluate.validate(dict(STATE,f="x/y"))
+        x,y = evaluate.gridAxes(state)
+        values,tc,te = evaluate.timedRows(evaluate.compileRows,state["f"],x,y)
+        self.assertTrue(numpy.array_equal(evaluate.evaluateRows("x/y",x,y),values,equal_nan=True))
+        self.assertTrue(tc >= 0.0 and te >= 0.0)
+        values,_,_ = evaluate.timedRows(evaluate.compileGradientRows,"sin(x)*y^2",x,y)
+        self.assertEqual((3,5,5),values.shape)
+
+if __name__ == "__main__":
+    unittest.main()
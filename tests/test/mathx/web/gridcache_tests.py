@@ -0,0 +1,60 @@
+import logging
+import unittest
+
+import numpy
+from mathx.web import evaluate
+from mathx.web import gridcache
+
+
+handler = logging.StreamHandler(open('/dev/stderr', 'w'))
+formatter = logging.Formatter( '%(asctime)s %(levelname)s %(message)s') 
+handler.setFormatter(formatter)
+
+root_logger = logging.getLogger()
+root_logger.addHandler(handler)
+root_logger.setLevel(logging.DEBUG)
+
+STATE = {"n":11,"xmin":-1.0,"xmax":1.0,"ymin":-1.0,"ymax":1.0,"f":"sin(x)*y"}
+
+def _evaluate(state):
+    x,y = evaluate.gridAxes(state)
+    return evaluate.evaluateRows(state["f"],x,y)
+
+class Test(unittest.TestCase):
+
+    def test_shifted_viewport(self):
+        cache = gridcache.GridCache()
+        cache.store(STATE,_evaluate(STATE))
+        
+        # shifted by 2 cells in x and -1 cell in y.
+        state = dict(STATE,xmin=-0.6,xmax=1.4,ymin=-1.2,ymax=0.8)
+        values = numpy.full((11,11),numpy.nan)
+        reused = cache.lookup(state,values)
+        self.assertEqual((0,9,1,11),reused)
+        self.assertEqual([[9,11,0,11],[0,9,0,1]],gridcache.changedRegions(11,reused))
+        
+        for i0,i1,columns in gridcache.bands(11,4,reused):
+            x,y = evaluate.gridAxes(state)
+            for j0,j1 in columns:
+                values[i0:i1,j0:j1] = evaluate.evaluateRows(state["f"],x[i0:i1],y[j0:j1])
+        
+        numpy.testing.assert_allclose(_evaluate(state),values,rtol=1.0e-14,atol=1.0e-15)
+
+    def test_unaligned_viewport(self):
+        cache = gridcache.GridCache()
+        cache.store(STATE,_evaluate(STATE))
+        values = numpy.empty((11,11))
+        self.assertIsNone(cache.lookup(dict(STATE,xmin=-0.65,xmax=1.35),values))
+        self.assertIsNone(cache.lookup(dict(STATE,xmax=2.0),values))
+        self.assertEqual([[0,11,0,11]],gridcache.changedRegions(11,None))
+
+    def test_eviction(self):
+        cache = gridcache.GridCache(maxsize=3,per_formula=2)
+        for f in ("x+y","x*y"):
+            for xmin in (0.0,0.1,0.2):
+                cache.store(dict(STATE,f=f,xmin=xmin),numpy.zeros((11,11)))
+        self.assertEqual(2,cache.size)
+        self.assertEqual(["x*y"],list(cache.entries.keys()))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import logging
+import math
+import unittest
+
+from mathx.web import integrate
+
+
+handler = logging.StreamHandler(open('/dev/stderr', 'w'))
+formatter = logging.Formatter( '%(asctime)s %(levelname)s %(message)s') 
+handler.setFormatter(formatter)
+
+root_logger = logging.getLogger()
+root_logger.addHandler(handler)
+root_logger.setLevel(logging.DEBUG)
+
+class Test(unittest.TestCase):
+
+    def test_validate(self):
+        state = integrate.validate({"f":"exp(-x*x-y*y)","xmin":None,"xmax":None,"ymin":0,"ymax":1,"zmin":5})
+        self.assertEqual(["x","y"],state["variables"])
+        self.assertNotIn("zmin",state)
+        self.assertEqual(integrate.DEFAULT_TOLERANCE,state["tol"])
+        self.assertEqual(([-math.inf,0.0],[math.inf,1.0]),integrate.bounds(state))
+        self.assertRaises(ValueError,integrate.validate,{"f":"x*y","xmin":0,"xmax":1})
+        self.assertRaises(ValueError,integrate.validate,{"f":"x","xmin":0,"xmax":"1"})
+        self.assertRaises(ValueError,integrate.validate,{"f":"a+b+c+d","xmin":0,"xmax":1})
+        self.assertRaises(ValueError,integrate.validate,{"f":"x","xmin":0,"xmax":1,"tol":0})
+        self.assertRaises(ValueError,integrate.validate,{"f":"2"})
+
+    def test_integrate(self):
+        state = integrate.validate({"f":"exp(-x*x-y*y)","xmin":None,"xmax":None,"ymin":None,"ymax":None})
+        lower,upper = integrate.bounds(state)
+        ret = integrate.result(state,[integrate.integrateRegion(state["f"],lower,upper,state["tol"],state["partitions"])])
+        self.assertAlmostEqual(math.pi,ret["value"],places=7)
+        self.assertLess(ret["error"],1.0e-7)
+        # a constant is integrated over the x axis.
+        state = integrate.validate({"f":"2","xmin":0,"xmax":3})
+        lower,upper = integrate.bounds(state)
+        ret = integrate.result(state,[integrate.integrateRegion(state["f"],lower,upper,state["tol"],state["partitions"])])
+        self.assertAlmostEqual(6.0,ret["value"],places=12)
+        # the square root is not defined on the whole region.
+        ret = integrate.result(state,[integrate.integrateRegion("sqrt(x*y)",[-1.0,-1.0],[1.0,1.0],1.0e-8,100)])
+        self.assertIsNone(ret["value"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import time
+import unittest
+
+from mathx.web import metrics
+
+
+handler = logging.StreamHandler(open('/dev/stderr', 'w'))
+formatter = logging.Formatter( '%(asctime)s %(levelname)s %(message)s')
+handler.setFormatter(formatter)
+
+root_logger = logging.getLogger()
+root_logger.addHandler(handler)
+root_logger.setLevel(logging.DEBUG)
+
+class Test(unittest.TestCase):
+
+    def test_histogram(self):
+        h = metrics.Histogram("h","A histogram.",(0.1,1.0),{"stage": "parse"})
+        for value in (0.05,0.1,0.5,2.0):
+            h.observe(value)
+        samples = h.samples()
+        # the buckets are cumulative, 0.1 falls into the bucket le=0.1.
+        self.assertEqual([("h_bucket",{"stage": "parse","le": "0.1"},2),
+                          ("h_bucket",{"stage": "parse","le": "1.0"},3),
+                          ("h_bucket",{"stage": "parse","le": "+Inf"},4)],samples[:3])
+        self.assertEqual(("h_count",{"stage": "parse"},4),samples[4])
+        self.assertAlmostEqual(2.65,samples[3][2])
+
+        with h.time():
+            pass
+        self.assertEqual(5,h.samples()[-1][2])
+
+    def test_exposition(self):
+        decode = metrics.counter("requests_total","Requests.",{"stage": "decode"})
+        parse = metrics.counter("requests_total","Requests.",{"stage": "parse"})
+        value = [3]
+        registry = {"a": decode,"b": parse,
+                    "c": metrics.Gauge("queue","Queue \"depth\".",lambda: value[0])}
+        parse.inc(2)
+        value[0] = 4
+
+        text = metrics.exposition(registry)
+        self.assertEqual('# HELP requests_total Requests.\n'
+                         '# TYPE requests_total counter\n'
+                         'requests_total{stage="decode"} 0\n'
+                         'requests_total{stage="parse"} 2\n'
+                         '# HELP queue Queue "depth".\n'
+                         '# TYPE queue gauge\n'
+                         'queue 4\n',text)
+
+        # the same name and labels yield the same metric.
+        self.assertIs(parse,metrics.counter("requests_total","Requests.",{"stage": "parse"}))
+        self.assertEqual('{a="x\\"y"}',metrics._labels({"a": 'x"y'}))
+
+    def test_lag(self):
+        h = metrics.Histogram("lag","Loop lag.")
+        monitor = metrics.LoopLagMonitor(h,0.01)
+
+        async def run():
+            monitor.start(asyncio.get_running_loop())
+            await asyncio.sleep(0.005)
+            # blocks the loop beyond the next tick of the monitor.
+            time.sleep(0.05)
+            await asyncio.sleep(0.03)
+            monitor.stop()
+
+        asyncio.run(run())
+        self.assertGreaterEqual(h.samples()[-1][2],2)
+        self.assertGreater(h.samples()[-2][2],0.03)
+        self.assertIsNone(monitor.handle)
+
+if __name__ == "__main__":
+    unittest.main()
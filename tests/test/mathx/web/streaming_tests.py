@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import unittest
+
+from mathx.web import streaming
+
+
+handler = logging.StreamHandler(open('/dev/stderr', 'w'))
+formatter = logging.Formatter( '%(asctime)s %(levelname)s %(message)s') 
+handler.setFormatter(formatter)
+
+root_logger = logging.getLogger()
+root_logger.addHandler(handler)
+root_logger.setLevel(logging.DEBUG)
+
+class Response:
+    '''
+      Record the writes to a StreamResponse.
+    '''
+    def __init__(self):
+        self.writes = []
+
+    async def write(self,data):
+        self.writes.append(data)
+
+    def body(self):
+        return b"".join(bytes(data) for data in self.writes)
+
+async def _fragments(fragments,delay=0.0):
+    for data in fragments:
+        if delay:
+            await asyncio.sleep(delay)
+        yield data
+
+class Test(unittest.TestCase):
+
+    def test_coalesce(self):
+        fragments = [b"x"*n for n in (10,20,200,30,1000,5)]
+        response = Response()
+        writer = asyncio.run(streaming.writeStream(response,_fragments(fragments),flush_bytes=256))
+        self.assertEqual(b"".join(fragments),response.body())
+        # the small fragments are collected, the large one is passed on.
+        self.assertEqual([230,30,1000,5],[len(data) for data in response.writes])
+        self.assertIs(fragments[4],response.writes[2])
+        self.assertEqual(4,writer.writes)
+
+    def test_stall(self):
+        fragments = [b"a",b"b",b"c"]
+        response = Response()
+        asyncio.run(streaming.writeStream(response,_fragments(fragments,0.05),flush_bytes=256,flush_interval=0.01))
+        # nothing is held back, while the producer is busy.
+        self.assertEqual(fragments,[bytes(data) for data in response.writes])
+
+        response = Response()
+        asyncio.run(streaming.writeStream(response,_fragments(fragments,0.01),flush_bytes=256,flush_interval=10.0))
+        self.assertEqual([b"abc"],[bytes(data) for data in response.writes])
+
+    def test_error(self):
+        async def failing():
+            yield b"abc"
+            raise ConnectionResetError("Client disconnected.")
+        response = Response()
+        self.assertRaises(ConnectionResetError,asyncio.run,streaming.writeStream(response,failing()))
+        self.assertEqual([],response.writes)
+
+if __name__ == "__main__":
+    unittest.main()
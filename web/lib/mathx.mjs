@@ -23,6 +23,28 @@ function colv(v) {
   }
 }
 
+export const BINARY_CONTENT_TYPE = "application/x-mathx-grid";
+
+/*
+  Decode a binary grid response of /mathx/evaluate.
+
+  The layout is a little-endian uint32 header length, the JSON header
+  padded to a multiple of 4 bytes and the float32 values, which are
+  wrapped without copying.
+*/
+export function parseBinaryGrid(buffer) {
+
+    var hlen = new DataView(buffer).getUint32(0,true);
+    var header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer,4,hlen)));
+
+    header.values = new Float32Array(buffer,4+hlen);
+    return header;
+}
+
+function isValid(v) {
+    return v != null && !isNaN(v);
+}
+
 export function genSurfaceGeometry(state) {
 
     var geom = new THREE.BufferGeometry();
@@ -46,8 +68,10 @@ export function genSurfaceGeometry(state) {
 
             var v = state.values[idx++];
 
-            vmin = Math.min(vmin,v);
-            vmax = Math.max(vmax,v);
+            if (isValid(v)) {
+                vmin = Math.min(vmin,v);
+                vmax = Math.max(vmax,v);
+            }
         }
     }
 
@@ -69,7 +93,7 @@ export function genSurfaceGeometry(state) {
             var y = (state.ymax * j + state.ymin *(n1-j))*yscale;
             var v = state.values[idx];
 
-            if (v == null) {
+            if (!isValid(v)) {
                 posIndices.push(null);
             }
             else {
@@ -130,3 +154,50 @@ export function genSurfaceGeometry(state) {
     geom.setAttribute( 'color', new THREE.BufferAttribute( colors, 3 ) );
     return geom;
 }
+
+/*
+  Build the geometry of an adaptively sampled surface as returned by
+  /mathx/evaluate with mode "adaptive".
+*/
+export function genMeshGeometry(state) {
+
+    var geom = new THREE.BufferGeometry();
+
+    var nv = state.values.length;
+    var positions = new Float32Array(nv*3);
+    var colors = new Float32Array(nv*3);
+
+    var vmin = Number.MAX_VALUE;
+    var vmax = -Number.MAX_VALUE;
+
+    for (var i=0;i<nv;++i) {
+        var v = state.values[i];
+        if (isValid(v)) {
+            vmin = Math.min(vmin,v);
+            vmax = Math.max(vmax,v);
+        }
+    }
+
+    var xscale = 1.0/Math.max(Math.abs(state.xmin),Math.abs(state.xmax));
+    var yscale = 1.0/Math.max(Math.abs(state.ymin),Math.abs(state.ymax));
+    var zscale = 1.0/Math.max(Math.abs(vmin),Math.abs(vmax));
+    var vscale = 1.0/(vmax-vmin);
+
+    for (var i=0;i<nv;++i) {
+        var v = state.values[i];
+        if (isValid(v)) {
+            var c = colv((v-vmin)*vscale);
+            positions[3*i] = state.x[i]*xscale;
+            positions[3*i+1] = state.y[i]*yscale;
+            positions[3*i+2] = v*zscale;
+            colors[3*i] = c[0];
+            colors[3*i+1] = c[1];
+            colors[3*i+2] = c[2];
+        }
+    }
+
+    geom.setIndex( new THREE.BufferAttribute( new Uint32Array(state.triangles), 1 ) );
+    geom.setAttribute( 'position', new THREE.BufferAttribute( positions, 3 ) );
+    geom.setAttribute( 'color', new THREE.BufferAttribute( colors, 3 ) );
+    return geom;
+}
@@ -81,7 +81,7 @@ window.addEventListener( 'resize', onWindowResize, false );
 animate();
 
 var currentMesh = null;
-var currentDeferred = null;
+var currentAbort = null;
 
 var loadData = function() {
 
@@ -91,7 +91,8 @@ var loadData = function() {
     ymin: -1,
     ymax: 1,
     n: 101,
-    f: "x*y+0.5*x"
+    f: "x*y+0.5*x",
+    mode: "grid"
   };
 
   if (location.hash) {
@@ -118,24 +119,34 @@ var loadData = function() {
     }
   }
 
-  if (currentDeferred) {
+  if (currentAbort) {
     console.log("Canceling previous query to /mathx/evaluate...");
-    currentDeferred.cancel();
-    currentDeferred = null;
+    currentAbort.abort();
+    currentAbort = null;
   }
 
   console.log("Querying /mathx/evaluate with state", state);
 
-  currentDeferred = fetch("/mathx/evaluate",{
+  var abort = new AbortController();
+  currentAbort = abort;
+
+  fetch("/mathx/evaluate",{
     method: "POST",
+    signal: abort.signal,
     headers: {
       "Content-Type": "application/json",
+      "Accept": mathx.BINARY_CONTENT_TYPE + ", application/json",
     },
     body : JSON.stringify(state)
-  });
-
-  currentDeferred.then(resp => resp.json()).then(function(res) {
-    currentDeferred = null;
+  }).then(function(resp) {
+    if (resp.headers.get("Content-Type") == mathx.BINARY_CONTENT_TYPE) {
+      return resp.arrayBuffer().then(mathx.parseBinaryGrid);
+    }
+    else {
+      return resp.json();
+    }
+  }).then(function(res) {
+    currentAbort = null;
     if (res) {
 
       console.log("/mathx/evaluate returned", {
@@ -147,7 +158,7 @@ var loadData = function() {
         n : res.n,
         vl : res.values.length
       });
-      var geom2 = mathx.genSurfaceGeometry(res);
+      var geom2 = res.mode == "adaptive" ? mathx.genMeshGeometry(res) : mathx.genSurfaceGeometry(res);
 
       var mesh = new THREE.Mesh(geom2, material);
 
@@ -165,7 +176,11 @@ var loadData = function() {
     }
 
   }).catch(function(err) {
-    currentDeferred = null;
+    if (abort.signal.aborted) {
+      // superseded by a newer query.
+      return;
+    }
+    currentAbort = null;
     console.log("/mathx/evaluate failed:", err);
     if (currentMesh) {
       scene.remove(currentMesh);